@@ -1,55 +1,224 @@
 from django.contrib import admin
-from .models import Attendance, AttendanceLog, DailyAttendanceNotification, AttendanceStatus
+from .models import (
+    Attendance, AttendanceLog, DailyAttendanceNotification, AttendanceStatus, ReportJob,
+    UserDailyRollup, DepartmentMonthlyRollup,
+)
 from django.utils import timezone
-from django.db.models import Q
-from datetime import date
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, Min, Q, QuerySet, Subquery
+from datetime import date, datetime, timedelta
+from django.utils.text import smart_split, unescape_string_literal
+from .pagination import CappedCountPaginator, iterate_pk_chunks
+from .search import search_available, search_filter
+from .signals import attendance_changed
+from .versions import NOTIFICATIONS, bump_versions
+
+# Rows changed per transaction by the bulk actions
+ACTION_CHUNK_SIZE = 1000
+# Periods probed at most by one date hierarchy level before falling back to DISTINCT
+MAX_DATE_PROBES = 400
+
+
+def _period_starts(first, last, kind):
+    """Start dates of the years, months or days from ``first`` to ``last``"""
+    if kind == 'year':
+        return [date(year, 1, 1) for year in range(first.year, last.year + 1)]
+    if kind == 'month':
+        months = range(first.year * 12 + first.month - 1, last.year * 12 + last.month)
+        return [date(month // 12, month % 12 + 1, 1) for month in months]
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return date(start.year + 1, 1, 1)
+    if kind == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """QuerySet answering the admin date hierarchy with index probes.
+
+    ``dates()`` and ``datetimes()`` list the periods having rows with a
+    ``SELECT DISTINCT`` over the truncated field, which reads every matching row.
+    Here the first and last value are looked up instead and every period in
+    between is tested with an ``EXISTS`` range probe on the field's index, all
+    probes in one query.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # SQLite finds MIN or MAX of an indexed column alone with one index lookup,
+        # but scans every row for both together, as the date hierarchy asks
+        fields = {
+            expression.source_expressions[0].name
+            for expression in kwargs.values()
+            if isinstance(expression, (Min, Max)) and expression.filter is None
+            and isinstance(expression.source_expressions[0], F)
+        }
+        if args or len(fields) != 1 or len(kwargs) != 2 or {type(e) for e in kwargs.values()} != {Min, Max}:
+            return super().aggregate(*args, **kwargs)
+        first, last = self._bounds(fields.pop())
+        return {alias: first if isinstance(expression, Min) else last for alias, expression in kwargs.items()}
+
+    def _bounds(self, field_name):
+        """First and last value of ``field_name``, each looked up through its index"""
+        values = self.order_by().filter(**{f'{field_name}__isnull': False}).values(field_name)
+        found = self.model._base_manager.using(self.db).order_by().annotate(
+            first=Subquery(values.order_by(field_name)[:1]),
+            last=Subquery(values.order_by(f'-{field_name}')[:1]),
+        ).values('first', 'last').first()
+        return (found['first'], found['last']) if found else (None, None)
+
+    def dates(self, field_name, kind, order='ASC'):
+        periods = self._probe_periods(field_name, kind, order, aware=False)
+        return super().dates(field_name, kind, order) if periods is None else periods
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        periods = self._probe_periods(field_name, kind, order, aware=True) if tzinfo is None else None
+        return super().datetimes(field_name, kind, order, tzinfo) if periods is None else periods
+
+    def _probe_periods(self, field_name, kind, order, aware):
+        if kind not in ('year', 'month', 'day'):
+            return None
+        first, last = self._bounds(field_name)
+        if first is None:
+            return []
+        if aware:
+            first, last = timezone.localtime(first).date(), timezone.localtime(last).date()
+        starts = _period_starts(first, last, kind)
+        if len(starts) > MAX_DATE_PROBES:
+            return None
+
+        def boundary(day):
+            return timezone.make_aware(datetime.combine(day, datetime.min.time())) if aware else day
+
+        # The period range goes first in each probe's WHERE: SQLite bounds the index
+        # scan on the first range of a column, and the changelist's own drill-down
+        # range would otherwise make every probe walk the whole drilled-down period
+        base = self.model._base_manager.using(self.db).order_by()
+        filtered = self.order_by()
+        probes = {
+            f'period_{index}': Exists(base.filter(**{
+                f'{field_name}__gte': boundary(start),
+                f'{field_name}__lt': boundary(_next_period(start, kind)),
+            }) & filtered)
+            for index, start in enumerate(starts)
+        }
+        # One row of the table carries the probe results
+        found = base.annotate(**probes).values(*probes).first()
+        periods = [boundary(start) for index, start in enumerate(starts) if found and found[f'period_{index}']]
+        return periods[::-1] if order == 'DESC' else periods
+
+
+class LargeTableMixin:
+    """Changelist settings for tables with millions of rows.
+
+    Counts are capped by ``CappedCountPaginator`` and the unfiltered total is not
+    counted at all; the date hierarchy is answered by ``IndexedDatesQuerySet``.
+    Together with ``list_select_related`` a page costs the same number of queries
+    however many rows the table has.
+    """
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(queryset.model, query=queryset.query, using=queryset.db, hints=queryset._hints)
+
+
+class FullTextSearchMixin:
+    """Answers the admin search box from the FTS5 indexes of attendance/search.py.
+
+    ``search_indexes`` pairs a lookup of the row id with the name of the index
+    holding it, e.g. ``('user_id', 'users')``. Every word has to match one of
+    them. Without the indexes, or for words without letters and digits, the
+    ``LIKE`` search over ``search_fields`` is used instead.
+    """
+    search_indexes = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not self.search_indexes or not search_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        
+        words = []
+        for word in smart_split(search_term):
+            if word.startswith(('"', "'")) and word[0] == word[-1]:
+                word = unescape_string_literal(word)
+            words.append(word)
+        query = search_filter(words, self.search_indexes)
+        if query is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(query), False
 
 @admin.register(Attendance)
-class AttendanceAdmin(admin.ModelAdmin):
+class AttendanceAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'date', 'check_in_time', 'check_out_time', 'attendance_type', 'is_present', 'get_duration')
     list_filter = ('date', 'is_present', 'attendance_type')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'notes')
+    search_indexes = (('user_id', 'users'), ('id', 'attendance'))
     date_hierarchy = 'date'
+    # Computed from the times on every save, so edits would be overwritten
+    readonly_fields = Attendance.METRIC_FIELDS
 
 @admin.register(AttendanceLog)
-class AttendanceLogAdmin(admin.ModelAdmin):
+class AttendanceLogAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'timestamp', 'log_type', 'verification_method', 'success', 'ip_address')
     list_filter = ('log_type', 'verification_method', 'success', 'timestamp')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'ip_address')
+    search_indexes = (('user_id', 'users'), ('id', 'logs'))
     date_hierarchy = 'timestamp'
+    # Newest first along the timestamp index, which also serves the date hierarchy ranges
+    ordering = ('-timestamp',)
 
 @admin.register(DailyAttendanceNotification)
-class DailyAttendanceNotificationAdmin(admin.ModelAdmin):
+class DailyAttendanceNotificationAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'notification_type', 'date', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read', 'date', 'created_at')
     search_fields = ('title', 'message')
+    search_indexes = (('id', 'notifications'),)
     date_hierarchy = 'created_at'
     readonly_fields = ('created_at',)
     
     actions = ['mark_as_read', 'mark_as_unread', 'create_daily_summary']
     
+    def update_notifications(self, queryset, **values):
+        # In chunks, so selecting every notification does not hold the write lock throughout
+        updated = 0
+        for pks in iterate_pk_chunks(queryset, ACTION_CHUNK_SIZE):
+            with transaction.atomic():
+                updated += DailyAttendanceNotification.objects.filter(pk__in=pks).update(**values)
+                bump_versions([NOTIFICATIONS])
+        return updated
+    
     def mark_as_read(self, request, queryset):
-        queryset.update(is_read=True)
+        updated = self.update_notifications(queryset, is_read=True)
+        self.message_user(request, f"{updated} notifications marked as read")
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
-        queryset.update(is_read=False)
+        updated = self.update_notifications(queryset, is_read=False)
+        self.message_user(request, f"{updated} notifications marked as unread")
     mark_as_unread.short_description = "Mark selected notifications as unread"
     
     def create_daily_summary(self, request, queryset):
         today = date.today()
-        present_count = AttendanceStatus.objects.filter(date=today, status='present').count()
-        absent_count = AttendanceStatus.objects.filter(date=today, status='absent').count()
-        late_count = AttendanceStatus.objects.filter(date=today, status='late').count()
+        counts = AttendanceStatus.objects.filter(date=today).aggregate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            late=Count('id', filter=Q(status='late')),
+        )
         
         summary_message = f"""
         Daily Attendance Summary for {today}:
         
-        ✅ Present: {present_count} students
-        ❌ Absent: {absent_count} students
-        ⏰ Late: {late_count} students
+        ✅ Present: {counts['present']} students
+        ❌ Absent: {counts['absent']} students
+        ⏰ Late: {counts['late']} students
         
-        Total Students: {present_count + absent_count + late_count}
+        Total Students: {counts['present'] + counts['absent'] + counts['late']}
         """
         
         DailyAttendanceNotification.objects.create(
@@ -63,30 +232,48 @@ class DailyAttendanceNotificationAdmin(admin.ModelAdmin):
     create_daily_summary.short_description = "Create daily attendance summary"
 
 @admin.register(AttendanceStatus)
-class AttendanceStatusAdmin(admin.ModelAdmin):
+class AttendanceStatusAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'date', 'status', 'check_in_time', 'check_out_time', 'is_notified')
     list_filter = ('status', 'date', 'is_notified')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'notes')
+    search_indexes = (('user_id', 'users'), ('id', 'statuses'))
     date_hierarchy = 'date'
     readonly_fields = ('is_notified',)
     
     actions = ['mark_all_present', 'mark_all_absent', 'send_notifications']
     
+    def update_statuses(self, queryset, **values):
+        """Update the selected statuses a chunk per transaction; returns the number updated"""
+        updated = 0
+        for pks in iterate_pk_chunks(queryset, ACTION_CHUNK_SIZE):
+            # queryset.update skips auto_now and the model signals, so both are done here
+            with transaction.atomic():
+                chunk = AttendanceStatus.objects.filter(pk__in=pks)
+                instances = list(chunk.only('id', 'user_id', 'date'))
+                updated += chunk.update(updated_at=timezone.now(), **values)
+                attendance_changed.send(sender=AttendanceStatus, instances=instances, created=False, deleted=False)
+        return updated
+    
     def mark_all_present(self, request, queryset):
-        queryset.update(status='present')
+        updated = self.update_statuses(queryset, status='present')
+        self.message_user(request, f"{updated} attendance records marked as present")
     mark_all_present.short_description = "Mark selected as present"
     
     def mark_all_absent(self, request, queryset):
-        queryset.update(status='absent')
+        updated = self.update_statuses(queryset, status='absent')
+        self.message_user(request, f"{updated} attendance records marked as absent")
     mark_all_absent.short_description = "Mark selected as absent"
     
     def send_notifications(self, request, queryset):
         today = date.today()
         
         # Create notifications for absent employees
-        absent_users = queryset.filter(status='absent', date=today)
-        if absent_users.exists():
-            absent_list = ', '.join([user.user.username for user in absent_users])
+        absent_users = list(
+            queryset.filter(status='absent', date=today).order_by('user__username').values_list('user__username', flat=True)
+        )
+        if absent_users:
+            absent_list = ', '.join(absent_users)
             DailyAttendanceNotification.objects.create(
                 date=today,
                 notification_type='absent_alert',
@@ -95,9 +282,11 @@ class AttendanceStatusAdmin(admin.ModelAdmin):
             )
         
         # Create notifications for late employees
-        late_users = queryset.filter(status='late', date=today)
-        if late_users.exists():
-            late_list = ', '.join([user.user.username for user in late_users])
+        late_users = list(
+            queryset.filter(status='late', date=today).order_by('user__username').values_list('user__username', flat=True)
+        )
+        if late_users:
+            late_list = ', '.join(late_users)
             DailyAttendanceNotification.objects.create(
                 date=today,
                 notification_type='late_alert',
@@ -105,6 +294,29 @@ class AttendanceStatusAdmin(admin.ModelAdmin):
                 message=f'The following students are late today: {late_list}'
             )
         
-        queryset.update(is_notified=True)
-        self.message_user(request, f"Notifications sent for {queryset.count()} attendance records")
+        updated = self.update_statuses(queryset, is_notified=True)
+        self.message_user(request, f"Notifications sent for {updated} attendance records")
     send_notifications.short_description = "Send notifications for selected records"
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report_type', 'report_format', 'start_date', 'end_date', 'requested_by', 'status', 'rows_written', 'total_rows', 'created_at', 'expires_at')
+    list_filter = ('status', 'report_type', 'report_format')
+    list_select_related = ('requested_by',)
+    readonly_fields = ('params_hash', 'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'worker')
+    date_hierarchy = 'created_at'
+
+@admin.register(UserDailyRollup)
+class UserDailyRollupAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('user', 'date', 'department', 'present', 'absent', 'late', 'worked_seconds')
+    list_filter = ('department',)
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    search_indexes = (('user_id', 'users'),)
+    date_hierarchy = 'date'
+
+@admin.register(DepartmentMonthlyRollup)
+class DepartmentMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('department', 'month', 'user_days', 'present', 'absent', 'late', 'worked_seconds')
+    list_filter = ('department',)
+    date_hierarchy = 'month'
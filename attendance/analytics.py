@@ -0,0 +1,276 @@
+"""
+Org-wide attendance analytics over a users × days status matrix.
+
+``load_matrix`` reads the AttendanceStatus rows of a date range with one query
+into a dense int8 matrix, one row per user and one column per day, holding the
+status codes below (``NO_RECORD`` where a user has no status that day). On
+SQLite the query returns each user's statuses as one string of fixed-width
+``<date><code>`` entries, which numpy parses without a Python loop per row; that
+keeps a year of a few thousand users well under a second, where fetching the
+rows through the ORM spends seconds converting dates. Other databases read the
+rows through the ORM.
+
+Streaks, rates, rolling windows and heatmaps are then vectorized operations on
+the matrix. ``get_matrix`` shares the matrix of a range between the workers
+through the cache until a write of the range invalidates it.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connections, router
+
+from .cache import get_or_compute
+from .models import AttendanceStatus
+from .versions import USERS, range_keys
+
+NO_RECORD = 0
+# 1 present, 2 absent, 3 late, 4 half_day, 5 leave; single digits in the query's output
+STATUS_CODES = {status: code for code, (status, _) in enumerate(AttendanceStatus.STATUS_CHOICES, 1)}
+STATUS_LABELS = dict(AttendanceStatus.STATUS_CHOICES)
+
+# Ranges longer than this scan the table instead of the date index: without
+# ANALYZE statistics SQLite takes any date range for a selective one, and reading
+# most of the index and then the table costs more than one pass over the table
+INDEXED_RANGE_DAYS = 31
+# Writes that bypass the version stamps show up in the analytics after this long
+MATRIX_TIMEOUT = 10 * 60
+
+ENTRY_WIDTH = len('YYYY-MM-DD') + 1
+
+
+@dataclass(frozen=True)
+class StatusMatrix:
+    start: date
+    # users × days int8 status codes
+    statuses: np.ndarray
+    user_ids: np.ndarray
+    usernames: tuple
+    departments: tuple
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.statuses.shape[1] - 1)
+
+    @property
+    def dates(self):
+        return [self.start + timedelta(days=offset) for offset in range(self.statuses.shape[1])]
+
+
+def _code_sql(column):
+    whens = ' '.join(f"WHEN '{status}' THEN {code}" for status, code in STATUS_CODES.items())
+    return f'(CASE {column} {whens} ELSE {NO_RECORD} END)'
+
+
+def _read_sqlite(connection, start, end, days):
+    """Users, and row, day offset and code of every status, from one hand-written SQLite query"""
+    profile = User._meta.get_field('profile').related_model
+    quote = connection.ops.quote_name
+    sql = (
+        'SELECT entries.user_id, users.username, profiles.department, entries.statuses FROM ('
+        f"SELECT user_id, group_concat(date || {_code_sql('status')}, '') AS statuses "
+        f"FROM {quote(AttendanceStatus._meta.db_table)} "
+        f"{'' if days <= INDEXED_RANGE_DAYS else 'NOT INDEXED '}"
+        'WHERE date BETWEEN %s AND %s GROUP BY user_id'
+        f') AS entries JOIN {quote(User._meta.db_table)} AS users ON users.id = entries.user_id '
+        f'LEFT JOIN {quote(profile._meta.db_table)} AS profiles ON profiles.user_id = entries.user_id '
+        'ORDER BY users.username'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [start.isoformat(), end.isoformat()])
+        rows = cursor.fetchall()
+
+    if not rows:
+        return [], np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int8)
+    entries = np.frombuffer(''.join(row[3] for row in rows).encode('ascii'), dtype=np.uint8)
+    entries = entries.reshape(-1, ENTRY_WIDTH)
+    offsets = (
+        entries[:, :-1].copy().view(f'S{ENTRY_WIDTH - 1}').ravel().astype('datetime64[D]')
+        - np.datetime64(start, 'D')
+    ).astype(np.intp)
+    row_index = np.repeat(np.arange(len(rows)), [len(row[3]) // ENTRY_WIDTH for row in rows])
+    return [row[:3] for row in rows], row_index, offsets, entries[:, -1] - ord('0')
+
+
+def _read_orm(alias, start, end):
+    """What ``_read_sqlite`` returns, from the status rows fetched through the ORM"""
+    rows = (
+        AttendanceStatus.objects.using(alias)
+        .filter(date__range=(start, end))
+        .order_by('user__username', 'date')
+        .values_list('user_id', 'user__username', 'user__profile__department', 'date', 'status')
+    )
+    users, row_index, offsets, codes = [], [], [], []
+    for user_id, username, department, day, status in rows:
+        if not users or users[-1][0] != user_id:
+            users.append((user_id, username, department))
+        row_index.append(len(users) - 1)
+        offsets.append((day - start).days)
+        codes.append(STATUS_CODES.get(status, NO_RECORD))
+    return users, np.array(row_index, dtype=np.intp), np.array(offsets, dtype=np.intp), np.array(codes, dtype=np.int8)
+
+
+def load_matrix(start, end):
+    """Status matrix of the users with a status between ``start`` and ``end``, ordered by username"""
+    days = (end - start).days + 1
+    alias = router.db_for_read(AttendanceStatus)
+    connection = connections[alias]
+    # The fast query relies on SQLite's NOT INDEXED and string concatenation
+    if connection.vendor == 'sqlite':
+        users, row_index, offsets, codes = _read_sqlite(connection, start, end, days)
+    else:
+        users, row_index, offsets, codes = _read_orm(alias, start, end)
+
+    statuses = np.zeros((len(users), max(days, 0)), dtype=np.int8)
+    statuses[row_index, offsets] = codes
+    return StatusMatrix(
+        start,
+        statuses,
+        np.array([user_id for user_id, _, _ in users], dtype=np.int64),
+        tuple(username for _, username, _ in users),
+        tuple(department or '' for _, _, department in users),
+    )
+
+
+def get_matrix(start, end):
+    """The status matrix of the range, shared through the cache"""
+    return get_or_compute(
+        f'analytics:matrix:{start}:{end}',
+        lambda: load_matrix(start, end),
+        MATRIX_TIMEOUT,
+        tags=[USERS, *range_keys(start, end)],
+    )
+
+
+def status_counts(matrix, status):
+    """Days each user had ``status``"""
+    return np.count_nonzero(matrix.statuses == STATUS_CODES[status], axis=1)
+
+
+def users_over(matrix, status, threshold):
+    """Row indexes of the users with ``status`` on more than ``threshold`` days, most days first"""
+    counts = status_counts(matrix, status)
+    found = np.flatnonzero(counts > threshold)
+    return found[np.argsort(-counts[found], kind='stable')], counts
+
+
+def streaks(matrix, status):
+    """Longest and current run of ``status`` days of each user.
+
+    Days without a status (weekends, holidays) neither extend nor break a run;
+    any other status breaks it.
+    """
+    hits = matrix.statuses == STATUS_CODES[status]
+    breaks = (matrix.statuses != NO_RECORD) & ~hits
+    total = np.cumsum(hits, axis=1, dtype=np.int32)
+    # Hits counted up to the latest break, carried forward along each row
+    before_break = np.maximum.accumulate(np.where(breaks, total, 0), axis=1)
+    runs = total - before_break
+    if not runs.size:
+        empty = np.zeros(len(runs), dtype=np.int32)
+        return empty, empty
+    return runs.max(axis=1), runs[:, -1]
+
+
+def _rates(hits, recorded):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(recorded > 0, hits / recorded, np.nan)
+
+
+def week_starts(matrix):
+    """Column of the first day of each Monday-based week in the matrix"""
+    offsets = np.arange(matrix.statuses.shape[1])
+    weeks = (offsets + matrix.start.weekday()) // 7
+    return np.flatnonzero(np.diff(weeks, prepend=-1))
+
+
+def department_weekly_rates(matrix, status):
+    """``(departments, week start dates, rates)`` of ``status`` among the recorded days.
+
+    ``rates`` is departments × weeks, NaN where a department has no statuses.
+    """
+    departments, department_index = np.unique(np.array(matrix.departments, dtype=object), return_inverse=True)
+    starts = week_starts(matrix)
+    if not matrix.statuses.size:
+        return list(departments), [], np.zeros((len(departments), 0))
+    hits = np.add.reduceat(matrix.statuses == STATUS_CODES[status], starts, axis=1, dtype=np.int32)
+    recorded = np.add.reduceat(matrix.statuses != NO_RECORD, starts, axis=1, dtype=np.int32)
+
+    department_hits = np.zeros((len(departments), len(starts)), dtype=np.int64)
+    department_recorded = np.zeros_like(department_hits)
+    np.add.at(department_hits, department_index, hits)
+    np.add.at(department_recorded, department_index, recorded)
+    week_dates = [matrix.start + timedelta(days=int(column)) for column in starts]
+    return list(departments), week_dates, _rates(department_hits, department_recorded)
+
+
+def rolling_rates(matrix, status, window=7):
+    """Org-wide share of the statuses of each day and the ``window - 1`` days before that are ``status``"""
+    hits = np.count_nonzero(matrix.statuses == STATUS_CODES[status], axis=0)
+    recorded = np.count_nonzero(matrix.statuses != NO_RECORD, axis=0)
+    hits_total = np.concatenate(([0], np.cumsum(hits)))
+    recorded_total = np.concatenate(([0], np.cumsum(recorded)))
+    ends = np.arange(1, len(hits) + 1)
+    starts = np.maximum(ends - window, 0)
+    return _rates(hits_total[ends] - hits_total[starts], recorded_total[ends] - recorded_total[starts])
+
+
+def heatmap(matrix, status):
+    """Org-wide rate of ``status`` as a weekday × week grid, NaN on days without statuses"""
+    days = matrix.statuses.shape[1]
+    hits = np.count_nonzero(matrix.statuses == STATUS_CODES[status], axis=0)
+    recorded = np.count_nonzero(matrix.statuses != NO_RECORD, axis=0)
+    cells = np.arange(days) + matrix.start.weekday()
+    grid = np.full((7, (cells[-1] // 7 + 1) if days else 0), np.nan)
+    grid[cells % 7, cells // 7] = _rates(hits, recorded)
+    return grid
+
+
+def _round(values):
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+
+def analytics_report(matrix, status='absent', threshold=3, window=7, top=10):
+    """Everything the analytics page and API show about ``status``, as JSON-ready data"""
+    longest, current = streaks(matrix, status)
+    over, counts = users_over(matrix, status, threshold)
+    departments, weeks, rates = department_weekly_rates(matrix, status)
+    statuses = matrix.statuses
+
+    def user(index, **values):
+        return {
+            'user_id': int(matrix.user_ids[index]),
+            'username': matrix.usernames[index],
+            'department': matrix.departments[index],
+            **{name: int(value[index]) for name, value in values.items()},
+        }
+
+    recorded = int(np.count_nonzero(statuses != NO_RECORD))
+    return {
+        'start': matrix.start.isoformat(),
+        'end': matrix.end.isoformat(),
+        'status': status,
+        'status_display': STATUS_LABELS[status],
+        'users': len(matrix.user_ids),
+        'days': statuses.shape[1],
+        'recorded': recorded,
+        'totals': {name: int(np.count_nonzero(statuses == code)) for name, code in STATUS_CODES.items()},
+        'longest_streaks': [
+            user(index, longest=longest, current=current)
+            for index in np.argsort(-longest, kind='stable')[:top] if longest[index]
+        ],
+        'threshold': threshold,
+        'over_threshold': [user(index, count=counts) for index in over],
+        'weeks': [week.isoformat() for week in weeks],
+        'department_rates': [
+            {'department': department, 'rates': _round(row)} for department, row in zip(departments, rates)
+        ],
+        'window': window,
+        'rolling': [
+            {'date': day.isoformat(), 'rate': rate}
+            for day, rate in zip(matrix.dates, _round(rolling_rates(matrix, status, window)))
+        ],
+        'heatmap': [_round(row) for row in heatmap(matrix, status)],
+    }
@@ -0,0 +1,195 @@
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AttendanceLog, DailyAttendanceNotification
+from .versions import NOTIFICATIONS, bump_versions
+
+DEFAULTS = {
+    # Directory holding one gzipped NDJSON file per model and month
+    'DIR': None,
+    # Rows older than this many days are moved out of the hot tables
+    'RETENTION_DAYS': 180,
+    # Rows moved per transaction
+    'CHUNK_SIZE': 5000,
+}
+
+# Archived models, the timestamp that decides their age and archive month, and
+# the version stamps (see versions.py) that archiving their rows invalidates
+ARCHIVED_MODELS = {
+    'attendancelog': (AttendanceLog, 'timestamp', ()),
+    'dailyattendancenotification': (DailyAttendanceNotification, 'created_at', (NOTIFICATIONS,)),
+}
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'ATTENDANCE_ARCHIVE', {})}
+    if config['DIR'] is None:
+        config['DIR'] = os.path.join(settings.BASE_DIR, 'archive')
+    return config
+
+
+def archive_path(model, month, archive_dir=None):
+    """Path of the archive file holding ``model`` rows of the month starting at ``month``"""
+    archive_dir = archive_dir or get_config()['DIR']
+    return os.path.join(archive_dir, model._meta.model_name, f'{month:%Y-%m}.ndjson.gz')
+
+
+def _local_month(value):
+    return timezone.localtime(value).date().replace(day=1) if timezone.is_aware(value) else value.date().replace(day=1)
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that keeps microseconds, so archived timestamps round-trip exactly"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _serialize(model, row):
+    return json.dumps({field.attname: row[field.attname] for field in model._meta.concrete_fields}, cls=ArchiveEncoder)
+
+
+def _deserialize(model, line):
+    data = json.loads(line)
+    return model(**{
+        field.attname: field.to_python(data[field.attname])
+        for field in model._meta.concrete_fields if field.attname in data
+    })
+
+
+def _append(path, lines):
+    """Append a gzip member to an archive file and make sure it reached the disk"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as archive_file:
+        with gzip.GzipFile(fileobj=archive_file, mode='ab') as gz:
+            gz.write(''.join(line + '\n' for line in lines).encode())
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+
+
+def archive_model(model, field, cutoff, chunk_size=5000, archive_dir=None, dry_run=False, version_keys=()):
+    """Move ``model`` rows whose ``field`` is before ``cutoff`` into the monthly archive files.
+
+    Rows are handled in primary key order, ``chunk_size`` at a time. Each chunk is
+    written and synced to the archive before it is deleted in its own short
+    transaction, so a crash can at worst leave a row in both places; readers drop
+    such duplicates. A chunk is deleted with one DELETE, without ``post_delete``
+    signals, and bumps ``version_keys`` once. Returns the number of rows archived.
+    """
+    attnames = [f.attname for f in model._meta.concrete_fields]
+    queryset = model.objects.filter(**{f'{field}__lt': cutoff}).order_by('pk')
+    if dry_run:
+        return queryset.count()
+
+    archived = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values(*attnames)[:chunk_size])
+        if not rows:
+            break
+        last_pk = rows[-1]['id']
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(_local_month(row[field]), []).append(_serialize(model, row))
+        for month, lines in by_month.items():
+            _append(archive_path(model, month, archive_dir), lines)
+
+        with transaction.atomic():
+            # No model refers to archived rows, so nothing needs the deletion collector,
+            # which would fetch the chunk again and send a post_delete signal per row
+            chunk = model.objects.filter(pk__in=[row['id'] for row in rows])
+            chunk._raw_delete(chunk.db)
+            if version_keys:
+                bump_versions(version_keys)
+        archived += len(rows)
+
+    return archived
+
+
+def archive_old_rows(retention_days=None, chunk_size=None, archive_dir=None, models=None, dry_run=False):
+    """Archive every model in ``ARCHIVED_MODELS``; returns ``{model_name: rows}``"""
+    config = get_config()
+    retention_days = config['RETENTION_DAYS'] if retention_days is None else retention_days
+    cutoff_day = timezone.localdate() - timedelta(days=retention_days)
+    cutoff = timezone.make_aware(datetime.combine(cutoff_day, time.min))
+
+    results = {}
+    for name, (model, field, version_keys) in ARCHIVED_MODELS.items():
+        if models and name not in models:
+            continue
+        results[name] = archive_model(
+            model, field, cutoff,
+            chunk_size=chunk_size or config['CHUNK_SIZE'],
+            archive_dir=archive_dir or config['DIR'],
+            dry_run=dry_run,
+            version_keys=version_keys,
+        )
+    return results
+
+
+def _months(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def iter_archived(model, field, start, end, archive_dir=None, **filters):
+    """Yield archived ``model`` instances whose ``field`` falls on ``start``..``end`` (dates, inclusive).
+
+    ``filters`` are exact matches on field attnames, e.g. ``user_id=3``. The instances
+    carry their original primary keys but no longer exist in the database.
+    """
+    range_start = timezone.make_aware(datetime.combine(start, time.min))
+    range_end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    seen = set()
+    for month in _months(start, end):
+        path = archive_path(model, month, archive_dir)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as archive_file:
+            for line in archive_file:
+                if not line.strip():
+                    continue
+                instance = _deserialize(model, line)
+                if instance.pk in seen:
+                    continue
+                value = getattr(instance, field)
+                if not range_start <= value < range_end:
+                    continue
+                if any(getattr(instance, name) != expected for name, expected in filters.items()):
+                    continue
+                seen.add(instance.pk)
+                yield instance
+
+
+def _merged(model, field, start, end, **filters):
+    range_start = timezone.make_aware(datetime.combine(start, time.min))
+    range_end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    hot = list(model.objects.filter(**{f'{field}__gte': range_start, f'{field}__lt': range_end}, **filters))
+
+    # Only months that have an archive file are read, so recent ranges cost nothing extra
+    hot_pks = {instance.pk for instance in hot}
+    hot.extend(
+        instance for instance in iter_archived(model, field, start, end, **filters)
+        if instance.pk not in hot_pks
+    )
+
+    hot.sort(key=lambda instance: getattr(instance, field), reverse=True)
+    return hot
+
+
+def attendance_logs(start, end, user=None):
+    """AttendanceLog entries between two dates, newest first, from the table and the archive"""
+    filters = {'user_id': user.pk} if user else {}
+    return _merged(AttendanceLog, 'timestamp', start, end, **filters)
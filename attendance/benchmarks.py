@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .dataset import generate_dataset
+
+# Set BENCHMARK=1 to time the views; otherwise only their query budgets are checked,
+# since timings recorded on one machine say nothing about another
+TIMINGS_ENABLED = os.environ.get('BENCHMARK') == '1'
+# Timings are compared with this file, kept outside the source tree; missing entries
+# are added after each timed run
+BASELINE_PATH = os.environ.get(
+    'BENCHMARK_BASELINE',
+    getattr(settings, 'BENCHMARK_BASELINE', os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'attendance_system', 'benchmark_baseline.json',
+    )),
+)
+# A view fails when its best time is more than this many percent above the baseline
+TOLERANCE_PERCENT = float(os.environ.get('BENCHMARK_TOLERANCE', getattr(settings, 'BENCHMARK_TOLERANCE', 100)))
+# Baselines below this many milliseconds are too noisy to compare
+MIN_COMPARED_MS = float(os.environ.get('BENCHMARK_MIN_MS', 10))
+# Set BENCHMARK_UPDATE=1 to overwrite the baseline with the timings of this run
+UPDATE_BASELINE = os.environ.get('BENCHMARK_UPDATE') == '1'
+
+# Size of the dataset the views are measured against
+DATASET_USERS = int(os.environ.get('BENCHMARK_USERS', 300))
+DATASET_DAYS = int(os.environ.get('BENCHMARK_DAYS', 60))
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 5))
+
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_PATH) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(timings):
+    """Merge ``{name: milliseconds}`` into the baseline file"""
+    baseline = load_baseline()
+    for name, elapsed in timings.items():
+        if UPDATE_BASELINE or name not in baseline:
+            baseline[name] = elapsed
+    os.makedirs(os.path.dirname(BASELINE_PATH) or '.', exist_ok=True)
+    with open(BASELINE_PATH, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def seed_benchmark_data():
+    """Generate the synthetic dataset shared by the view benchmarks"""
+    return generate_dataset(users=DATASET_USERS, days=DATASET_DAYS, seed=1, prefix='bench')
+
+
+class IsolatedCacheMixin:
+    """TestCase mixin giving the tests a cache of their own, emptied before every test"""
+
+    @classmethod
+    def setUpClass(cls):
+        # A cache of its own, so the summaries of a running server are not read or cleared
+        cls.enterClassContext(override_settings(CACHES=BENCHMARK_CACHES))
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        # Rows written by a test are rolled back; summaries cached from them must go too
+        cache.clear()
+
+
+class ViewBenchmarkMixin(IsolatedCacheMixin):
+    """TestCase mixin measuring query counts and response times of views.
+
+    ``assertViewBudget`` requests a URL after one warm-up request and fails when it
+    runs more than ``max_queries`` queries. With ``TIMINGS_ENABLED`` it requests
+    the URL ``REPEAT`` times and compares the best time with the JSON baseline;
+    timings of the class are merged into the baseline once all its tests have run.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.benchmark_timings = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.benchmark_timings:
+            save_baseline(cls.benchmark_timings)
+        super().tearDownClass()
+
+    def assertViewBudget(self, name, url, max_queries, method='get', data=None, status_code=200, client=None,
+                         **extra):
+        request = partial(getattr(client or self.client, method), **extra)
+        request(url, data)
+
+        timings = []
+        for _ in range(REPEAT if TIMINGS_ENABLED else 1):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(url, data)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.assertEqual(response.status_code, status_code, f'{name}: unexpected status code')
+            self.assertLessEqual(
+                len(queries), max_queries,
+                f'{name} ran {len(queries)} queries, budget is {max_queries}:\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
+
+        if not TIMINGS_ENABLED:
+            return response
+
+        # The fastest run is the least disturbed by other load on the machine
+        elapsed = round(min(timings), 2)
+        self.benchmark_timings[name] = elapsed
+
+        baseline = load_baseline().get(name)
+        if baseline and not UPDATE_BASELINE and baseline >= MIN_COMPARED_MS:
+            limit = baseline * (1 + TOLERANCE_PERCENT / 100)
+            self.assertLessEqual(
+                elapsed, limit,
+                f'{name} took {elapsed}ms, more than {TOLERANCE_PERCENT:g}% above the {baseline}ms baseline',
+            )
+        return response
@@ -0,0 +1,288 @@
+"""
+Shared cache for values that are expensive to compute.
+
+``SQLiteCache`` is a Django cache backend keeping its entries in an SQLite file,
+so the workers of one machine share them without a cache server. Its ``add`` is
+atomic across processes, which the recomputation locks below rely on.
+
+``get_or_compute`` protects an expensive value against the load spike of many
+workers recomputing it at once when it expires:
+
+* Single flight: only the worker holding the entry's lock recomputes it; the
+  others wait for that result instead of running the same queries.
+* Early refresh (XFetch): every read recomputes with a probability that grows as
+  the expiry approaches and with the time the value took to compute, so one
+  reader usually refreshes a popular entry before it expires.
+* Tags: an entry names the version stamps it is built from (``user:<id>``,
+  ``day:<date>``, ``users``, ... see versions.py). ``bump_versions`` invalidates
+  those tags once the write commits, which makes the entries stale.
+"""
+
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+from typing import NamedTuple
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# How long a worker may hold the recomputation lock of an entry
+LOCK_TIMEOUT = 30
+# How often a worker waiting for another one's result looks for it
+POLL_INTERVAL = 0.05
+
+
+class SQLiteCache(BaseCache):
+    """Cache backend storing pickled values in an SQLite database file.
+
+    ``LOCATION`` is the path of the file, created on first use. Each thread and
+    process opens its own connection; in WAL mode reads do not wait for writers.
+    Expired entries are removed, and ``MAX_ENTRIES`` enforced, after every
+    ``CULL_EVERY`` writes of a process.
+    """
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.fspath(location)
+        self._local = threading.local()
+        self._writes = count(1)
+
+    def _connection(self):
+        # A connection inherited from the parent of a forked worker is not reused
+        if getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front, so a read-modify-write cannot interleave
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Replaces the row only if it has expired, in one statement
+        cursor = self._connection().execute(
+            'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entry.expires <= ?',
+            (self._key(key, version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout), time.time()),
+        )
+        self._written()
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value FROM cache_entry WHERE key IN (%s) AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(made)),
+            (*made, time.time()),
+        )
+        return {made[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires',
+                rows,
+            )
+        self._written()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)', (made, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), made)
+            )
+        return value
+
+    def delete(self, key, version=None):
+        cursor = self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (self._key(key, version),))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        made = [self._key(key, version) for key in keys]
+        if made:
+            self._connection().execute(
+                'DELETE FROM cache_entry WHERE key IN (%s)' % ', '.join('?' * len(made)), made
+            )
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def _written(self):
+        if next(self._writes) % self.CULL_EVERY:
+            return
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+            entries = connection.execute('SELECT count(*) FROM cache_entry').fetchone()[0]
+            if entries <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache_entry')
+                return
+            # The entries closest to expiring go first, the ones without expiry last
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN '
+                '(SELECT key FROM cache_entry ORDER BY expires IS NULL, expires LIMIT ?)',
+                (entries // self._cull_frequency,),
+            )
+
+
+class CachedValue(NamedTuple):
+    value: object
+    # Time it expires, in seconds since the epoch; None when it does not
+    expires: float
+    # Seconds the value took to compute
+    delta: float
+    # Tag key -> version of the tag when the value was computed
+    tags: dict
+
+
+def tag_key(tag):
+    return f'tag:{tag}'
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _is_current(cached, found):
+    return all(found.get(key) == version for key, version in cached.tags.items())
+
+
+def _refresh_early(cached, beta):
+    if cached.expires is None or beta <= 0:
+        return False
+    # XFetch: -log(u) is exponentially distributed, so the chance of an early
+    # refresh rises sharply in the last few compute-times before the expiry
+    return time.time() - cached.delta * beta * math.log(1 - random.random()) >= cached.expires
+
+
+def _tag_versions(cache, tag_keys):
+    """Current versions of the tags, giving tags without one a version first"""
+    versions = cache.get_many(tag_keys)
+    missing = [key for key in tag_keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _compute(cache, key, compute, timeout, tag_keys):
+    # Read before computing, so an invalidation during the computation leaves the result stale
+    versions = _tag_versions(cache, tag_keys)
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    timeout = cache.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+    expires = None if timeout is None else time.time() + timeout
+    cache.set(key, CachedValue(value, expires, delta, versions), timeout)
+    return value
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, tags=(), beta=1.0, using=DEFAULT_CACHE_ALIAS):
+    """Cached result of ``compute()``, recomputed by one worker at a time.
+
+    The value is stale once ``timeout`` seconds have passed or any of ``tags`` was
+    invalidated. ``beta`` scales how early it is refreshed before it expires; 0
+    turns early refreshes off. Workers that find the value stale while another
+    one recomputes it wait up to ``LOCK_TIMEOUT`` seconds for that result.
+    """
+    cache = caches[using]
+    tag_keys = [tag_key(tag) for tag in tags]
+    found = cache.get_many([key, *tag_keys])
+    cached = found.get(key)
+    current = cached is not None and _is_current(cached, found)
+    if current and not _refresh_early(cached, beta):
+        return cached.value
+
+    lock = _lock_key(key)
+    if cache.add(lock, True, LOCK_TIMEOUT):
+        try:
+            return _compute(cache, key, compute, timeout, tag_keys)
+        finally:
+            cache.delete(lock)
+
+    # Another worker is refreshing it; until it expires, the current value will do
+    if current:
+        return cached.value
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        found = cache.get_many([key, *tag_keys, lock])
+        cached = found.get(key)
+        if cached is not None and _is_current(cached, found):
+            return cached.value
+        if lock not in found:
+            break
+    # The other worker failed or gave up; compute it here rather than wait again
+    return _compute(cache, key, compute, timeout, tag_keys)
+
+
+def invalidate_tags(tags, using=DEFAULT_CACHE_ALIAS):
+    """Make every entry computed with any of ``tags`` stale"""
+    version = time.time_ns()
+    caches[using].set_many({tag_key(tag): version for tag in tags}, None)
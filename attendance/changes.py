@@ -0,0 +1,265 @@
+"""
+Incremental change feed of Attendance, AttendanceStatus and AttendanceLog rows.
+
+Triggers on the three tables append an ``AttendanceChange`` row for every insert,
+update and delete, so bulk inserts, ``queryset.update()`` and raw SQL are recorded
+as well as model saves. SQLite has one writer at a time, so changes commit in the
+order of their AUTOINCREMENT ids and a reader never finds a lower id appearing
+behind one it has already read. Log rows are deleted when they are archived, and
+those deletes reach consumers like any other; archived logs are read back from
+the archive files (see archive.py), not from the feed.
+
+``read_changes`` returns the changes after an opaque cursor as NDJSON lines, one
+per changed row carrying its current values (or a delete), with the cursor of the
+next page. Rows changed several times within a page appear once. Consumers store
+the cursor after applying a page and ask for the next one, so they only ever
+transfer what changed since their last sync. ``prune_changes`` drops changes
+older than ``RETENTION_DAYS``; a cursor pointing before them has expired and the
+consumer must sync from a full export again.
+"""
+
+import base64
+import json
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .archive import ArchiveEncoder
+from .models import Attendance, AttendanceChange, AttendanceLog, AttendanceStatus
+from .pagination import InvalidCursor
+
+DEFAULTS = {
+    # Feed clients may authenticate with "Authorization: Bearer <token>";
+    # without a token only staff users can read the feed
+    'TOKEN': None,
+    # Changes per page unless the client asks for fewer or more
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 10000,
+    # Changes older than this many days are pruned by "export_changes --prune"
+    'RETENTION_DAYS': 30,
+}
+
+logger = logging.getLogger(__name__)
+
+# Feed name of each model and the writes recorded for it
+SOURCES = {
+    'attendance': (Attendance, ('insert', 'update', 'delete')),
+    'status': (AttendanceStatus, ('insert', 'update', 'delete')),
+    'log': (AttendanceLog, ('insert', 'update', 'delete')),
+}
+
+# Cursor of a consumer that wants only the changes from now on
+LATEST = 'latest'
+
+
+class CursorExpired(Exception):
+    """Raised when the changes after a cursor have been pruned"""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_CHANGE_FEED', {})}
+
+
+def trigger_names(source):
+    _, operations = SOURCES[source]
+    return [f'{AttendanceChange._meta.db_table}_{source}_{operation}' for operation in operations]
+
+
+def trigger_sql(source):
+    model, operations = SOURCES[source]
+    table = AttendanceChange._meta.db_table
+    # The same text format Django stores DateTimeFields in, in UTC
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    return [
+        f'CREATE TRIGGER {table}_{source}_{operation} AFTER {operation.upper()} ON {model._meta.db_table} BEGIN '
+        f'INSERT INTO {table} (source, object_id, operation, changed_at) '
+        f"VALUES ('{source}', {'old' if operation == 'delete' else 'new'}.id, '{operation}', {now}); END"
+        for operation in operations
+    ]
+
+
+def drop_trigger_sql(source):
+    table = AttendanceChange._meta.db_table
+    return [f'DROP TRIGGER IF EXISTS {table}_{source}_{operation}' for operation in ('insert', 'update', 'delete')]
+
+
+def create_change_triggers(schema_editor):
+    """Create the triggers recording changes; False on databases other than SQLite"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    for source in SOURCES:
+        for sql in drop_trigger_sql(source) + trigger_sql(source):
+            schema_editor.execute(sql, params=None)
+    return True
+
+
+def restore_change_triggers(using=DEFAULT_DB_ALIAS):
+    """Recreate the missing change triggers; returns the sources that had lost any.
+
+    SQLite drops the triggers of a table when Django rebuilds it for a schema
+    change, as it does for most ``AlterField`` operations. Writes made without
+    them are not in the feed, so consumers must sync from a full export again.
+    Run after migrations, see signals.py.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        restored = [source for source in SOURCES if not existing.issuperset(trigger_names(source))]
+        for source in restored:
+            for sql in drop_trigger_sql(source) + trigger_sql(source):
+                cursor.execute(sql)
+    if restored:
+        logger.warning(
+            'Recreated the missing change feed triggers of %s; changes made without them were not recorded, '
+            'so consumers should sync from a full export', ', '.join(restored),
+        )
+    return restored
+
+
+def drop_change_triggers(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for source in SOURCES:
+        for sql in drop_trigger_sql(source):
+            schema_editor.execute(sql, params=None)
+
+
+@contextmanager
+def deferred_change_triggers(models, using=DEFAULT_DB_ALIAS):
+    """Drop the change triggers of ``models`` and record the inserted rows once on exit.
+
+    Like ``search.deferred_search_triggers``, for loads that only insert: one
+    INSERT ... SELECT over the new rows is much cheaper than a trigger per row.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        yield
+        return
+
+    sources = [source for source, (model, _) in SOURCES.items() if model in models]
+    last_ids = {}
+    with connection.cursor() as cursor:
+        for source in sources:
+            cursor.execute(f'SELECT max(id) FROM {SOURCES[source][0]._meta.db_table}')
+            last_ids[source] = cursor.fetchone()[0] or 0
+            for sql in drop_trigger_sql(source):
+                cursor.execute(sql)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for source in sources:
+                for sql in trigger_sql(source):
+                    cursor.execute(sql)
+                cursor.execute(
+                    f'INSERT INTO {AttendanceChange._meta.db_table} (source, object_id, operation, changed_at) '
+                    f"SELECT %s, id, 'insert', %s FROM {SOURCES[source][0]._meta.db_table} WHERE id > %s ORDER BY id",
+                    [source, connection.ops.adapt_datetimefield_value(timezone.now()), last_ids[source]],
+                )
+
+
+def encode_change_cursor(seq):
+    return base64.urlsafe_b64encode(json.dumps(['changes', seq]).encode()).decode().rstrip('=')
+
+
+def decode_change_cursor(token):
+    """The change id a token created by ``encode_change_cursor`` points after"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        kind, seq = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # JSON true and false load as bools, which are ints too
+        if kind != 'changes' or not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+            raise ValueError(seq)
+        return seq
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(f'Invalid change cursor: {token!r}')
+
+
+class ChangePage(NamedTuple):
+    # NDJSON lines, without their line breaks
+    lines: list
+    # Cursor of the next page
+    cursor: str
+    # Whether the next page may have changes already
+    more: bool
+    # Id of the last change read, the page's position in the feed
+    last_seq: int
+
+
+def latest_seq():
+    return AttendanceChange.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def read_changes(cursor=None, limit=None):
+    """The page of changes after ``cursor``.
+
+    Without a cursor the feed starts at the oldest change kept; ``LATEST``
+    returns an empty page whose cursor follows the newest change. Raises
+    ``InvalidCursor`` for tokens that are not cursors and ``CursorExpired`` when
+    changes after the cursor have been pruned.
+    """
+    config = get_config()
+    limit = config['PAGE_SIZE'] if limit is None else limit
+    if not 1 <= limit <= config['MAX_PAGE_SIZE']:
+        raise ValueError(f"The page size must be between 1 and {config['MAX_PAGE_SIZE']}")
+    if cursor == LATEST:
+        seq = latest_seq()
+        return ChangePage([], encode_change_cursor(seq), False, seq)
+
+    oldest = AttendanceChange.objects.order_by('pk').values_list('pk', flat=True).first()
+    if not cursor:
+        after = (oldest or 1) - 1
+    else:
+        after = decode_change_cursor(cursor)
+        # Ids have no gaps but the pruned ones, since rolled back inserts do not use them up
+        if oldest is not None and after < oldest - 1:
+            raise CursorExpired(f'Changes after {cursor!r} have been pruned')
+
+    changes = list(
+        AttendanceChange.objects.filter(pk__gt=after).order_by('pk').values_list('pk', 'source', 'object_id')[:limit]
+    )
+    last_changes = {}
+    for seq, source, object_id in changes:
+        last_changes[source, object_id] = seq
+
+    rows = {}
+    for source, (model, _) in SOURCES.items():
+        ids = [object_id for changed_source, object_id in last_changes if changed_source == source]
+        if ids:
+            attnames = [field.attname for field in model._meta.concrete_fields]
+            rows[source] = {row['id']: row for row in model.objects.filter(pk__in=ids).order_by().values(*attnames)}
+
+    lines = []
+    for (source, object_id), seq in sorted(last_changes.items(), key=lambda item: item[1]):
+        row = rows.get(source, {}).get(object_id)
+        lines.append(json.dumps({
+            'seq': seq,
+            'model': source,
+            'id': object_id,
+            'op': 'delete' if row is None else 'upsert',
+            'data': row,
+        }, cls=ArchiveEncoder))
+
+    last_seq = changes[-1][0] if changes else after
+    return ChangePage(lines, encode_change_cursor(last_seq), len(changes) == limit, last_seq)
+
+
+def prune_changes(retention_days=None):
+    """Delete the changes older than ``retention_days``, keeping the newest one; returns how many"""
+    retention_days = get_config()['RETENTION_DAYS'] if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    # Scans from the oldest change up to the first one kept
+    first_kept = (
+        AttendanceChange.objects.filter(changed_at__gte=cutoff).order_by('pk').values_list('pk', flat=True).first()
+        or latest_seq()
+    )
+    deleted, _ = AttendanceChange.objects.filter(pk__lt=first_kept).delete()
+    return deleted
@@ -0,0 +1,318 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import Profile
+from .changes import deferred_change_triggers
+from .models import Attendance, AttendanceLog, AttendanceStatus, UserDailyRollup
+from .policy import get_shift_policy
+from .search import deferred_search_triggers
+from .versions import ALL, USERS, bump_versions, day_key, user_key
+
+DEPARTMENTS = (
+    'Engineering', 'Sales', 'Marketing', 'Finance', 'Human Resources',
+    'Operations', 'Support', 'Research', 'Legal', 'Facilities',
+)
+POSITIONS = ('Associate', 'Analyst', 'Engineer', 'Specialist', 'Coordinator', 'Manager', 'Director')
+FIRST_NAMES = ('Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Priya', 'Wei', 'Fatima', 'Mateo', 'Aisha', 'Noah', 'Yuki', 'Omar', 'Elena', 'Kofi')
+LAST_NAMES = ('Smith', 'Khan', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Patel', 'Kim', 'Muller',
+              'Rossi', 'Haddad', 'Nguyen', 'Johansson', 'Mensah', 'Tanaka', 'Lopez', 'Ivanova', 'Ali', 'Brown')
+
+DEFAULT_PASSWORD = 'synthetic-password'
+FACE_FEATURES = 128 * 128
+
+# Users whose records are generated and committed together
+USER_BLOCK = 500
+BATCH_SIZE = 5000
+
+ATTENDANCE_FIELDS = ('user', 'date', 'check_in_time', 'check_out_time', 'attendance_type', 'is_present',
+                     'worked_seconds', 'is_late', 'left_early', 'updated_at')
+STATUS_FIELDS = ('user', 'date', 'status', 'check_in_time', 'check_out_time', 'is_notified', 'updated_at')
+LOG_FIELDS = ('user', 'timestamp', 'log_type', 'verification_method', 'success')
+ROLLUP_FIELDS = ('user', 'date', 'department', 'recorded', 'present', 'absent', 'late', 'left_early',
+                 'worked_seconds', 'updated_at')
+
+
+class UserTraits:
+    """Per-user habits every generated day is drawn from"""
+
+    def __init__(self, rng):
+        self.absence_rate = rng.betavariate(2, 40)
+        self.late_rate = rng.betavariate(2, 12)
+        self.early_leave_rate = rng.betavariate(1.5, 25)
+        self.missing_check_out_rate = rng.betavariate(1, 60)
+        # Usual arrival relative to the shift start, in minutes
+        self.arrival_minutes = rng.gauss(-12, 6)
+        self.face_user = rng.random() < 0.4
+
+
+class BulkInserter:
+    """Buffers plain row tuples for one model and inserts them with ``executemany``.
+
+    Skipping model instances and per-field preparation is what makes generating
+    millions of rows practical; values must already be adapted for the database.
+    """
+
+    def __init__(self, model, fields, batch_size=BATCH_SIZE):
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in fields]
+        self.sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            quote(model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+@contextmanager
+def deferred_indexes(models):
+    """Drop the plain secondary indexes of ``models`` and recreate them on exit.
+
+    Building an index once over the loaded rows is several times cheaper than
+    updating it for every insert. Only SQLite is handled; unique indexes stay so
+    constraints are still enforced while loading.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(tables))
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            "AND sql NOT LIKE 'CREATE UNIQUE%%' AND tbl_name IN (" + placeholders + ")",
+            tables,
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute('DROP INDEX %s' % connection.ops.quote_name(name))
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _clock(seconds):
+    return f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+class DayGenerator:
+    """Draws one user's day and adds the resulting rows to the inserters.
+
+    Times are drawn as seconds since local midnight; lateness and durations are
+    compared on those integers and only converted to database values once.
+    """
+
+    def __init__(self, policy, tz, batch_size):
+        self.tz = tz
+        self.shift_start = _seconds(policy.start)
+        self.shift_end = _seconds(policy.end)
+        self.late_after = _seconds(policy.late_after)
+        self.early_before = _seconds(policy.early_before)
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+        self.now = connection.ops.adapt_datetimefield_value(timezone.now())
+        self.attendance = BulkInserter(Attendance, ATTENDANCE_FIELDS, batch_size)
+        self.statuses = BulkInserter(AttendanceStatus, STATUS_FIELDS, batch_size)
+        self.logs = BulkInserter(AttendanceLog, LOG_FIELDS, batch_size)
+        self.rollups = BulkInserter(UserDailyRollup, ROLLUP_FIELDS, batch_size)
+
+    def flush(self):
+        for inserter in (self.attendance, self.statuses, self.logs, self.rollups):
+            inserter.flush()
+
+    def midnight(self, day):
+        """Naive local midnight of ``day`` in the database connection's time zone"""
+        # Taken at noon so the offset is the day's working-hours offset, not a DST edge
+        noon = datetime.combine(day, time(12, 0), tzinfo=self.tz)
+        return timezone.make_naive(noon, connection.timezone) - timedelta(hours=12)
+
+    def add_day(self, user_id, department, db_day, midnight, traits, rng):
+        if rng.random() < traits.absence_rate:
+            status = 'leave' if rng.random() < 0.25 else 'absent'
+            self.statuses.add((user_id, db_day, status, None, None, True, self.now))
+            self.rollups.add((user_id, db_day, department, False, 0, int(status == 'absent'), 0, 0, 0, self.now))
+            return
+
+        if rng.random() < traits.late_rate:
+            check_in = self.shift_start + 60 + int(rng.expovariate(1 / 1500))
+        else:
+            check_in = self.shift_start + int(min(-60, rng.gauss(traits.arrival_minutes, 5) * 60))
+        check_in += rng.randrange(60)
+
+        half_day = rng.random() < 0.02
+        check_out = None
+        if rng.random() >= traits.missing_check_out_rate:
+            if half_day:
+                check_out = check_in + int(4 * 3600 + rng.gauss(0, 1200))
+            elif rng.random() < traits.early_leave_rate:
+                check_out = self.shift_end - int(rng.uniform(600, 7200))
+            else:
+                check_out = self.shift_end + int(abs(rng.gauss(900, 1500)))
+            check_out = min(check_out + rng.randrange(60), 86399)
+
+        # Same rules as Attendance.update_metrics()
+        worked = max(0, check_out - check_in) if check_out is not None else 0
+        late = check_in > self.late_after
+        left_early = check_out is not None and check_out < self.early_before
+        method = 'face' if traits.face_user else 'manual'
+
+        db_check_in = self.adapt_datetime(midnight + timedelta(seconds=check_in))
+        db_check_out = self.adapt_datetime(midnight + timedelta(seconds=check_out)) if check_out is not None else None
+        self.attendance.add((
+            user_id, db_day, db_check_in, db_check_out, 'face' if traits.face_user else 'student',
+            True, worked, late, left_early, self.now,
+        ))
+        self.statuses.add((
+            user_id, db_day, 'half_day' if half_day else ('late' if late else 'present'),
+            _clock(check_in), _clock(check_out) if check_out is not None else None, False, self.now,
+        ))
+        self.logs.add((user_id, db_check_in, 'check_in', method, True))
+        if check_out is not None:
+            self.logs.add((user_id, db_check_out, 'check_out', method, True))
+        self.rollups.add((user_id, db_day, department, True, 1, 0, int(late), int(left_early), worked, self.now))
+
+
+def _days(start, end, include_weekends):
+    day = start
+    while day <= end:
+        if include_weekends or day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def generate_dataset(users, days, seed=0, end=None, prefix='synthetic', include_weekends=False,
+                     face_encodings=0, batch_size=BATCH_SIZE, stdout=None):
+    """Create ``users`` users with ``days`` days of attendance history ending at ``end``.
+
+    Every user gets habits (absence, lateness, early departures, forgotten check-outs)
+    drawn from their own ``Random(f'{seed}-{index}')``, so the same arguments always
+    produce the same rows. Users and profiles are bulk-created; attendance, statuses,
+    logs and user-day rollups are inserted as plain tuples. Face users among the first
+    ``face_encodings`` users also get a synthetic face encoding file.
+
+    Returns a dict of row counts and the generated ``start``/``end`` dates. Department
+    month rollups are left to ``rebuild_department_months``.
+    """
+    end = end or timezone.localdate() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    # Hashing is slow on purpose, so every user shares one precomputed hash
+    password = make_password(DEFAULT_PASSWORD, salt=f'{prefix}{seed}')
+    joined = timezone.make_aware(datetime.combine(start, time(8, 0)))
+    generator = DayGenerator(get_shift_policy(), timezone.get_current_timezone(), batch_size)
+    dates = [
+        (connection.ops.adapt_datefield_value(day), generator.midnight(day))
+        for day in _days(start, end, include_weekends)
+    ]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # Random index inserts thrash the default 2 MB page cache
+            cursor.execute('PRAGMA cache_size = -262144')
+
+    counts = {'start': start, 'end': end, 'users': 0, 'face_encodings': 0}
+    with deferred_indexes((Attendance, AttendanceStatus, AttendanceLog, UserDailyRollup)), \
+            deferred_search_triggers((User, Attendance, AttendanceStatus, AttendanceLog)), \
+            deferred_change_triggers((Attendance, AttendanceStatus, AttendanceLog)):
+        for block_start in range(0, users, USER_BLOCK):
+            indexes = range(block_start, min(block_start + USER_BLOCK, users))
+            rngs = {index: random.Random(f'{seed}-{index}') for index in indexes}
+
+            new_users = []
+            for index in indexes:
+                rng = rngs[index]
+                new_users.append(User(
+                    username=f'{prefix}{index:06d}',
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    email=f'{prefix}{index:06d}@example.com',
+                    password=password,
+                    date_joined=joined,
+                ))
+
+            with transaction.atomic():
+                # bulk_create skips the post_save signal that would create one profile per user
+                User.objects.bulk_create(new_users, batch_size=batch_size)
+                user_ids = dict(User.objects.filter(
+                    username__in=[user.username for user in new_users]
+                ).values_list('username', 'id'))
+
+                profiles = []
+                for index in indexes:
+                    rng = rngs[index]
+                    user_id = user_ids[f'{prefix}{index:06d}']
+                    traits = UserTraits(rng)
+                    department = DEPARTMENTS[int(rng.paretovariate(1.2)) % len(DEPARTMENTS)]
+                    profiles.append(Profile(
+                        user_id=user_id,
+                        employee_id=f'{prefix[:3].upper()}{index:08d}',
+                        department=department,
+                        position=rng.choice(POSITIONS),
+                        face_recognition_enabled=traits.face_user and index < face_encodings,
+                    ))
+                    for db_day, midnight in dates:
+                        generator.add_day(user_id, department, db_day, midnight, traits, rng)
+
+                Profile.objects.bulk_create(profiles, batch_size=batch_size)
+                generator.flush()
+                bump_versions(user_key(user_id) for user_id in user_ids.values())
+
+            counts['users'] += len(new_users)
+            for profile in profiles:
+                if profile.face_recognition_enabled:
+                    counts['face_encodings'] += _write_face_encoding(profile, random.Random(f'{seed}-face-{profile.user_id}'))
+
+            if stdout:
+                stdout.write(f'Generated {counts["users"]}/{users} users, {generator.attendance.count} attendance records')
+
+    bump_versions([ALL, USERS] + [day_key(day) for day in _days(start, end, include_weekends)])
+    counts.update(
+        attendance=generator.attendance.count,
+        statuses=generator.statuses.count,
+        logs=generator.logs.count,
+        rollups=generator.rollups.count,
+    )
+    return counts
+
+
+def _write_face_encoding(profile, rng):
+    # Imported here: OpenCV is only needed when encodings are requested
+    import numpy as np
+    from .face_recognition_utils import save_face_encoding
+
+    generator = np.random.default_rng(rng.getrandbits(64))
+    features = [generator.random(FACE_FEATURES)]
+    if save_face_encoding(User(pk=profile.user_id), features):
+        return 1
+    return 0
+
+
+def delete_dataset(prefix='synthetic'):
+    """Delete every user created with ``prefix`` together with all their records"""
+    deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+    return deleted
@@ -0,0 +1,251 @@
+import re
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connections, models, transaction
+from django.db.migrations import Migration
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.writer import MigrationWriter
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Attendance
+
+# Full scans of these tables are reported as problems
+WATCHED_TABLES = ('attendance_attendance', 'attendance_attendancestatus', 'attendance_attendancelog')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN) "(\w+)"(?: (?:AS )?"?(\w+)"?)?')
+PLAN_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+PLAN_AUTOMATIC_INDEX = re.compile(r'^SEARCH (?:TABLE )?(\w+) USING AUTOMATIC')
+EQUALITY = re.compile(r'"(\w+)"\."(\w+)" (?:= %s|IN \(|IS NULL)')
+RANGE = re.compile(r'"(\w+)"\."(\w+)" (?:[<>]=? %s|BETWEEN)')
+ORDER_BY = re.compile(r'ORDER BY (.+?)(?: LIMIT| OFFSET|$)')
+ORDER_COLUMN = re.compile(r'"(\w+)"\."(\w+)"')
+
+
+def normalize_sql(sql):
+    """Collapse parameter lists so the same query with different IN lists groups together"""
+    return IN_LIST.sub('IN (...)', ' '.join(sql.split()))
+
+
+class QueryGroup:
+    __slots__ = ('normalized', 'alias', 'sql', 'params', 'count', 'total', 'slowest', 'paths')
+
+    def __init__(self, normalized, alias, sql, params):
+        self.normalized = normalized
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.paths = set()
+
+
+class SlowQueryRecorder:
+    """``connection.execute_wrapper`` callable grouping queries slower than a threshold"""
+
+    def __init__(self, threshold_ms=0):
+        self.threshold = threshold_ms / 1000
+        self.groups = OrderedDict()
+        self.path = ''
+        self.executed = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.executed += 1
+            if elapsed >= self.threshold and not many:
+                key = normalize_sql(sql)
+                group = self.groups.get(key)
+                if group is None:
+                    group = self.groups[key] = QueryGroup(key, context['connection'].alias, sql, params)
+                group.count += 1
+                group.total += elapsed
+                group.paths.add(self.path)
+                if elapsed > group.slowest:
+                    group.slowest, group.sql, group.params = elapsed, sql, params
+
+
+def default_paths(member):
+    """Paths requested by ``diagnose_queries``: the pages that read attendance tables"""
+    today = timezone.localdate()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    report = reverse('attendance:attendance_report')
+    history = reverse('attendance:attendance_history')
+    return [
+        (None, reverse('attendance:attendance_home')),
+        (member, reverse('attendance:mark_attendance')),
+        (member, history),
+        (None, history),
+        (None, f'{history}?count=1'),
+        (None, f'{history}?start_date={month_ago}&end_date={today}'),
+        (None, f'{report}?start_date={month_ago}&end_date={today}&report_type=detailed&preview=1'),
+        (None, f'{report}?start_date={month_ago}&end_date={today}&report_type=summary&preview=1'),
+        (None, f'{report}?start_date={month_ago}&end_date={today}&report_type=summary&format=csv'),
+        (None, reverse('attendance:notification_dashboard')),
+        (member, reverse('users:dashboard')),
+        (member, reverse('users:profile')),
+    ]
+
+
+def run_views(recorder, paths=None, stdout=None):
+    """Request the views as a staff user and a member and roll every change back afterwards"""
+    with transaction.atomic():
+        staff = User.objects.create_user('diagnose_queries_staff', is_staff=True)
+        member = User.objects.get(pk=Attendance.objects.order_by('-date').values('user_id')[:1]) \
+            if Attendance.objects.exists() else User.objects.create_user('diagnose_queries_member')
+        clients = {}
+        for user in (staff, member):
+            clients[user.pk] = Client(raise_request_exception=False, SERVER_NAME='localhost')
+            clients[user.pk].force_login(user)
+
+        with ExitStack() as stack:
+            # Report and history reads go through the read-only connection
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            for user, path in paths or default_paths(member):
+                recorder.path = path
+                started = time.perf_counter()
+                response = clients[(user or staff).pk].get(path)
+                if stdout:
+                    stdout.write(f'  {response.status_code} {path} ({(time.perf_counter() - started) * 1000:.0f}ms)')
+        recorder.path = ''
+        transaction.set_rollback(True)
+
+
+def explain(sql, params, alias='default'):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[alias or table] = table
+        aliases[table] = table
+    return aliases
+
+
+def full_scans(plan, aliases):
+    """Tables the plan reads completely: scans (also through an index) and automatic indexes"""
+    tables = []
+    for detail in plan:
+        match = PLAN_SCAN.match(detail) or PLAN_AUTOMATIC_INDEX.match(detail)
+        if match:
+            tables.append(aliases.get(match.group(1), match.group(1)))
+    return tables
+
+
+def suggested_columns(sql, table, aliases):
+    """Columns of ``table`` for a composite index: equality filters, then ranges, then ordering"""
+    names = {name for name, target in aliases.items() if target == table}
+    columns = []
+
+    def add(found):
+        for name, column in found:
+            if name in names and column not in columns:
+                columns.append(column)
+
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    add(EQUALITY.findall(where))
+    add(RANGE.findall(where))
+    order_by = ORDER_BY.search(where)
+    if order_by:
+        add(ORDER_COLUMN.findall(order_by.group(1)))
+    return columns
+
+
+def existing_indexes(table):
+    connection = connections['default']
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [constraint['columns'] for constraint in constraints.values() if constraint['index'] or constraint['unique']]
+
+
+def is_covered(columns, indexes):
+    """True when an existing index starts with the suggested columns' leading column set"""
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def build_index(model, columns):
+    fields = []
+    for column in columns:
+        field = next((field for field in model._meta.concrete_fields if field.column == column), None)
+        if field is None:
+            return None
+        fields.append(field.name)
+    index = models.Index(fields=fields)
+    index.set_name_with_model(model)
+    return index
+
+
+def analyze(recorder):
+    """EXPLAIN every recorded query group; returns ``(findings, suggestions)``.
+
+    ``findings`` holds a dict per group with its plan and fully scanned tables,
+    ``suggestions`` maps ``(model, tuple(columns))`` to an ``Index``.
+    """
+    findings = []
+    suggestions = OrderedDict()
+    for group in recorder.groups.values():
+        statement = group.sql.lstrip().split(None, 1)[0].upper()
+        if statement not in ('SELECT', 'UPDATE', 'DELETE'):
+            continue
+        plan = explain(group.sql, group.params, group.alias)
+        aliases = table_aliases(group.sql)
+        scans = full_scans(plan, aliases)
+        watched = [table for table in scans if table in WATCHED_TABLES]
+        findings.append({'group': group, 'plan': plan, 'scans': scans, 'watched_scans': watched})
+
+        for table in watched:
+            columns = suggested_columns(group.sql, table, aliases)
+            model = model_for_table(table)
+            if not columns or model is None or is_covered(columns, existing_indexes(table)):
+                continue
+            key = (model, tuple(columns))
+            if key not in suggestions:
+                index = build_index(model, columns)
+                if index is not None:
+                    suggestions[key] = index
+
+    # An index on (a, b) also serves queries that only need (a)
+    for model, columns in list(suggestions):
+        if any(other_model is model and len(other) > len(columns) and other[:len(columns)] == columns
+               for other_model, other in suggestions):
+            del suggestions[model, columns]
+    findings.sort(key=lambda finding: (not finding['watched_scans'], -finding['group'].total))
+    return findings, suggestions
+
+
+def write_migration(app_label, indexes):
+    """Write a migration adding ``[(model, Index)]`` to ``app_label``; returns its path"""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    leaf = loader.graph.leaf_nodes(app_label)
+    number = int(leaf[0][1].split('_', 1)[0]) + 1 if leaf else 1
+
+    migration = Migration(f'{number:04d}_query_plan_indexes', app_label)
+    migration.dependencies = leaf
+    migration.operations = [AddIndex(model._meta.model_name, index) for model, index in indexes]
+    writer = MigrationWriter(migration)
+    with open(writer.path, 'w') as migration_file:
+        migration_file.write(writer.as_string())
+    return writer.path
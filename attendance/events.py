@@ -0,0 +1,234 @@
+import asyncio
+import atexit
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # When disabled nothing is published and the event stream answers 204
+    'ENABLED': True,
+    # Directory of Unix datagram sockets, one per process with listeners; every
+    # published event is also sent to the other sockets so all workers on this
+    # machine see it. None keeps events inside the publishing process.
+    'SOCKET_DIR': None,
+    # Seconds between keep-alive comments on idle streams
+    'HEARTBEAT_SECONDS': 15,
+    # Events queued per stream; a client that falls further behind is told to resync
+    'QUEUE_SIZE': 100,
+    # Milliseconds browsers wait before reconnecting a dropped stream
+    'RETRY_MS': 5000,
+}
+
+# Largest event sent between processes; notification texts are truncated well below it
+MAX_DATAGRAM = 65536
+
+RESYNC = {'type': 'resync', 'data': {}}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_EVENTS', {})}
+
+
+class Subscription:
+    """Queue of events for one stream, owned by the event loop that created it"""
+
+    def __init__(self, bus, size):
+        self.bus = bus
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client reloads the page instead of replaying what it missed
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout):
+        """The next event, or None after ``timeout`` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Fans published events out to the subscribed streams of this process.
+
+    Streams are grouped by event loop, so publishing from any thread costs one
+    ``call_soon_threadsafe`` per loop however many streams are open. With a
+    socket directory the process also binds a datagram socket once it has
+    subscribers, and every publisher forwards its events to all sockets in the
+    directory; a socket nobody listens on any more is removed.
+    """
+
+    def __init__(self, socket_dir=None, queue_size=100):
+        self.socket_dir = os.fspath(socket_dir) if socket_dir else None
+        self.queue_size = queue_size
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._loops = {}
+        self._sender = None
+        self._receiver = None
+        self._socket_path = None
+
+    # Subscribers
+
+    def subscribe(self):
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            self._loops.setdefault(subscription.loop, set()).add(subscription)
+        self._listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._loops.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._loops[subscription.loop]
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._loops.values())
+
+    def _dispatch(self, event):
+        with self._lock:
+            loops = {loop: list(subscriptions) for loop, subscriptions in self._loops.items()}
+        for loop, subscriptions in loops.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, event)
+            except RuntimeError:
+                # The loop was closed without its streams unsubscribing
+                with self._lock:
+                    self._loops.pop(loop, None)
+
+    # Publishing
+
+    def publish(self, event_type, data):
+        event = {'type': event_type, 'data': data}
+        self._dispatch(event)
+        if self.socket_dir:
+            self._forward(json.dumps(event, separators=(',', ':')).encode())
+
+    def _forward(self, payload):
+        if len(payload) > MAX_DATAGRAM:
+            logger.warning('Event of %d bytes is too large to forward to other workers', len(payload))
+            return
+        with self._lock:
+            if self._sender is None:
+                self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sender.setblocking(False)
+            sender = self._sender
+        for path in glob.glob(os.path.join(self.socket_dir, '*.sock')):
+            if path == self._socket_path:
+                continue
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a process that exited without cleaning up
+                _unlink(path)
+            except BlockingIOError:
+                logger.warning('Event dropped for %s, its receive buffer is full', path)
+            except OSError:
+                logger.exception('Could not forward event to %s', path)
+
+    # Receiving from other processes
+
+    def _listen(self):
+        if not self.socket_dir or self._receiver is not None:
+            return
+        with self._lock:
+            if self._receiver is not None:
+                return
+            os.makedirs(self.socket_dir, exist_ok=True)
+            path = os.path.join(self.socket_dir, f'{self.pid}-{uuid.uuid4().hex[:8]}.sock')
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                receiver.bind(path)
+            except OSError:
+                receiver.close()
+                logger.exception('Could not bind %s; only events of this process are streamed', path)
+                self.socket_dir = None
+                return
+            self._receiver = receiver
+            self._socket_path = path
+        atexit.register(_unlink, path)
+        threading.Thread(target=self._receive, name='attendance-events', daemon=True).start()
+
+    def _receive(self):
+        while True:
+            try:
+                payload = self._receiver.recv(MAX_DATAGRAM)
+            except OSError:
+                return
+            try:
+                event = json.loads(payload)
+            except ValueError:
+                logger.warning('Ignoring malformed event datagram')
+                continue
+            self._dispatch(event)
+
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """The event bus of this process; a forked worker gets its own"""
+    global _bus
+    if _bus is None or _bus.pid != os.getpid():
+        with _bus_lock:
+            if _bus is None or _bus.pid != os.getpid():
+                config = get_config()
+                _bus = EventBus(config['SOCKET_DIR'], config['QUEUE_SIZE'])
+    return _bus
+
+
+def publish(event_type, data):
+    if get_config()['ENABLED']:
+        get_bus().publish(event_type, data)
+
+
+def format_event(event):
+    """An event in the text/event-stream format"""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+async def event_stream(subscription, heartbeat, retry):
+    """Server-sent events from ``subscription`` with keep-alive comments in between"""
+    try:
+        yield f'retry: {retry}\n\n'
+        while True:
+            event = await subscription.get(heartbeat)
+            yield ': keep-alive\n\n' if event is None else format_event(event)
+    finally:
+        subscription.close()
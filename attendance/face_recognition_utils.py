@@ -1,4 +1,5 @@
 import cv2
+import logging
 import numpy as np
 import os
 import pickle
@@ -9,6 +10,10 @@ import base64
 from io import BytesIO
 from PIL import Image
 
+from .profiling import stage
+
+logger = logging.getLogger(__name__)
+
 # Directory to store face encodings
 FACE_ENCODINGS_DIR = os.path.join(settings.MEDIA_ROOT, 'face_encodings')
 
@@ -25,25 +30,27 @@ def process_uploaded_image(image_file):
         image_file.seek(0)  # Reset file pointer
         
         # Convert to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with stage('decode'):
+            nparr = np.frombuffer(image_data, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         return image
     except Exception as e:
-        print(f"Error processing image: {e}")
+        logger.exception("Error processing image")
         return None
 
 def detect_faces(image_array):
     """Detect faces in the image using OpenCV"""
     try:
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-        
-        # Load the face cascade classifier
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        with stage('detect'):
+            # Convert to grayscale for face detection
+            gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+            
+            # Load the face cascade classifier
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            
+            # Detect faces
+            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
         
         # Convert to list of tuples (top, right, bottom, left)
         face_locations = []
@@ -52,36 +59,37 @@ def detect_faces(image_array):
         
         return face_locations
     except Exception as e:
-        print(f"Error detecting faces: {e}")
+        logger.exception("Error detecting faces")
         return []
 
 def extract_face_features(image_array, face_locations):
     """Extract face features using basic image processing"""
     try:
         features = []
-        for face_location in face_locations:
-            top, right, bottom, left = face_location
+        with stage('extract'):
+            for face_location in face_locations:
+                top, right, bottom, left = face_location
             
-            # Extract face region
-            face_image = image_array[top:bottom, left:right]
+                # Extract face region
+                face_image = image_array[top:bottom, left:right]
             
-            # Resize to standard size
-            face_image = cv2.resize(face_image, (128, 128))
+                # Resize to standard size
+                face_image = cv2.resize(face_image, (128, 128))
             
-            # Convert to grayscale
-            gray_face = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+                # Convert to grayscale
+                gray_face = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
             
-            # Normalize
-            normalized_face = gray_face / 255.0
+                # Normalize
+                normalized_face = gray_face / 255.0
             
-            # Flatten to 1D array
-            face_features = normalized_face.flatten()
+                # Flatten to 1D array
+                face_features = normalized_face.flatten()
             
-            features.append(face_features)
+                features.append(face_features)
         
         return features
     except Exception as e:
-        print(f"Error extracting face features: {e}")
+        logger.exception("Error extracting face features")
         return []
 
 def save_face_encoding(user, face_features):
@@ -96,7 +104,7 @@ def save_face_encoding(user, face_features):
         
         return True
     except Exception as e:
-        print(f"Error saving face encoding: {e}")
+        logger.exception("Error saving face encoding")
         return False
 
 def load_face_encoding(user):
@@ -108,7 +116,7 @@ def load_face_encoding(user):
                 return pickle.load(f)
         return None
     except Exception as e:
-        print(f"Error loading face encoding: {e}")
+        logger.exception("Error loading face encoding")
         return None
 
 def compare_faces(features1, features2, threshold=0.8):
@@ -125,7 +133,7 @@ def compare_faces(features1, features2, threshold=0.8):
         similarity = dot_product / (norm1 * norm2)
         return similarity
     except Exception as e:
-        print(f"Error comparing faces: {e}")
+        logger.exception("Error comparing faces")
         return 0.0
 
 def verify_face(user, captured_face_features, threshold=0.7):
@@ -136,7 +144,8 @@ def verify_face(user, captured_face_features, threshold=0.7):
             return False, 0.0, "No stored face features found"
         
         # Compare face features
-        similarity = compare_faces(stored_features, captured_face_features)
+        with stage('compare'):
+            similarity = compare_faces(stored_features, captured_face_features)
         
         if similarity >= threshold:
             return True, similarity, f"Face verified with {similarity:.2%} confidence"
@@ -144,7 +153,7 @@ def verify_face(user, captured_face_features, threshold=0.7):
             return False, similarity, f"Face does not match. Similarity: {similarity:.2%}"
             
     except Exception as e:
-        print(f"Error verifying face: {e}")
+        logger.exception("Error verifying face")
         return False, 0.0, f"Error during face verification: {str(e)}"
 
 def process_camera_image(image_data_url):
@@ -157,14 +166,15 @@ def process_camera_image(image_data_url):
             image_data = base64.b64decode(data)
             
             # Convert to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with stage('decode'):
+                nparr = np.frombuffer(image_data, np.uint8)
+                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             
             return image
         else:
             return None
     except Exception as e:
-        print(f"Error processing camera image: {e}")
+        logger.exception("Error processing camera image")
         return None
 
 def capture_and_verify_face(user, image_data_url):
@@ -194,7 +204,31 @@ def capture_and_verify_face(user, image_data_url):
         return is_match, confidence, message
         
     except Exception as e:
-        print(f"Error in capture_and_verify_face: {e}")
+        logger.exception("Error in capture_and_verify_face")
+        return False, 0.0, f"Error during face verification: {str(e)}"
+
+def verify_uploaded_face(user, image_file):
+    """Verify an uploaded image file against the user's stored face features"""
+    try:
+        image_array = process_uploaded_image(image_file)
+        if image_array is None:
+            return False, 0.0, "Could not process uploaded image"
+        
+        face_locations = detect_faces(image_array)
+        if not face_locations:
+            return False, 0.0, "No face detected in the image"
+        
+        if len(face_locations) > 1:
+            return False, 0.0, "Multiple faces detected. Please ensure only one face is visible"
+        
+        face_features = extract_face_features(image_array, face_locations)
+        if not face_features:
+            return False, 0.0, "Could not extract facial features"
+        
+        return verify_face(user, face_features[0])
+        
+    except Exception as e:
+        logger.exception("Error in verify_uploaded_face")
         return False, 0.0, f"Error during face verification: {str(e)}"
 
 def get_face_recognition_status(user):
@@ -203,7 +237,7 @@ def get_face_recognition_status(user):
         encoding_file = os.path.join(FACE_ENCODINGS_DIR, f'user_{user.id}_encoding.pkl')
         return os.path.exists(encoding_file)
     except Exception as e:
-        print(f"Error checking face recognition status: {e}")
+        logger.exception("Error checking face recognition status")
         return False
 
 def delete_face_encoding(user):
@@ -215,5 +249,5 @@ def delete_face_encoding(user):
             return True
         return False
     except Exception as e:
-        print(f"Error deleting face encoding: {e}")
+        logger.exception("Error deleting face encoding")
         return False
\ No newline at end of file
@@ -1,14 +1,52 @@
 from django import forms
-from .models import Attendance
+from django.urls import reverse_lazy
+from .models import Attendance, AttendanceStatus
+from .user_search import user_labels
 from django.contrib.auth.models import User
 
+
+class UserAutocompleteSelect(forms.Select):
+    """User select rendering only the empty and the selected option.
+
+    The other options are fetched from the autocomplete endpoint as the user
+    types (see static/js/user_autocomplete.js), so the page does not carry
+    an option per user. The submitted value is still the user's id.
+    """
+
+    class Media:
+        js = ['js/user_autocomplete.js']
+
+    def __init__(self, attrs=None):
+        super().__init__({
+            'class': 'form-select',
+            'data-autocomplete-url': reverse_lazy('attendance:user_autocomplete'),
+            **(attrs or {}),
+        })
+
+    def optgroups(self, name, value, attrs=None):
+        choices = []
+        empty_label = self.choices.field.empty_label
+        if empty_label is not None:
+            choices.append(('', empty_label))
+        user_ids = [int(user_id) for user_id in value if user_id.isdigit()]
+        labels = user_labels(user_ids, self.choices.queryset) if user_ids else {}
+        for user_id in value:
+            label = labels.get(int(user_id)) if user_id.isdigit() else None
+            if label is not None:
+                choices.append((user_id, label))
+        return [
+            (None, [self.create_option(name, option_value, label, str(option_value) in value, index, attrs=attrs)], index)
+            for index, (option_value, label) in enumerate(choices)
+        ]
+
+
 class AttendanceForm(forms.ModelForm):
     class Meta:
         model = Attendance
         fields = ['notes']
 
 class ManualAttendanceForm(forms.Form):
-    user = forms.ModelChoiceField(queryset=User.objects.all())
+    user = forms.ModelChoiceField(queryset=User.objects.all(), widget=UserAutocompleteSelect)
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     check_in_time = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
     check_out_time = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}), required=False)
@@ -18,4 +56,26 @@ class ManualAttendanceForm(forms.Form):
 class DateRangeForm(forms.Form):
     start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
-    user = forms.ModelChoiceField(queryset=User.objects.all(), required=False)
\ No newline at end of file
+    user = forms.ModelChoiceField(
+        queryset=User.objects.all(), required=False, empty_label='All Students', widget=UserAutocompleteSelect,
+    )
+
+class AnalyticsForm(forms.Form):
+    # Bounds the memory of the status matrix, one byte per user and day
+    MAX_DAYS = 731
+
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    status = forms.ChoiceField(choices=AttendanceStatus.STATUS_CHOICES, initial='absent')
+    threshold = forms.IntegerField(min_value=0, initial=3, help_text='Users with the status on more days than this')
+    window = forms.IntegerField(min_value=1, max_value=90, initial=7, help_text='Days in the rolling rate')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date:
+            if end_date < start_date:
+                raise forms.ValidationError('The end date must not be before the start date.')
+            if (end_date - start_date).days >= self.MAX_DAYS:
+                raise forms.ValidationError(f'Choose a range of at most {self.MAX_DAYS} days.')
+        return cleaned_data
@@ -0,0 +1,320 @@
+import http.cookiejar
+import io
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connections
+
+from .services import is_lock_error
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+QUERY_TIME_HEADER = 'X-Query-Time-Ms'
+LOCK_WAITS_HEADER = 'X-Lock-Waits'
+
+
+# Server side
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def instrumented_application(application):
+    """Wrap a WSGI application so every response reports the SQL it ran.
+
+    Query count, query time and the number of queries that failed because the
+    database was locked are added as response headers.
+    """
+    def wrapped(environ, start_response):
+        stats = {'queries': 0, 'time': 0.0, 'lock_waits': 0}
+
+        def count_queries(execute, sql, params, many, context):
+            stats['queries'] += 1
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as e:
+                if is_lock_error(e):
+                    stats['lock_waits'] += 1
+                raise
+            finally:
+                stats['time'] += time.perf_counter() - started
+
+        def instrumented_start_response(status, headers, exc_info=None):
+            headers = list(headers) + [
+                (QUERY_COUNT_HEADER, str(stats['queries'])),
+                (QUERY_TIME_HEADER, f"{stats['time'] * 1000:.2f}"),
+                (LOCK_WAITS_HEADER, str(stats['lock_waits'])),
+            ]
+            return start_response(status, headers, exc_info)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_queries))
+            return application(environ, instrumented_start_response)
+
+    return wrapped
+
+
+def start_server(host='127.0.0.1', port=0):
+    """Serve the project in background threads; returns ``(server, base_url)``"""
+    server = make_server(
+        host, port, instrumented_application(get_wsgi_application()),
+        server_class=ThreadingWSGIServer, handler_class=QuietRequestHandler,
+    )
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+# Client side
+
+def synthetic_face_images(count=8, seed=0):
+    """JPEG images of a drawn face-like shape; real encodings will not match them"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new('RGB', (320, 240), tuple(rng.randrange(120, 200) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        cx, cy = 160 + rng.randrange(-20, 20), 120 + rng.randrange(-10, 10)
+        draw.ellipse((cx - 55, cy - 70, cx + 55, cy + 70), fill=(224, 172, 105))
+        for dx in (-22, 22):
+            draw.ellipse((cx + dx - 8, cy - 25, cx + dx + 8, cy - 15), fill=(40, 40, 40))
+        draw.arc((cx - 25, cy + 15, cx + 25, cy + 40), 20, 160, fill=(120, 40, 40), width=4)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Result:
+    __slots__ = ('kind', 'status', 'latency', 'lag', 'queries', 'query_time', 'lock_waits', 'error')
+
+    def __init__(self, kind, status, latency, lag=0.0, headers=None, error=None):
+        headers = headers or {}
+        self.kind = kind
+        self.status = status
+        self.latency = latency
+        self.lag = lag
+        self.queries = int(headers[QUERY_COUNT_HEADER]) if QUERY_COUNT_HEADER in headers else None
+        self.query_time = float(headers[QUERY_TIME_HEADER]) if QUERY_TIME_HEADER in headers else None
+        self.lock_waits = int(headers.get(LOCK_WAITS_HEADER, 0))
+        self.error = error
+
+
+class SimulatedUser:
+    """One browser session: a cookie jar, a login and check-in posts"""
+
+    csrf_pattern = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+    def __init__(self, base_url, username, password, timeout=30):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, kind, path, data=None, content_type=None, lag=0.0):
+        headers = {'User-Agent': 'attendance-loadtest'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if data is not None:
+            headers['X-CSRFToken'] = self.csrf_token()
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                body = response.read()
+                status, response_headers = response.status, dict(response.headers)
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status, response_headers = e.code, dict(e.headers)
+        except (urllib.error.URLError, OSError) as e:
+            return Result(kind, 0, time.perf_counter() - started, lag, error=str(e)), b''
+        return Result(kind, status, time.perf_counter() - started, lag, response_headers), body
+
+    def login(self, lag=0.0):
+        result, body = self.request('login_form', '/login/')
+        match = self.csrf_pattern.search(body.decode(errors='replace'))
+        data = urllib.parse.urlencode({
+            'username': self.username,
+            'password': self.password,
+            'csrfmiddlewaretoken': match.group(1) if match else self.csrf_token(),
+        }).encode()
+        result, _ = self.request('login', '/login/', data, 'application/x-www-form-urlencoded', lag)
+        if result.status != 302 and not result.error:
+            result.error = 'login rejected'
+        return result
+
+    def check_in(self, path, face_image=None, lag=0.0):
+        fields = {'notes': 'load test', 'verification_method': 'face' if face_image else 'manual'}
+        files = {'face_image': ('face.jpg', face_image, 'image/jpeg')} if face_image else {}
+        data, content_type = encode_multipart(fields, files)
+        result, _ = self.request('face_check_in' if face_image else 'check_in', path, data, content_type, lag)
+        return result
+
+
+def arrival_offsets(count, duration, peak=0.35, spread=0.15, seed=0):
+    """Arrival times in seconds for a morning rush: a normal peak clipped to the window"""
+    rng = random.Random(seed)
+    offsets = []
+    for _ in range(count):
+        offset = rng.gauss(peak * duration, spread * duration)
+        offsets.append(min(max(offset, 0.0), duration))
+    return sorted(offsets)
+
+
+def run_rush(base_url, usernames, password, duration=60, concurrency=50, face_ratio=0.0,
+             endpoint='/attendance/mark/', prelogin=False, seed=0, stdout=None):
+    """Log users in and check them in on a morning-rush arrival curve.
+
+    Returns ``(results, elapsed)`` where results holds a ``Result`` per request.
+    With ``prelogin`` all sessions are created first and only check-ins are timed.
+    """
+    rng = random.Random(seed)
+    images = synthetic_face_images(seed=seed) if face_ratio else []
+    users = [SimulatedUser(base_url, username, password) for username in usernames]
+    face_images = {user.username: rng.choice(images) for user in users if rng.random() < face_ratio}
+
+    results = []
+    results_lock = threading.Lock()
+
+    def record(result):
+        with results_lock:
+            results.append(result)
+
+    if prelogin:
+        login_queue = list(users)
+
+        def login_worker():
+            while True:
+                with results_lock:
+                    if not login_queue:
+                        return
+                    user = login_queue.pop()
+                user.login()
+
+        threads = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if stdout:
+            stdout.write(f'Logged in {len(users)} users')
+
+    schedule = list(zip(arrival_offsets(len(users), duration, seed=seed), users))
+    schedule.reverse()
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            with results_lock:
+                if not schedule:
+                    return
+                offset, user = schedule.pop()
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lag = max(0.0, -delay)
+            if not prelogin:
+                login = user.login(lag)
+                record(login)
+                if login.error or login.status >= 400:
+                    continue
+            record(user.check_in(endpoint, face_images.get(user.username), lag))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results, time.perf_counter() - started
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(percent / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def summarize(results, elapsed):
+    """Aggregate results per request kind into a list of dicts"""
+    grouped = defaultdict(list)
+    for result in results:
+        grouped[result.kind].append(result)
+
+    summaries = []
+    for kind, items in sorted(grouped.items()):
+        latencies = sorted(result.latency * 1000 for result in items)
+        lags = sorted(result.lag * 1000 for result in items)
+        errors = [result for result in items if result.error or result.status == 0 or result.status >= 500]
+        contended = [result for result in items if result.lock_waits or result.status == 503]
+        queries = [result.queries for result in items if result.queries is not None]
+        query_times = [result.query_time for result in items if result.query_time is not None]
+        summaries.append({
+            'kind': kind,
+            'requests': len(items),
+            'throughput': len(items) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1],
+            'lag_p95': percentile(lags, 95),
+            'error_rate': len(errors) / len(items),
+            'lock_contention_rate': len(contended) / len(items),
+            'queries_per_request': sum(queries) / len(queries) if queries else None,
+            'query_ms_per_request': sum(query_times) / len(query_times) if query_times else None,
+            'statuses': dict(Counter(result.status for result in items)),
+            'sample_errors': sorted({result.error for result in errors if result.error})[:3],
+        })
+    return summaries
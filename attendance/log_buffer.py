@@ -0,0 +1,293 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AttendanceLog
+
+try:
+    import fcntl
+except ImportError:  # Windows; a spool file cannot be told apart from one still being written
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # When disabled every entry is written immediately with its own INSERT
+    'ENABLED': True,
+    # Flush as soon as this many entries are waiting...
+    'MAX_ENTRIES': 200,
+    # ...or after this many milliseconds
+    'FLUSH_INTERVAL_MS': 250,
+    # Directory of append-only spool files that make buffered entries survive a crash.
+    # None disables spooling.
+    'SPOOL_DIR': None,
+    # fsync every spooled entry; protects against power loss at a large throughput cost
+    'FSYNC': False,
+}
+
+FIELDS = ('user_id', 'log_type', 'verification_method', 'success', 'ip_address', 'device_info', 'timestamp')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_LOG_BUFFER', {})}
+
+
+def _entry_to_log(entry):
+    fields = dict(entry)
+    fields['timestamp'] = parse_datetime(fields['timestamp'])
+    return AttendanceLog(**fields)
+
+
+def write_entries(entries):
+    """Insert log entries with one multi-row INSERT per batch"""
+    logs = AttendanceLog.objects.bulk_create([_entry_to_log(entry) for entry in entries], batch_size=500)
+    return logs
+
+
+class AttendanceLogBuffer:
+    """Collects AttendanceLog entries in memory and writes them in batches.
+
+    Entries are flushed by a background thread every ``flush_interval`` seconds or as
+    soon as ``max_entries`` are waiting. When a spool directory is configured every
+    entry is also appended to a per-process spool segment before it is acknowledged;
+    segments stay locked until their entries are in the database and are then
+    deleted, and segments left behind by a crashed process are replayed when the
+    next writer starts. Spooling relies on ``flock`` and so needs a POSIX system.
+    """
+
+    def __init__(self, max_entries=200, flush_interval=0.25, spool_dir=None, fsync=False):
+        if spool_dir:
+            _check_spooling()
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._entries = []
+        self._thread = None
+        self._closed = False
+
+        self._segment_prefix = f"{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+        self._segment_number = 0
+        self._segment_file = None
+        self._pending_segments = []
+
+    # Spooling
+
+    def _segment_path(self, number):
+        return os.path.join(self.spool_dir, f"{self._segment_prefix}-{number:06d}.ndjson")
+
+    def _open_segment(self):
+        self._segment_number += 1
+        path = self._segment_path(self._segment_number)
+        self._segment_file = open(path, 'a', encoding='utf-8')
+        _lock_file(self._segment_file)
+        return path
+
+    def _rotate_segment(self):
+        """Detach the current segment and return it; called with the lock held.
+
+        The segment stays open, and so locked, until its entries are written:
+        closing it would let ``replay_spool`` insert them a second time.
+        """
+        segment, self._segment_file = self._segment_file, None
+        return segment
+
+    def _spool(self, entry):
+        if self._segment_file is None:
+            self._open_segment()
+        self._segment_file.write(json.dumps(entry) + '\n')
+        self._segment_file.flush()
+        if self.fsync:
+            os.fsync(self._segment_file.fileno())
+
+    # Public API
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.spool_dir:
+                os.makedirs(self.spool_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='attendance-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, **fields):
+        """Queue one AttendanceLog entry; only memory and an append to the spool file"""
+        if self._thread is None:
+            self.start()
+        entry = {field: fields.get(field) for field in FIELDS}
+        entry['timestamp'] = (fields.get('timestamp') or timezone.now()).isoformat()
+        if entry['success'] is None:
+            entry['success'] = True
+
+        with self._lock:
+            if self.spool_dir:
+                self._spool(entry)
+            self._entries.append(entry)
+            pending = len(self._entries)
+
+        if pending >= self.max_entries:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all queued entries to the database; returns the number written"""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+                segment = self._rotate_segment()
+                if segment:
+                    self._pending_segments.append(segment)
+                segments = list(self._pending_segments)
+
+            if not entries:
+                return 0
+
+            try:
+                write_entries(entries)
+            except Exception:
+                logger.exception('Could not write %d attendance log entries, will retry', len(entries))
+                with self._lock:
+                    self._entries = entries + self._entries
+                return 0
+
+            with self._lock:
+                self._pending_segments = [s for s in self._pending_segments if s not in segments]
+            # Removed while still locked, so no other process can replay them
+            for segment in segments:
+                _remove(segment.name)
+                segment.close()
+            return len(entries)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        if self.spool_dir:
+            try:
+                replay_spool(self.spool_dir)
+            except Exception:
+                logger.exception('Could not replay attendance log spool')
+
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+def replay_spool(spool_dir):
+    """Insert entries from spool segments abandoned by dead processes.
+
+    Entries already present (the process died after its INSERT but before deleting
+    the segment) are skipped, so replaying is idempotent.
+    """
+    _check_spooling()
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(spool_dir, '*.ndjson'))):
+        with open(path, 'r+', encoding='utf-8') as spool_file:
+            if not _try_lock_file(spool_file):
+                continue  # still owned by a live writer
+            if os.fstat(spool_file.fileno()).st_nlink == 0:
+                continue  # written and removed by its writer since it was listed
+            entries = [json.loads(line) for line in spool_file if line.strip()]
+
+        if entries:
+            logs = [_entry_to_log(entry) for entry in entries]
+            existing = set(AttendanceLog.objects.filter(
+                user_id__in={log.user_id for log in logs},
+                timestamp__in={log.timestamp for log in logs},
+            ).values_list('user_id', 'timestamp', 'log_type'))
+            missing = [entry for entry, log in zip(entries, logs)
+                       if (log.user_id, log.timestamp, log.log_type) not in existing]
+            if missing:
+                write_entries(missing)
+            replayed += len(missing)
+        _remove(path)
+
+    if replayed:
+        logger.warning('Replayed %d attendance log entries from %s', replayed, spool_dir)
+    return replayed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _lock_file(fileobj):
+    fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _try_lock_file(fileobj):
+    try:
+        fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _check_spooling():
+    if fcntl is None:
+        raise ImproperlyConfigured(
+            'Spooling attendance log entries needs POSIX file locks; '
+            "set ATTENDANCE_LOG_BUFFER['SPOOL_DIR'] to None on this platform"
+        )
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_log_buffer():
+    """Process-wide log buffer configured by ``settings.ATTENDANCE_LOG_BUFFER``"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_config()
+                _buffer = AttendanceLogBuffer(
+                    max_entries=config['MAX_ENTRIES'],
+                    flush_interval=config['FLUSH_INTERVAL_MS'] / 1000,
+                    spool_dir=config['SPOOL_DIR'],
+                    fsync=config['FSYNC'],
+                )
+    return _buffer
+
+
+def start_log_buffer():
+    """Start the writer of this process, which first replays spool segments left by dead processes"""
+    config = get_config()
+    if config['ENABLED'] and config['SPOOL_DIR']:
+        get_log_buffer().start()
+
+
+def enqueue_log(**fields):
+    """Record an AttendanceLog entry through the buffer, or directly when buffering is disabled"""
+    if not get_config()['ENABLED']:
+        if fields.get('timestamp') is None:
+            fields.pop('timestamp', None)
+        return AttendanceLog.objects.create(**fields)
+    get_log_buffer().enqueue(**fields)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from attendance.archive import ARCHIVED_MODELS, archive_old_rows, get_config
+
+class Command(BaseCommand):
+    help = 'Move old attendance logs and notifications into compressed monthly archive files'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help=f'Archive rows older than this many days (default: {config["RETENTION_DAYS"]})',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help=f'Rows moved per transaction (default: {config["CHUNK_SIZE"]})',
+        )
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=sorted(ARCHIVED_MODELS),
+            help='Only archive this model; may be given more than once',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the rows that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        results = archive_old_rows(
+            retention_days=options['days'],
+            chunk_size=options['chunk_size'],
+            models=options['model'],
+            dry_run=options['dry_run'],
+        )
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        for name, rows in results.items():
+            self.stdout.write(f'{verb} {rows} {name} rows')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {sum(results.values())} rows to {get_config()["DIR"]}')
+        )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from attendance.models import Attendance
+from attendance.policy import get_shift_policy
+from attendance.signals import attendance_changed
+
+class Command(BaseCommand):
+    help = 'Recompute the stored worked_seconds, is_late and left_early columns of attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of records updated per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        policy = get_shift_policy()
+        last_pk = 0
+        processed = 0
+        changed = 0
+
+        while True:
+            batch = list(
+                Attendance.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            updated = []
+            for record in batch:
+                before = tuple(getattr(record, field) for field in Attendance.METRIC_FIELDS)
+                record.update_metrics(policy)
+                if tuple(getattr(record, field) for field in Attendance.METRIC_FIELDS) != before:
+                    updated.append(record)
+
+            if updated:
+                with transaction.atomic():
+                    Attendance.objects.bulk_update(updated, Attendance.METRIC_FIELDS)
+                    attendance_changed.send(sender=Attendance, instances=updated, created=False, deleted=False)
+
+            processed += len(batch)
+            changed += len(updated)
+            self.stdout.write(f'Processed {processed} records, updated {changed}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully backfilled attendance metrics. '
+                f'Processed: {processed}, Updated: {changed}'
+            )
+        )
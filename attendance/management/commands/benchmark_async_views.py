@@ -0,0 +1,195 @@
+import asyncio
+import io
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from attendance.loadtest import percentile
+from attendance.models import DailyAttendanceNotification
+
+BENCHMARK_USER = 'benchmark_async_views'
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent throughput of the synchronous JSON endpoints through the WSGI handler '
+        '(one thread per request) and their async twins through the ASGI handler (one event loop)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Requests sent per handler and endpoint (default: 1000)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Requests in flight at once: WSGI threads or concurrent ASGI tasks (default: 50)',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            dest='endpoints',
+            choices=['status', 'read', 'summary'],
+            help='Endpoint to benchmark, repeatable (default: all): mark_attendance_status, '
+                 'mark_notification_read or create_daily_notification',
+        )
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USER, defaults={'is_staff': True})
+        client = Client()
+        client.force_login(user)
+        csrf_token = get_random_string(32)
+        cookie = f"sessionid={client.cookies['sessionid'].value}; csrftoken={csrf_token}"
+        notification = DailyAttendanceNotification.objects.create(
+            notification_type='system_alert', title=BENCHMARK_USER, message=BENCHMARK_USER,
+        )
+        # name: (view name, URL arguments, form data)
+        endpoints = {
+            'status': ('mark_attendance_status', [], {'user_id': user.pk, 'status': 'present'}),
+            'read': ('mark_notification_read', [notification.pk], {}),
+            'summary': ('create_daily_notification', [], {'type': 'system_alert', 'message': BENCHMARK_USER}),
+        }
+
+        wsgi, asgi = get_wsgi_application(), get_asgi_application()
+        requests, concurrency = options['requests'], options['concurrency']
+        try:
+            for name in options['endpoints'] or list(endpoints):
+                view, args, data = endpoints[name]
+                sync_path = reverse(f'attendance:{view}', args=args)
+                async_path = reverse(f'attendance:{view}_async', args=args)
+                body = urlencode(data).encode()
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\nPOST {sync_path} ({requests} requests, {concurrency} concurrent)'))
+                sync = self.run_wsgi(wsgi, sync_path, body, cookie, csrf_token, requests, concurrency)
+                self.report(f'WSGI (threads), {sync_path}', *sync)
+                async_ = asyncio.run(self.run_asgi(asgi, async_path, body, cookie, csrf_token, requests, concurrency))
+                self.report(f'ASGI (event loop), {async_path}', *async_)
+                # Same number of requests, so the throughput ratio is the inverse ratio of the elapsed times
+                self.stdout.write(self.style.SUCCESS(f'Async/sync throughput: {sync[1] / async_[1]:.2f}x'))
+        finally:
+            DailyAttendanceNotification.objects.filter(message=BENCHMARK_USER).delete()
+            user.delete()
+
+    def run_wsgi(self, application, path, body, cookie, csrf_token, requests, concurrency):
+        """Send the requests from ``concurrency`` threads; returns ``(latencies, elapsed, statuses)``"""
+        latencies, statuses = [], []
+        lock = threading.Lock()
+        remaining = [requests]
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    environ = {
+                        'REQUEST_METHOD': 'POST',
+                        'PATH_INFO': path,
+                        'QUERY_STRING': '',
+                        'SERVER_NAME': HOST,
+                        'SERVER_PORT': '80',
+                        'SERVER_PROTOCOL': 'HTTP/1.1',
+                        'REMOTE_ADDR': '127.0.0.1',
+                        'HTTP_HOST': HOST,
+                        'HTTP_COOKIE': cookie,
+                        'HTTP_X_CSRFTOKEN': csrf_token,
+                        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+                        'CONTENT_LENGTH': str(len(body)),
+                        'wsgi.input': io.BytesIO(body),
+                        'wsgi.url_scheme': 'http',
+                        'wsgi.errors': io.StringIO(),
+                    }
+                    status = []
+                    started = time.perf_counter()
+                    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+                    b''.join(response)
+                    response.close()
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                        statuses.append(int(status[0].split()[0]))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, time.perf_counter() - started, statuses
+
+    async def run_asgi(self, application, path, body, cookie, csrf_token, requests, concurrency):
+        """Send the requests as ``concurrency`` concurrent tasks; returns ``(latencies, elapsed, statuses)``"""
+        latencies, statuses = [], []
+        semaphore = asyncio.Semaphore(concurrency)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'client': ('127.0.0.1', 0),
+            'server': (HOST, 80),
+            'headers': [
+                (b'host', HOST.encode()),
+                (b'cookie', cookie.encode()),
+                (b'x-csrftoken', csrf_token.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        }
+
+        async def request():
+            sent = []
+            disconnected = asyncio.Event()
+
+            async def receive():
+                if not sent:
+                    sent.append(True)
+                    return {'type': 'http.request', 'body': body, 'more_body': False}
+                # The handler watches for a disconnect while the view runs
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(dict(scope), receive, send)
+                latencies.append(time.perf_counter() - started)
+                statuses.append(status[0])
+                disconnected.set()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        return latencies, time.perf_counter() - started, statuses
+
+    def report(self, label, latencies, elapsed, statuses):
+        latencies = sorted(latency * 1000 for latency in latencies)
+        errors = sum(1 for status in statuses if status >= 400)
+        self.stdout.write(
+            f'{label}: {len(latencies) / elapsed:,.0f} req/s, p50 {percentile(latencies, 50):.1f}ms, '
+            f'p95 {percentile(latencies, 95):.1f}ms, {errors} errors'
+        )
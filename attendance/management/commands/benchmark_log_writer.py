@@ -0,0 +1,106 @@
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from attendance.log_buffer import AttendanceLogBuffer
+from attendance.models import AttendanceLog
+
+BENCHMARK_DEVICE = 'benchmark_log_writer'
+
+class Command(BaseCommand):
+    help = 'Compare AttendanceLog write throughput of direct inserts and the buffered writer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entries',
+            type=int,
+            default=2000,
+            help='Log entries written per mode (default: 2000)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Concurrent writer threads (default: 4)',
+        )
+        parser.add_argument(
+            '--max-entries',
+            type=int,
+            default=200,
+            help='Buffer size that triggers a flush (default: 200)',
+        )
+        parser.add_argument(
+            '--flush-interval-ms',
+            type=int,
+            default=250,
+            help='Buffer flush interval in milliseconds (default: 250)',
+        )
+        parser.add_argument(
+            '--no-spool',
+            action='store_true',
+            help='Benchmark the buffer without its crash spool file',
+        )
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_DEVICE, defaults={'is_active': False})
+        entries = options['entries']
+        threads = options['threads']
+
+        try:
+            direct = self.run_threads(threads, entries, lambda: self.write_direct(user))
+            self.report('Direct inserts', entries, direct)
+
+            with tempfile.TemporaryDirectory() as spool_dir:
+                buffer = AttendanceLogBuffer(
+                    max_entries=options['max_entries'],
+                    flush_interval=options['flush_interval_ms'] / 1000,
+                    spool_dir=None if options['no_spool'] else spool_dir,
+                )
+                buffer.start()
+                enqueued = self.run_threads(threads, entries, lambda: buffer.enqueue(
+                    user_id=user.pk, log_type='check_in', verification_method='manual', device_info=BENCHMARK_DEVICE,
+                ))
+                start = time.perf_counter()
+                buffer.close()
+                drained = enqueued + time.perf_counter() - start
+            self.report('Buffered enqueue (request path)', entries, enqueued)
+            self.report('Buffered, until flushed', entries, drained)
+
+            written = AttendanceLog.objects.filter(user=user, device_info=BENCHMARK_DEVICE).count()
+            if written != entries * 2:
+                self.stdout.write(self.style.ERROR(f'Expected {entries * 2} log rows, found {written}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Speed-up: {direct / drained:.1f}x'))
+        finally:
+            AttendanceLog.objects.filter(user=user, device_info=BENCHMARK_DEVICE).delete()
+            user.delete()
+
+    def write_direct(self, user):
+        AttendanceLog.objects.create(
+            user=user, log_type='check_in', verification_method='manual', device_info=BENCHMARK_DEVICE,
+        )
+
+    def run_threads(self, threads, entries, write):
+        """Run ``write`` ``entries`` times spread over ``threads`` threads; returns elapsed seconds"""
+        per_thread = [entries // threads + (1 if i < entries % threads else 0) for i in range(threads)]
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    write()
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, label, entries, elapsed):
+        self.stdout.write(f'{label}: {entries} entries in {elapsed:.3f}s ({entries / elapsed:,.0f} entries/s)')
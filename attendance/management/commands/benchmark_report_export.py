@@ -0,0 +1,103 @@
+import resource
+import threading
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from attendance.models import Attendance
+from attendance.reports import report_rows, spool_xlsx
+
+# How often the memory of the process is sampled during the export
+SAMPLE_INTERVAL = 0.02
+
+
+def anonymous_memory():
+    """Bytes of memory the process uses, leaving out mapped files such as the database's mmap"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Elsewhere only the peak resident size is available, mapped files included
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    """Samples ``anonymous_memory`` in a thread and keeps the highest value"""
+
+    def __init__(self):
+        self.peak = anonymous_memory()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, anonymous_memory())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, anonymous_memory())
+
+
+class Command(BaseCommand):
+    help = 'Export a detailed XLSX report of many rows and check its memory use stays under a fixed ceiling'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Rows exported; the attendance records are read again as often as needed (default: 1000000)',
+        )
+        parser.add_argument(
+            '--max-memory-mb',
+            type=int,
+            default=64,
+            help='Most the memory of the process may grow during the export (default: 64)',
+        )
+
+    def handle(self, *args, **options):
+        bounds = Attendance.objects.aggregate(start=Min('date'), end=Max('date'))
+        if bounds['start'] is None:
+            raise CommandError('There are no attendance records; create some with "manage.py generate_dataset".')
+
+        exported = 0
+
+        def rows():
+            nonlocal exported
+            while exported < options['rows']:
+                before = exported
+                for row in islice(report_rows('detailed', bounds['start'], bounds['end']), options['rows'] - exported):
+                    exported += 1
+                    yield row
+                if exported == before:
+                    return
+
+        # Imports and first-use caches are not part of what the export needs per row
+        spool_xlsx('detailed', islice(report_rows('detailed', bounds['start'], bounds['end']), 1000)).close()
+
+        baseline = anonymous_memory()
+        start = time.perf_counter()
+        with PeakMemory() as memory:
+            with spool_xlsx('detailed', rows()) as spool:
+                size = spool.seek(0, 2)
+        elapsed = time.perf_counter() - start
+
+        growth = (memory.peak - baseline) / 2 ** 20
+        self.stdout.write(
+            f'Exported {exported:,} rows in {elapsed:.1f}s ({exported / elapsed:,.0f} rows/s), '
+            f'{size / 2 ** 20:.1f} MB'
+        )
+        self.stdout.write(f'Memory: {baseline / 2 ** 20:.1f} MB before, peak {growth:+.1f} MB during the export')
+        if growth > options['max_memory_mb']:
+            raise CommandError(f"Memory grew by {growth:.1f} MB, more than the {options['max_memory_mb']} MB ceiling")
+        self.stdout.write(self.style.SUCCESS(f"Within the {options['max_memory_mb']} MB ceiling"))
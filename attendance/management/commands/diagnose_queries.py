@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+
+from attendance.diagnostics import SlowQueryRecorder, analyze, run_views, write_migration
+
+
+class Command(BaseCommand):
+    help = 'Run the attendance views, group slow queries, explain their plans and suggest missing indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold-ms',
+            type=float,
+            default=5,
+            help='Only record queries slower than this many milliseconds (default: 5, 0 records all)',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Request this path as a staff user instead of the default pages (repeatable)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Number of query groups to print (default: 20)',
+        )
+        parser.add_argument(
+            '--write-migration',
+            action='store_true',
+            help='Write a migration adding the suggested indexes of attendance models',
+        )
+
+    def handle(self, *args, **options):
+        recorder = SlowQueryRecorder(options['threshold_ms'])
+        self.stdout.write('Requesting views (changes are rolled back):')
+        run_views(recorder, [(None, path) for path in options['paths']] if options['paths'] else None, self.stdout)
+        self.stdout.write(
+            f"{recorder.executed} queries executed, {sum(group.count for group in recorder.groups.values())} "
+            f"slower than {options['threshold_ms']:g}ms in {len(recorder.groups)} groups"
+        )
+
+        findings, suggestions = analyze(recorder)
+        for finding in findings[:options['limit']]:
+            self.report(finding)
+
+        flagged = sum(1 for finding in findings if finding['watched_scans'])
+        style = self.style.ERROR if flagged else self.style.SUCCESS
+        self.stdout.write(style(f'\n{flagged} query groups scan an attendance table completely'))
+        if not suggestions:
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nSuggested indexes:'))
+        for (model, columns), index in suggestions.items():
+            self.stdout.write(f"  {model._meta.label}: models.Index(fields={index.fields!r}, name={index.name!r})")
+
+        if options['write_migration']:
+            indexes = [(model, index) for (model, _), index in suggestions.items() if model._meta.app_label == 'attendance']
+            if indexes:
+                path = write_migration('attendance', indexes)
+                self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
+                self.stdout.write('Add the same indexes to Meta.indexes of the models so makemigrations stays clean.')
+        else:
+            self.stdout.write('Run with --write-migration to generate a migration for them.')
+
+    def report(self, finding):
+        group = finding['group']
+        heading = self.style.ERROR if finding['watched_scans'] else self.style.MIGRATE_HEADING
+        self.stdout.write(heading(
+            f"\n{group.count}x, {group.total * 1000:.1f}ms total, {group.slowest * 1000:.1f}ms slowest"
+            + (f" - full scan of {', '.join(finding['watched_scans'])}" if finding['watched_scans'] else '')
+        ))
+        self.stdout.write(f'  {group.normalized}')
+        self.stdout.write(f"  from {', '.join(sorted(group.paths))}")
+        for detail in finding['plan']:
+            self.stdout.write(f'    {detail}')
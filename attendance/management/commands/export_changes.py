@@ -0,0 +1,96 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.changes import CursorExpired, get_config, prune_changes, read_changes
+from attendance.pagination import InvalidCursor
+
+
+def _replace(path, data):
+    """Write ``data`` to ``path`` through a temporary file, so readers never see half of it"""
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as output:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(partial, path)
+
+
+class Command(BaseCommand):
+    help = 'Export the attendance, status and log changes after a cursor as NDJSON pages'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument(
+            '--cursor',
+            help='Export the changes after this cursor; "latest" skips to the newest change '
+                 '(default: the cursor file, else the oldest change kept)',
+        )
+        parser.add_argument(
+            '--cursor-file',
+            help='Read the cursor from this file and store the next one in it after each page',
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Write each page to a gzipped changes-<last change>.ndjson.gz file here instead of to stdout',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help=f'Changes per page (default: {config["PAGE_SIZE"]})',
+        )
+        parser.add_argument(
+            '--max-pages',
+            type=int,
+            default=None,
+            help='Stop after this many pages (default: until no changes are left)',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help=f'Afterwards delete changes older than {config["RETENTION_DAYS"]} days',
+        )
+
+    def handle(self, *args, **options):
+        cursor = options['cursor']
+        cursor_file = options['cursor_file']
+        if cursor is None and cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file) as stored:
+                cursor = stored.read().strip() or None
+        output_dir = options['output_dir']
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        # With the pages on stdout, the summary goes to stderr
+        report = self.stdout if output_dir else self.stderr
+
+        pages = changes = 0
+        while True:
+            try:
+                page = read_changes(cursor, options['limit'])
+            except CursorExpired as e:
+                raise CommandError(f'{e}; start again from a full export with --cursor latest')
+            except (InvalidCursor, ValueError) as e:
+                raise CommandError(str(e))
+
+            if page.lines:
+                ndjson = ''.join(f'{line}\n' for line in page.lines)
+                if output_dir:
+                    path = os.path.join(output_dir, f'changes-{page.last_seq:012d}.ndjson.gz')
+                    _replace(path, gzip.compress(ndjson.encode()))
+                else:
+                    self.stdout.write(ndjson, ending='')
+            # Stored only once the page is written, so a failed run exports the page again
+            cursor = page.cursor
+            if cursor_file:
+                _replace(cursor_file, f'{cursor}\n'.encode())
+
+            pages += 1
+            changes += len(page.lines)
+            if not page.more or (options['max_pages'] and pages >= options['max_pages']):
+                break
+
+        report.write(self.style.SUCCESS(f'Exported {changes} changed rows in {pages} pages; next cursor: {cursor}'))
+        if options['prune']:
+            report.write(f'Pruned {prune_changes()} old changes')
@@ -0,0 +1,97 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from attendance.dataset import BATCH_SIZE, DEFAULT_PASSWORD, delete_dataset, generate_dataset
+from attendance.rollups import rebuild_department_months
+
+class Command(BaseCommand):
+    help = 'Bulk-create a deterministic synthetic dataset of users and attendance history for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Number of users to create (default: 1000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Days of history per user, ending yesterday (default: 90)',
+        )
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            help='Last generated day in YYYY-MM-DD format (default: yesterday)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed; the same seed and arguments produce the same data (default: 0)',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='synthetic',
+            help='Username prefix of the generated users (default: synthetic)',
+        )
+        parser.add_argument(
+            '--include-weekends',
+            action='store_true',
+            help='Also generate attendance on Saturdays and Sundays',
+        )
+        parser.add_argument(
+            '--face-encodings',
+            type=int,
+            default=0,
+            help='Write synthetic face encodings for face users among the first N users (default: 0)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Rows per bulk insert (default: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete users with the same prefix and their records first',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['clear']:
+            deleted = delete_dataset(prefix)
+            self.stdout.write(f'Deleted {deleted} existing rows for prefix "{prefix}"')
+        elif User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users with prefix "{prefix}" already exist; use --clear or another --prefix')
+
+        started = time.perf_counter()
+        counts = generate_dataset(
+            users=options['users'],
+            days=options['days'],
+            seed=options['seed'],
+            end=options['end_date'],
+            prefix=prefix,
+            include_weekends=options['include_weekends'],
+            face_encodings=options['face_encodings'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        generated = time.perf_counter() - started
+
+        # User-day rollups are written with the records; only the department months remain
+        department_months = rebuild_department_months(counts['start'], counts['end'])
+        self.stdout.write(f'Rebuilt {department_months} department-month rollups')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated {counts["users"]} users, {counts["attendance"]} attendance records, '
+                f'{counts["statuses"]} statuses, {counts["logs"]} logs and '
+                f'{counts["face_encodings"]} face encodings in {generated:.1f}s. '
+                f'Users can log in with the password "{DEFAULT_PASSWORD}".'
+            )
+        )
@@ -0,0 +1,153 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from attendance.dataset import DEFAULT_PASSWORD
+from attendance.loadtest import run_rush, start_server, summarize
+from attendance.models import Attendance
+from attendance.signals import attendance_changed
+
+ENDPOINTS = {
+    'form': '/attendance/mark/',
+    'api': '/attendance/api/check-in/',
+}
+
+
+class Command(BaseCommand):
+    help = 'Simulate a morning rush of users logging in and checking in against a local server'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Number of simulated users (default: 1000)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60,
+            help='Length of the arrival window in seconds (default: 60)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Maximum requests in flight at once (default: 50)',
+        )
+        parser.add_argument(
+            '--face-ratio',
+            type=float,
+            default=0.2,
+            help='Share of users checking in with a synthetic face image (default: 0.2)',
+        )
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(ENDPOINTS),
+            default='form',
+            help='Post to the mark attendance form or the JSON check-in API (default: form)',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='synthetic',
+            help='Username prefix of the generated users to log in as (default: synthetic)',
+        )
+        parser.add_argument(
+            '--password',
+            default=DEFAULT_PASSWORD,
+            help='Password of the simulated users (default: the generate_dataset password)',
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of an already running server instead of an in-process one',
+        )
+        parser.add_argument(
+            '--prelogin',
+            action='store_true',
+            help='Log every user in before the rush and only time the check-ins',
+        )
+        parser.add_argument(
+            '--reset-today',
+            action='store_true',
+            help="Delete today's attendance of the simulated users first so every check-in is new",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed of the arrival curve and face images (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        usernames = list(
+            User.objects.filter(username__startswith=options['prefix'], is_active=True)
+            .order_by('username').values_list('username', flat=True)[:options['users']]
+        )
+        if not usernames:
+            raise CommandError(
+                f"No users starting with '{options['prefix']}'; create them with generate_dataset first"
+            )
+        if len(usernames) < options['users']:
+            self.stdout.write(self.style.WARNING(f'Only {len(usernames)} users found'))
+
+        if options['reset_today']:
+            self.reset_today(usernames)
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            server, base_url = start_server()
+        self.stdout.write(
+            f"Rush of {len(usernames)} users over {options['duration']:g}s against {base_url} "
+            f"({options['concurrency']} concurrent)"
+        )
+
+        try:
+            results, elapsed = run_rush(
+                base_url.rstrip('/'), usernames, options['password'],
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                face_ratio=options['face_ratio'],
+                endpoint=ENDPOINTS[options['endpoint']],
+                prelogin=options['prelogin'],
+                seed=options['seed'],
+                stdout=self.stdout,
+            )
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        self.stdout.write(f'{len(results)} requests in {elapsed:.1f}s')
+        for summary in summarize(results, elapsed):
+            self.report(summary)
+
+    def reset_today(self, usernames):
+        records = list(Attendance.objects.filter(user__username__in=usernames, date=timezone.localdate()))
+        with transaction.atomic():
+            Attendance.objects.filter(pk__in=[record.pk for record in records]).delete()
+            attendance_changed.send(sender=Attendance, instances=records, created=False, deleted=True)
+        self.stdout.write(f"Deleted {len(records)} attendance records of today")
+
+    def report(self, summary):
+        self.stdout.write(self.style.MIGRATE_HEADING(summary['kind']))
+        self.stdout.write(
+            f"  {summary['requests']} requests, {summary['throughput']:.1f} req/s, "
+            f"statuses {summary['statuses']}"
+        )
+        self.stdout.write(
+            f"  latency p50 {summary['p50']:.0f}ms  p95 {summary['p95']:.0f}ms  "
+            f"p99 {summary['p99']:.0f}ms  max {summary['max']:.0f}ms  (arrival lag p95 {summary['lag_p95']:.0f}ms)"
+        )
+        style = self.style.ERROR if summary['error_rate'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"  errors {summary['error_rate']:.1%}  lock contention {summary['lock_contention_rate']:.1%}"
+        ))
+        if summary['queries_per_request'] is not None:
+            self.stdout.write(
+                f"  server side {summary['queries_per_request']:.1f} queries, "
+                f"{summary['query_ms_per_request']:.1f}ms SQL per request"
+            )
+        for error in summary['sample_errors']:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from attendance.models import Attendance, AttendanceStatus
+from attendance.rollups import rebuild_rollups
+from datetime import date
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily user and monthly department attendance rollups for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=str,
+            help='First date in YYYY-MM-DD format (default: earliest attendance record)',
+        )
+        parser.add_argument(
+            '--end',
+            type=str,
+            help='Last date in YYYY-MM-DD format (default: latest attendance record)',
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=7,
+            help='Number of days rebuilt per transaction (default: 7)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            self.stdout.write(
+                self.style.ERROR('Invalid date format. Use YYYY-MM-DD')
+            )
+            return
+
+        if start is None or end is None:
+            bounds = [
+                Attendance.objects.aggregate(first=Min('date'), last=Max('date')),
+                AttendanceStatus.objects.aggregate(first=Min('date'), last=Max('date')),
+            ]
+            firsts = [b['first'] for b in bounds if b['first']]
+            lasts = [b['last'] for b in bounds if b['last']]
+            if not firsts:
+                self.stdout.write(self.style.WARNING('No attendance data to roll up'))
+                return
+            start = start or min(firsts)
+            end = end or max(lasts)
+
+        if start > end:
+            self.stdout.write(self.style.ERROR('Start date must not be after end date'))
+            return
+
+        user_days, department_months = rebuild_rollups(start, end, options['chunk_days'], stdout=self.stdout)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt rollups for {start} to {end}. '
+                f'User-days: {user_days}, Department-months: {department_months}'
+            )
+        )
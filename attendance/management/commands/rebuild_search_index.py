@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from attendance.search import INDEXES, create_search_indexes, rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = (
+        'Refill the FTS5 search indexes used by the admin search boxes from their tables, '
+        'creating them first if they are missing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            action='append',
+            dest='indexes',
+            choices=sorted(INDEXES),
+            help='Index to rebuild, repeatable (default: all)',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the indexes in (default: "default")',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search_available(using):
+            with connections[using].schema_editor() as schema_editor:
+                created = create_search_indexes(schema_editor)
+            if not created:
+                self.stdout.write(self.style.WARNING(
+                    'This database has no SQLite FTS5 support; the admin keeps searching with LIKE'
+                ))
+                return
+            self.stdout.write('Created the search indexes')
+
+        for name in options['indexes'] or list(INDEXES):
+            started = time.perf_counter()
+            rows = rebuild_search_index(name, using)
+            self.stdout.write(f'{name}: {rows} rows indexed in {time.perf_counter() - started:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from attendance.report_jobs import claim_next_job, cleanup_expired_jobs, run_report_job, worker_name
+from attendance.reports import DEFAULT_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Process queued background report jobs from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the pending jobs and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between queue polls when idle (default: 2)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows fetched and written per chunk (default: {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--cleanup-only',
+            action='store_true',
+            help='Delete expired report files and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup_only']:
+            deleted = cleanup_expired_jobs()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired report jobs'))
+            return
+
+        name = worker_name()
+        self.stdout.write(f'Report worker {name} started')
+
+        while True:
+            cleanup_expired_jobs()
+            job = claim_next_job(name)
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Generating report job {job.pk} ({job})')
+            try:
+                run_report_job(job, chunk_size=options['chunk_size'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Report job {job.pk} failed: {e}'))
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Report job {job.pk} completed with {job.rows_written} rows')
+                )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_attendancelog_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancelog',
+            index=models.Index(fields=['timestamp'], name='attendance__timesta_811a1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyattendancenotification',
+            index=models.Index(fields=['created_at'], name='attendance__created_a8cdb8_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_archive_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancestatus',
+            index=models.Index(fields=['date', 'user'], name='attendance__date_2ba1e1_idx'),
+        ),
+    ]
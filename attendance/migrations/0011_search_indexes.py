@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # Without FTS5 nothing is created and the admin keeps its LIKE search;
+    # the rebuild_search_index command creates the indexes later
+    from attendance.search import create_search_indexes
+
+    create_search_indexes(schema_editor)
+
+
+def drop_search_indexes(apps, schema_editor):
+    from attendance.search import drop_search_indexes
+
+    drop_search_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_attendance_versions'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
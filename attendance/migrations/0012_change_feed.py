@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_change_triggers(apps, schema_editor):
+    # Changes made before the feed existed are not recorded; consumers start
+    # from a full export and then follow the feed
+    from attendance.changes import create_change_triggers
+
+    create_change_triggers(schema_editor)
+
+
+def drop_change_triggers(apps, schema_editor):
+    from attendance.changes import drop_change_triggers
+
+    drop_change_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('attendance', 'Attendance'), ('status', 'Attendance status'), ('log', 'Attendance log')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('operation', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_change_triggers, drop_change_triggers),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def create_change_triggers(apps, schema_editor):
+    # Adds the trigger recording log deletes; the others are recreated unchanged
+    from attendance.changes import create_change_triggers
+
+    create_change_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_change_triggers, migrations.RunPython.noop),
+    ]
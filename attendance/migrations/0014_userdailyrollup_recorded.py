@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_recorded_days(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    UserDailyRollup = apps.get_model('attendance', 'UserDailyRollup')
+    records = Attendance.objects.filter(user_id=OuterRef('user_id'), date=OuterRef('date'))
+    UserDailyRollup.objects.filter(Exists(records)).update(recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0013_change_feed_log_deletes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdailyrollup',
+            name='recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_recorded_days, migrations.RunPython.noop),
+    ]
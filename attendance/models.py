@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .policy import get_shift_policy
 
 class Attendance(models.Model):
     ATTENDANCE_TYPES = (
@@ -15,28 +16,55 @@ class Attendance(models.Model):
     attendance_type = models.CharField(max_length=20, choices=ATTENDANCE_TYPES, default='manual')
     is_present = models.BooleanField(default=True)
     notes = models.TextField(blank=True, null=True)
+    # Derived from the check-in/out times by update_metrics() whenever the record is saved
+    worked_seconds = models.PositiveIntegerField(default=0)
+    is_late = models.BooleanField(default=False)
+    left_early = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    METRIC_FIELDS = ('worked_seconds', 'is_late', 'left_early')
     
     class Meta:
         unique_together = ['user', 'date']
         ordering = ['-date', 'user']
+        indexes = [
+            # Keyset pagination over all users walks (date, user_id)
+            models.Index(fields=['date', 'user']),
+            models.Index(fields=['is_late', 'date']),
+            models.Index(fields=['left_early', 'date']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date}"
     
+    def save(self, *args, **kwargs):
+        self.update_metrics()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.METRIC_FIELDS) | {'updated_at'}
+        super().save(*args, **kwargs)
+    
+    def update_metrics(self, policy=None):
+        """Recompute the stored duration and lateness columns from the check-in/out times"""
+        policy = policy or get_shift_policy()
+        if self.check_in_time and self.check_out_time:
+            self.worked_seconds = max(0, int((self.check_out_time - self.check_in_time).total_seconds()))
+        else:
+            self.worked_seconds = 0
+        self.is_late = policy.is_late(self.check_in_time)
+        self.left_early = policy.left_early(self.check_out_time)
+    
     def get_duration(self):
         if self.check_in_time and self.check_out_time:
-            duration = self.check_out_time - self.check_in_time
-            hours = duration.seconds // 3600
-            minutes = (duration.seconds % 3600) // 60
+            hours = self.worked_seconds // 3600
+            minutes = (self.worked_seconds % 3600) // 60
             return f"{hours}h {minutes}m"
         return "N/A"
         
     def get_duration_hours(self):
         """Return duration in decimal hours for calculations"""
         if self.check_in_time and self.check_out_time:
-            duration = self.check_out_time - self.check_in_time
-            hours = duration.seconds / 3600  # Decimal hours
-            return round(hours, 2)
+            return round(self.worked_seconds / 3600, 2)  # Decimal hours
         return 0
 
 class AttendanceLog(models.Model):
@@ -46,13 +74,20 @@ class AttendanceLog(models.Model):
     )
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered entries keep the time they were recorded, not flushed
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     log_type = models.CharField(max_length=10, choices=LOG_TYPES)
     verification_method = models.CharField(max_length=20, choices=Attendance.ATTENDANCE_TYPES, default='student')
     success = models.BooleanField(default=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     device_info = models.CharField(max_length=255, blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # Range scans of the admin date hierarchy and the archival command
+            models.Index(fields=['timestamp']),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.log_type} - {self.timestamp}"
 
@@ -73,6 +108,9 @@ class DailyAttendanceNotification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.date}"
@@ -93,16 +131,161 @@ class AttendanceStatus(models.Model):
     check_out_time = models.TimeField(null=True, blank=True)
     notes = models.TextField(blank=True, null=True)
     is_notified = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['user', 'date']
         ordering = ['-date', 'user']
+        indexes = [
+            # The notification dashboard reads and counts one day of statuses
+            models.Index(fields=['date', 'user']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.status}"
     
     @property
     def is_late(self):
-        if self.check_in_time:
-            return self.check_in_time.hour >= 9  # Consider late after 9 AM
-        return False
+        return get_shift_policy().is_late(self.check_in_time)
+
+class ReportJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    REPORT_TYPES = (
+        ('detailed', 'Detailed Report'),
+        ('summary', 'Summary Report'),
+    )
+    REPORT_FORMATS = (
+        ('csv', 'CSV'),
+        ('excel', 'Excel'),
+    )
+    
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    report_type = models.CharField(max_length=10, choices=REPORT_TYPES, default='detailed')
+    report_format = models.CharField(max_length=10, choices=REPORT_FORMATS, default='csv')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    params_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='reports/', blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_type_display()} {self.start_date} to {self.end_date} - {self.status}"
+    
+    @property
+    def progress(self):
+        """Percentage of rows written so far"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.total_rows))
+    
+    @property
+    def filename(self):
+        extension = 'xlsx' if self.report_format == 'excel' else 'csv'
+        return f"attendance_report_{self.start_date}_to_{self.end_date}.{extension}"
+
+class UserDailyRollup(models.Model):
+    """Per user and day attendance counters, maintained from Attendance and AttendanceStatus"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    department = models.CharField(max_length=100, blank=True)
+    # Whether the day has an Attendance row, not only a status
+    recorded = models.BooleanField(default=False)
+    present = models.PositiveSmallIntegerField(default=0)
+    absent = models.PositiveSmallIntegerField(default=0)
+    late = models.PositiveSmallIntegerField(default=0)
+    left_early = models.PositiveSmallIntegerField(default=0)
+    worked_seconds = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['-date', 'user']
+        indexes = [
+            models.Index(fields=['date', 'user']),
+            models.Index(fields=['department', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+
+class DepartmentMonthlyRollup(models.Model):
+    """Per department and month totals aggregated from UserDailyRollup"""
+    department = models.CharField(max_length=100, blank=True)
+    month = models.DateField(help_text='First day of the month')
+    user_days = models.PositiveIntegerField(default=0)
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    left_early = models.PositiveIntegerField(default=0)
+    worked_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['department', 'month']
+        ordering = ['-month', 'department']
+    
+    def __str__(self):
+        return f"{self.department or 'No department'} - {self.month:%Y-%m}"
+
+class AttendanceVersion(models.Model):
+    """Version stamp of a slice of attendance data, changed whenever the slice changes.
+
+    Pages derive their ETag from the stamps they depend on (see versions.py), so a
+    client that is up to date is answered without running the page's queries.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.key} - {self.version}"
+
+class AttendanceChange(models.Model):
+    """One write of an Attendance, AttendanceStatus or AttendanceLog row, in the order of the writes.
+
+    Rows are inserted by database triggers (see changes.py), so bulk writes and
+    ``queryset.update()`` are recorded as well as model saves. On SQLite the id is
+    AUTOINCREMENT: it only grows and is never reused, which makes it the feed's
+    change sequence.
+    """
+    SOURCES = (
+        ('attendance', 'Attendance'),
+        ('status', 'Attendance status'),
+        ('log', 'Attendance log'),
+    )
+    OPERATIONS = (
+        ('insert', 'Insert'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    )
+    
+    source = models.CharField(max_length=10, choices=SOURCES)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATIONS)
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.pk} - {self.operation} {self.source} {self.object_id}"
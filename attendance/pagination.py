@@ -0,0 +1,129 @@
+import base64
+import json
+from datetime import date
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination token cannot be decoded"""
+
+
+def encode_cursor(direction, record_date, user_id):
+    """Return an opaque URL-safe token pointing before or after a ``(date, user_id)`` position"""
+    payload = json.dumps([direction, record_date.isoformat(), user_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token created by ``encode_cursor`` into ``(direction, date, user_id)``"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, record_date, user_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, date.fromisoformat(record_date), int(user_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(f'Invalid page token: {token!r}')
+
+
+class KeysetPage:
+    """One page of keyset-paginated records with tokens for the neighbouring pages"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_by_date_and_user(queryset, cursor=None, per_page=10):
+    """Paginate a queryset newest first on ``(date, user_id)`` without OFFSET or COUNT.
+
+    Every page is a range scan starting at the cursor position, so deep pages cost
+    the same as the first one. ``cursor`` is a token from a previous page.
+    """
+    direction, position = 'next', None
+    if cursor:
+        direction, record_date, user_id = decode_cursor(cursor)
+        position = (record_date, user_id)
+
+    if direction == 'next':
+        if position:
+            queryset = queryset.filter(
+                Q(date__lt=position[0]) | Q(date=position[0], user_id__lt=position[1])
+            )
+        rows = list(queryset.order_by('-date', '-user_id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        has_next, has_previous = has_more, position is not None
+    else:
+        queryset = queryset.filter(
+            Q(date__gt=position[0]) | Q(date=position[0], user_id__gt=position[1])
+        )
+        rows = list(queryset.order_by('date', 'user_id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next, has_previous = True, has_more
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor('next', rows[-1].date, rows[-1].user_id)
+    if rows and has_previous:
+        previous_cursor = encode_cursor('prev', rows[0].date, rows[0].user_id)
+
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def iterate_pk_chunks(queryset, chunk_size=1000):
+    """Yield the primary keys of ``queryset`` in ascending lists of at most ``chunk_size``.
+
+    Each chunk is a range scan after the last key of the previous one, so every
+    chunk costs the same however many rows there are.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if pks:
+            yield pks
+        if len(pks) < chunk_size:
+            return
+        last_pk = pks[-1]
+
+
+class CappedCountPaginator(Paginator):
+    """Paginator that counts at most ``max_count`` rows.
+
+    ``COUNT(*)`` reads every matching row, and the OFFSET of a deep page reads
+    every row before it. Both stop at ``max_count``; pages past it are not
+    offered and ``capped`` tells that more rows exist. The cap is never below
+    one row more than a page, since the admin shows every row unsliced when
+    the count fits on one page.
+    """
+    max_count = 10000
+    capped = False
+
+    @cached_property
+    def count(self):
+        max_count = max(self.max_count, self.per_page + 1)
+        count = self.object_list.order_by()[:max_count + 1].count()
+        self.capped = count > max_count
+        return min(count, max_count)
@@ -0,0 +1,69 @@
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import timezone
+
+DEFAULT_SHIFT = {
+    'start': '09:00',
+    'end': '17:00',
+    'late_grace_minutes': 0,
+    'early_leave_grace_minutes': 0,
+}
+
+
+def _local_time(value):
+    """Return the wall-clock time of a check-in/out value in the configured time zone"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.time()
+    return value
+
+
+def _shift(start, minutes):
+    return (datetime.combine(datetime.min, start) + timedelta(minutes=minutes)).time()
+
+
+class ShiftPolicy:
+    """Working hours used to decide whether a check-in is late or a check-out early"""
+
+    def __init__(self, start=time(9, 0), end=time(17, 0), late_grace_minutes=0, early_leave_grace_minutes=0):
+        self.start = start
+        self.end = end
+        self.late_after = _shift(start, late_grace_minutes)
+        self.early_before = _shift(end, -early_leave_grace_minutes)
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULT_SHIFT, **getattr(settings, 'ATTENDANCE_SHIFT', {})}
+        return cls(
+            start=time.fromisoformat(config['start']),
+            end=time.fromisoformat(config['end']),
+            late_grace_minutes=int(config['late_grace_minutes']),
+            early_leave_grace_minutes=int(config['early_leave_grace_minutes']),
+        )
+
+    def is_late(self, check_in_time):
+        if not check_in_time:
+            return False
+        return _local_time(check_in_time) > self.late_after
+
+    def left_early(self, check_out_time):
+        if not check_out_time:
+            return False
+        return _local_time(check_out_time) < self.early_before
+
+
+@lru_cache(maxsize=1)
+def get_shift_policy():
+    """Shift policy configured by ``settings.ATTENDANCE_SHIFT``"""
+    return ShiftPolicy.from_settings()
+
+
+@receiver(setting_changed)
+def reset_shift_policy(setting, **kwargs):
+    if setting == 'ATTENDANCE_SHIFT':
+        get_shift_policy.cache_clear()
@@ -0,0 +1,365 @@
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils import timezone
+
+DEFAULTS = {
+    # When disabled the middleware removes itself and stage() does nothing
+    'ENABLED': False,
+    # Share of requests that are profiled, from 0 to 1
+    'SAMPLE_RATE': 0.05,
+    # Number of recent profiled requests kept in memory per process
+    'BUFFER_SIZE': 500,
+    # Prometheus may scrape the metrics endpoint with "Authorization: Bearer <token>";
+    # without a token only staff users can read it
+    'METRICS_TOKEN': None,
+}
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Stages reported separately from the face pipeline stages
+RENDER_STAGE = 'render'
+
+_current = contextvars.ContextVar('attendance_request_profile', default=None)
+_noop = nullcontext()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_PROFILING', {})}
+
+
+class RequestProfile:
+    __slots__ = ('started_at', 'method', 'path', 'view', 'status', 'duration',
+                 'sql_count', 'sql_time', 'stages')
+
+    def __init__(self, method, path):
+        self.started_at = timezone.now()
+        self.method = method
+        self.path = path
+        self.view = ''
+        self.status = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.stages = {}
+
+    def add_stage(self, name, elapsed):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def record_sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    @property
+    def render_time(self):
+        return self.stages.get(RENDER_STAGE, 0.0)
+
+    @property
+    def face_stages(self):
+        return {name: elapsed for name, elapsed in self.stages.items() if name != RENDER_STAGE}
+
+    # Milliseconds, for display
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    @property
+    def sql_ms(self):
+        return self.sql_time * 1000
+
+    @property
+    def render_ms(self):
+        return self.render_time * 1000
+
+    @property
+    def face_stages_ms(self):
+        return {name: elapsed * 1000 for name, elapsed in self.face_stages.items()}
+
+
+class ViewTotals:
+    __slots__ = ('count', 'duration', 'sql_count', 'sql_time', 'render_time', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class ProfileStore:
+    """Recent profiled requests in a ring buffer plus running totals for metrics"""
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=size)
+        self.views = defaultdict(ViewTotals)
+        self.stage_time = defaultdict(float)
+        self.stage_count = defaultdict(int)
+
+    def add(self, profile):
+        with self.lock:
+            self.recent.append(profile)
+            totals = self.views[profile.view]
+            totals.count += 1
+            totals.duration += profile.duration
+            totals.sql_count += profile.sql_count
+            totals.sql_time += profile.sql_time
+            totals.render_time += profile.render_time
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if profile.duration <= bound:
+                    totals.buckets[index] += 1
+            for name, elapsed in profile.face_stages.items():
+                self.stage_time[name] += elapsed
+                self.stage_count[name] += 1
+
+    def snapshot(self):
+        """Copies of the recent profiles (newest first), view totals and stage totals"""
+        with self.lock:
+            return (
+                list(reversed(self.recent)),
+                {view: _copy_totals(totals) for view, totals in self.views.items()},
+                {name: (self.stage_count[name], elapsed) for name, elapsed in self.stage_time.items()},
+            )
+
+    def clear(self):
+        with self.lock:
+            self.recent.clear()
+            self.views.clear()
+            self.stage_time.clear()
+            self.stage_count.clear()
+
+
+def _copy_totals(totals):
+    copy = ViewTotals()
+    for name in ViewTotals.__slots__:
+        value = getattr(totals, name)
+        setattr(copy, name, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(get_config()['BUFFER_SIZE'])
+    return _store
+
+
+def stage(name):
+    """Context manager timing a named stage of the current profiled request.
+
+    Outside a sampled request it returns a shared no-op context manager, so
+    instrumented code costs one context variable lookup.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _noop
+    return _timed_stage(profile, name)
+
+
+@contextmanager
+def _timed_stage(profile, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - started)
+
+
+def _record_sql(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_sql(execute, sql, params, many, context)
+
+
+def install_sql_recorder(connection, **kwargs):
+    """Add the SQL recorder to a connection; it only records inside profiled requests.
+
+    It is installed on every connection rather than per request because async
+    views run their queries on connections of other threads. It goes first in
+    the list so ``execute_wrapper()`` blocks, which pop the last wrapper, never
+    remove it.
+    """
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_sql)
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests: total time, SQL count and time, and stages.
+
+    Place it near the top of MIDDLEWARE so session and authentication queries
+    are included. It works in sync and async mode, so async views stay async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED'] or config['SAMPLE_RATE'] <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.store = get_store()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_sql_recorder, dispatch_uid='attendance_profiling_sql')
+        for connection in connections.all(initialized_only=True):
+            install_sql_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        with self.profiling(request) as profile:
+            response = self.get_response(request)
+        self.finish(request, profile, response)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        with self.profiling(request) as profile:
+            response = await self.get_response(request)
+        self.finish(request, profile, response)
+        return response
+
+    @contextmanager
+    def profiling(self, request):
+        profile = RequestProfile(request.method, request.path)
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.duration = time.perf_counter() - started
+            _current.reset(token)
+
+    def finish(self, request, profile, response):
+        match = request.resolver_match
+        profile.view = match.view_name if match else 'unresolved'
+        profile.status = response.status_code
+        self.store.add(profile)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        with stage(RENDER_STAGE):
+            return super().render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Django template backend whose templates report their render time as a stage"""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def view_summaries():
+    """Per-view averages of the profiled requests, slowest first"""
+    recent, views, _ = get_store().snapshot()
+    durations = defaultdict(list)
+    for profile in recent:
+        durations[profile.view].append(profile.duration)
+
+    summaries = []
+    for view, totals in views.items():
+        summaries.append({
+            'view': view,
+            'count': totals.count,
+            'avg_ms': totals.duration / totals.count * 1000,
+            'recent_p95_ms': _percentile(durations[view], 95) * 1000,
+            'avg_queries': totals.sql_count / totals.count,
+            'avg_sql_ms': totals.sql_time / totals.count * 1000,
+            'avg_render_ms': totals.render_time / totals.count * 1000,
+        })
+    summaries.sort(key=lambda summary: summary['avg_ms'], reverse=True)
+    return summaries
+
+
+def stage_summaries():
+    _, _, stages = get_store().snapshot()
+    return [
+        {'stage': name, 'count': count, 'avg_ms': elapsed / count * 1000}
+        for name, (count, elapsed) in sorted(stages.items())
+    ]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_metrics():
+    """The profiling totals in the Prometheus text exposition format"""
+    _, views, stages = get_store().snapshot()
+    lines = [
+        '# HELP attendance_profiling_sample_rate Share of requests that are profiled.',
+        '# TYPE attendance_profiling_sample_rate gauge',
+        f"attendance_profiling_sample_rate {get_config()['SAMPLE_RATE']}",
+        '# HELP attendance_request_duration_seconds Duration of profiled requests.',
+        '# TYPE attendance_request_duration_seconds histogram',
+    ]
+    for view, totals in sorted(views.items()):
+        label = f'view="{_label(view)}"'
+        for bound, count in zip(DURATION_BUCKETS, totals.buckets):
+            lines.append(f'attendance_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'attendance_request_duration_seconds_bucket{{{label},le="+Inf"}} {totals.count}')
+        lines.append(f'attendance_request_duration_seconds_sum{{{label}}} {totals.duration:.6f}')
+        lines.append(f'attendance_request_duration_seconds_count{{{label}}} {totals.count}')
+
+    for name, help_text, attribute, fmt in (
+        ('attendance_request_sql_queries_total', 'SQL queries run by profiled requests.', 'sql_count', '{}'),
+        ('attendance_request_sql_seconds_total', 'Time spent in SQL by profiled requests.', 'sql_time', '{:.6f}'),
+        ('attendance_request_render_seconds_total', 'Template render time of profiled requests.', 'render_time', '{:.6f}'),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, totals in sorted(views.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {fmt.format(getattr(totals, attribute))}')
+
+    lines.append('# HELP attendance_face_stage_seconds Time spent in face recognition stages of profiled requests.')
+    lines.append('# TYPE attendance_face_stage_seconds summary')
+    for name, (count, elapsed) in sorted(stages.items()):
+        lines.append(f'attendance_face_stage_seconds_sum{{stage="{_label(name)}"}} {elapsed:.6f}')
+        lines.append(f'attendance_face_stage_seconds_count{{stage="{_label(name)}"}} {count}')
+    return '\n'.join(lines) + '\n'
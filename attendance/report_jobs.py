@@ -0,0 +1,143 @@
+import os
+import socket
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import ReportJob
+from .reports import DEFAULT_CHUNK_SIZE, count_report_rows, report_params_hash, report_rows, write_csv, write_xlsx
+from .routers import read_replica
+
+# Identical submissions within this many seconds reuse the existing job
+REUSE_WINDOW = getattr(settings, 'REPORT_JOB_REUSE_WINDOW', 10 * 60)
+# Finished report files are deleted after this many seconds
+JOB_TTL = getattr(settings, 'REPORT_JOB_TTL', 24 * 60 * 60)
+# Running jobs without a heartbeat for this many seconds are handed to another worker
+STALE_AFTER = getattr(settings, 'REPORT_JOB_STALE_AFTER', 5 * 60)
+
+
+def submit_report_job(requested_by, report_type, report_format, start_date, end_date, user=None):
+    """Queue a report job, reusing a recent job of the same requester with identical parameters.
+
+    Jobs are only visible to whoever requested them, so another user's job is
+    never reused. Returns a ``(job, created)`` tuple.
+    """
+    params_hash = report_params_hash(report_type, report_format, start_date, end_date, user.id if user else None)
+    now = timezone.now()
+
+    existing = ReportJob.objects.filter(
+        params_hash=params_hash,
+        requested_by=requested_by,
+        created_at__gte=now - timedelta(seconds=REUSE_WINDOW),
+        status__in=['pending', 'running', 'completed'],
+    ).exclude(expires_at__lt=now).order_by('-created_at').first()
+    if existing:
+        return existing, False
+
+    job = ReportJob.objects.create(
+        requested_by=requested_by,
+        report_type=report_type,
+        report_format=report_format,
+        start_date=start_date,
+        end_date=end_date,
+        user=user,
+        params_hash=params_hash,
+    )
+    return job, True
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker=None):
+    """Atomically claim the oldest pending job, or return None when the queue is empty"""
+    worker = worker or worker_name()
+    now = timezone.now()
+
+    # Give jobs of crashed workers back to the queue
+    ReportJob.objects.filter(
+        status='running',
+        heartbeat_at__lt=now - timedelta(seconds=STALE_AFTER),
+    ).update(status='pending', worker='')
+
+    candidates = ReportJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        # The conditional UPDATE only succeeds for one worker
+        claimed = ReportJob.objects.filter(pk=pk, status='pending').update(
+            status='running',
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            rows_written=0,
+        )
+        if claimed:
+            return ReportJob.objects.get(pk=pk)
+    return None
+
+
+def run_report_job(job, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate the report file for a claimed job and store it in media storage.
+
+    The report rows are read through the read-only connection so a long report
+    never holds up check-ins; progress updates still go to the default one.
+    """
+    with read_replica():
+        job.total_rows = count_report_rows(job.report_type, job.start_date, job.end_date, job.user)
+    ReportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+    def progress(rows_written):
+        job.rows_written = rows_written
+        ReportJob.objects.filter(pk=job.pk).update(rows_written=rows_written, heartbeat_at=timezone.now())
+
+    rows = report_rows(job.report_type, job.start_date, job.end_date, job.user, chunk_size)
+    try:
+        with read_replica():
+            if job.report_format == 'excel':
+                with tempfile.TemporaryFile() as tmp:
+                    write_xlsx(tmp, job.report_type, rows, progress, chunk_size)
+                    _store_file(job, tmp)
+            else:
+                with tempfile.TemporaryFile(mode='w+', newline='', encoding='utf-8') as tmp:
+                    write_csv(tmp, job.report_type, rows, progress, chunk_size)
+                    tmp.flush()
+                    _store_file(job, tmp.buffer)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+
+    job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + timedelta(seconds=JOB_TTL)
+    job.save(update_fields=['file', 'status', 'rows_written', 'finished_at', 'expires_at'])
+    return job
+
+
+def _store_file(job, fileobj):
+    fileobj.seek(0)
+    job.file.save(job.filename, File(fileobj), save=False)
+
+
+def cleanup_expired_jobs(now=None):
+    """Delete expired jobs together with their report files"""
+    now = now or timezone.now()
+    expired = ReportJob.objects.filter(expires_at__lt=now)
+    deleted = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+
+    # Failed jobs never get a file, drop them once they are older than the TTL
+    failed, _ = ReportJob.objects.filter(
+        status='failed',
+        created_at__lt=now - timedelta(seconds=JOB_TTL),
+    ).delete()
+    return deleted + failed
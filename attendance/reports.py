@@ -0,0 +1,200 @@
+import csv
+import hashlib
+import json
+import tempfile
+from datetime import date, datetime
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+
+from .models import Attendance
+from .rollups import user_summaries
+
+REPORT_HEADERS = {
+    'detailed': ['Username', 'Employee ID', 'Date', 'Check-in Time', 'Check-out Time', 'Duration', 'Type', 'Status', 'Notes'],
+    'summary': ['Username', 'Employee ID', 'Total Days', 'Present Days', 'Absent Days', 'Total Hours', 'Avg Hours/Day'],
+}
+
+# Number of rows fetched from the database per round-trip while exporting
+DEFAULT_CHUNK_SIZE = 2000
+# Detailed reports read the records of this many user-days per query; SQLite
+# sorts each query's records in memory
+ROWS_PER_QUERY = 20000
+MAX_USERS_PER_QUERY = 500
+
+
+def report_params_hash(report_type, report_format, start_date, end_date, user_id=None):
+    """Return a stable hash identifying a report parameter set"""
+    params = {
+        'report_type': report_type,
+        'format': report_format,
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'user_id': user_id,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def get_report_queryset(start_date, end_date, user=None):
+    """Attendance records covered by a report"""
+    queryset = Attendance.objects.filter(date__gte=start_date, date__lte=end_date)
+    if user:
+        queryset = queryset.filter(user=user)
+    return queryset.order_by('user__username', 'date')
+
+
+def _employee_id(user):
+    return getattr(user.profile, 'employee_id', 'N/A') if hasattr(user, 'profile') else 'N/A'
+
+
+def count_report_rows(report_type, start_date, end_date, user=None):
+    """Number of data rows a report will contain, used for progress tracking"""
+    if report_type == 'detailed':
+        return get_report_queryset(start_date, end_date, user).count()
+    return user_summaries(start_date, end_date, user).count()
+
+
+class DetailedRecord(NamedTuple):
+    """The fields of one Attendance row and its user a detailed report shows"""
+    username: str
+    employee_id: str
+    date: date
+    check_in_time: datetime
+    check_out_time: datetime
+    worked_seconds: int
+    attendance_type: str
+    is_present: bool
+    notes: str
+
+    get_duration = Attendance.get_duration
+
+
+def _user_chunks(start_date, end_date, user=None):
+    """Ids of the users of a report in username order, split into the users of each query"""
+    if user:
+        return [[user.pk]]
+    days = (end_date - start_date).days + 1
+    per_query = max(1, min(MAX_USERS_PER_QUERY, ROWS_PER_QUERY // days))
+    user_ids = list(User.objects.order_by('username').values_list('pk', flat=True))
+    return [user_ids[index:index + per_query] for index in range(0, len(user_ids), per_query)]
+
+
+def detailed_rows(start_date, end_date, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one row per attendance record, fetching records in chunks.
+
+    Records are read a group of users at a time, so each query sorts at most
+    about ``ROWS_PER_QUERY`` records instead of the whole range.
+    """
+    for user_ids in _user_chunks(start_date, end_date, user):
+        records = get_report_queryset(start_date, end_date).filter(user_id__in=user_ids).values_list(
+            'user__username', 'user__profile__employee_id', *DetailedRecord._fields[2:]
+        )
+        for record in map(DetailedRecord._make, records.iterator(chunk_size=chunk_size)):
+            yield [
+                record.username,
+                'N/A' if record.employee_id is None else record.employee_id,
+                record.date,
+                record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else 'N/A',
+                record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else 'N/A',
+                record.get_duration(),
+                record.attendance_type,
+                'Present' if record.is_present else 'Absent',
+                record.notes or 'N/A'
+            ]
+
+
+def summary_data(start_date, end_date, user=None):
+    """Yield per-user summary dictionaries for the given range.
+
+    Totals come from one grouped query over the user-day rollups instead of
+    counting and summing the raw attendance rows of every user.
+    """
+    summaries = list(user_summaries(start_date, end_date, user))
+    users = User.objects.select_related('profile').in_bulk([summary['user'] for summary in summaries])
+
+    for summary in summaries:
+        total_hours = (summary['worked_seconds'] or 0) / 3600
+        present_days = summary['present_days'] or 0
+        avg_hours = total_hours / present_days if present_days > 0 else 0
+
+        yield {
+            'user': users[summary['user']],
+            'total_days': summary['total_days'],
+            'present_days': present_days,
+            'absent_days': summary['absent_days'] or 0,
+            'late_arrivals': summary['late_arrivals'] or 0,
+            'early_departures': summary['early_departures'] or 0,
+            'total_hours': round(total_hours, 2),
+            'avg_hours_per_day': round(avg_hours, 2)
+        }
+
+
+def summary_rows(start_date, end_date, user=None):
+    """Yield one row per user for the summary report"""
+    for summary in summary_data(start_date, end_date, user):
+        yield [
+            summary['user'].username,
+            _employee_id(summary['user']),
+            summary['total_days'],
+            summary['present_days'],
+            summary['absent_days'],
+            summary['total_hours'],
+            summary['avg_hours_per_day'],
+        ]
+
+
+def report_rows(report_type, start_date, end_date, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the data rows (without header) of a detailed or summary report"""
+    if report_type == 'detailed':
+        return detailed_rows(start_date, end_date, user, chunk_size)
+    return summary_rows(start_date, end_date, user)
+
+
+def write_csv(fileobj, report_type, rows, progress=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write a report as CSV to a text file object.
+
+    ``progress`` is called with the number of rows written after every chunk.
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(REPORT_HEADERS[report_type])
+    return _write_rows(writer.writerow, rows, progress, chunk_size)
+
+
+def write_xlsx(fileobj, report_type, rows, progress=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write a report as XLSX to a binary file object using a write-only workbook"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=f'{report_type.title()} Report')
+    sheet.append(REPORT_HEADERS[report_type])
+    written = _write_rows(sheet.append, rows, progress, chunk_size)
+    workbook.save(fileobj)
+    return written
+
+
+def spool_xlsx(report_type, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write a report as XLSX to a temporary file and return the file, rewound.
+
+    The write-only sheet streams its rows to a temporary file of its own, so
+    neither the rows nor the workbook are held in memory, however long the report.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        write_xlsx(spool, report_type, rows, chunk_size=chunk_size)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _write_rows(append, rows, progress, chunk_size):
+    written = 0
+    for row in rows:
+        append(row)
+        written += 1
+        if progress and written % chunk_size == 0:
+            progress(written)
+    if progress:
+        progress(written)
+    return written
@@ -0,0 +1,311 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from users.models import Profile
+from .models import Attendance, AttendanceStatus, UserDailyRollup, DepartmentMonthlyRollup
+
+PRESENT_STATUSES = ('present', 'late', 'half_day')
+
+COUNTERS = ('present', 'absent', 'late', 'left_early', 'worked_seconds')
+ROLLUP_FIELDS = ['department', 'recorded', *COUNTERS, 'updated_at']
+
+# Rows written per bulk upsert statement
+BATCH_SIZE = 1000
+
+
+def as_date(value):
+    """Normalise a DateField value, which may still be the datetime default on unsaved instances"""
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def build_user_day(user_id, day, department, attendance=None, status=None):
+    """Compute the rollup row of one user and day from its source records"""
+    present = bool(
+        (attendance is not None and attendance.is_present)
+        or (status is not None and status.status in PRESENT_STATUSES)
+    )
+    absent = not present and (
+        (status is not None and status.status == 'absent')
+        or (attendance is not None and not attendance.is_present)
+    )
+    late = (
+        (attendance is not None and attendance.is_late)
+        or (status is not None and (status.status == 'late' or status.is_late))
+    )
+    left_early = attendance is not None and attendance.left_early
+    worked_seconds = attendance.worked_seconds if attendance is not None else 0
+
+    return UserDailyRollup(
+        user_id=user_id,
+        date=day,
+        department=department or '',
+        recorded=attendance is not None,
+        present=int(present),
+        absent=int(absent),
+        late=int(late),
+        left_early=int(left_early),
+        worked_seconds=worked_seconds,
+    )
+
+
+def _upsert_user_days(rollups):
+    UserDailyRollup.objects.bulk_create(
+        rollups,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=ROLLUP_FIELDS,
+    )
+
+
+def refresh_user_days(keys):
+    """Recompute the rollups of the given ``(user_id, date)`` pairs.
+
+    The affected department months are adjusted by the difference between the old
+    and new user-day counters, so the cost does not grow with the department size.
+    """
+    keys = {(user_id, as_date(day)) for user_id, day in keys}
+    if not keys:
+        return
+
+    user_ids = {user_id for user_id, _ in keys}
+    dates = {day for _, day in keys}
+
+    with transaction.atomic():
+        # Touch the rows before reading anything: the write takes the database lock
+        # first, so concurrent refreshes cannot both compute deltas from the same old
+        # values or from sources another writer has changed since, and SQLite never
+        # has to upgrade a read lock (it has no SELECT ... FOR UPDATE).
+        current = UserDailyRollup.objects.filter(user_id__in=user_ids, date__in=dates)
+        current.update(updated_at=timezone.now())
+        existing = {
+            (row['user_id'], row['date']): row
+            for row in current.values('pk', 'user_id', 'date', 'department', *COUNTERS)
+        }
+        attendance = {
+            (record.user_id, record.date): record
+            for record in Attendance.objects.filter(user_id__in=user_ids, date__in=dates)
+        }
+        statuses = {
+            (record.user_id, record.date): record
+            for record in AttendanceStatus.objects.filter(user_id__in=user_ids, date__in=dates)
+        }
+        departments = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'department'))
+
+        rollups = []
+        stale_pks = []
+        deltas = defaultdict(lambda: defaultdict(int))
+        for user_id, day in keys:
+            old = existing.get((user_id, day))
+            if old:
+                delta = deltas[(old['department'], month_start(day))]
+                delta['user_days'] -= 1
+                for counter in COUNTERS:
+                    delta[counter] -= old[counter]
+
+            record = attendance.get((user_id, day))
+            status = statuses.get((user_id, day))
+            if record is None and status is None:
+                if old:
+                    stale_pks.append(old['pk'])
+                continue
+
+            rollup = build_user_day(user_id, day, departments.get(user_id), record, status)
+            rollups.append(rollup)
+            delta = deltas[(rollup.department, month_start(day))]
+            delta['user_days'] += 1
+            for counter in COUNTERS:
+                delta[counter] += getattr(rollup, counter)
+
+        if stale_pks:
+            UserDailyRollup.objects.filter(pk__in=stale_pks).delete()
+        if rollups:
+            _upsert_user_days(rollups)
+        apply_department_deltas(deltas)
+
+
+def refresh_user_department(user_id):
+    """Move the user-days filed under a department the user has since left, with their monthly totals"""
+    department = Profile.objects.filter(user_id=user_id).values_list('department', flat=True).first() or ''
+    moved = UserDailyRollup.objects.filter(user_id=user_id).exclude(department=department)
+    refresh_user_days(moved.values_list('user_id', 'date'))
+
+
+def apply_department_deltas(deltas):
+    """Add ``{(department, month): {counter: delta}}`` to the monthly department rollups"""
+    for (department, month), delta in deltas.items():
+        changes = {counter: value for counter, value in delta.items() if value}
+        if not changes:
+            continue
+        # Make sure the row exists, then increment it in place
+        DepartmentMonthlyRollup.objects.bulk_create(
+            [DepartmentMonthlyRollup(department=department, month=month)],
+            ignore_conflicts=True,
+        )
+        DepartmentMonthlyRollup.objects.filter(department=department, month=month).update(
+            updated_at=timezone.now(),
+            **{counter: F(counter) + value for counter, value in changes.items()}
+        )
+
+
+def _department_totals(start, end, departments=None):
+    """Aggregate user-day rollups into ``{(department, month): totals}``"""
+    queryset = UserDailyRollup.objects.filter(date__gte=start, date__lt=end)
+    if departments is not None:
+        queryset = queryset.filter(department__in=departments)
+    rows = queryset.annotate(month=TruncMonth('date')).values('department', 'month').annotate(
+        user_days=Count('id'),
+        present_total=Sum('present'),
+        absent_total=Sum('absent'),
+        late_total=Sum('late'),
+        left_early_total=Sum('left_early'),
+        worked_total=Sum('worked_seconds'),
+    ).order_by()
+    return {
+        (row['department'], as_date(row['month'])): DepartmentMonthlyRollup(
+            department=row['department'],
+            month=as_date(row['month']),
+            user_days=row['user_days'],
+            present=row['present_total'] or 0,
+            absent=row['absent_total'] or 0,
+            late=row['late_total'] or 0,
+            left_early=row['left_early_total'] or 0,
+            worked_seconds=row['worked_total'] or 0,
+        )
+        for row in rows
+    }
+
+
+def rebuild_rollups(start, end, chunk_days=7, stdout=None):
+    """Rebuild all rollups covering ``start``..``end`` (inclusive) from the source tables.
+
+    User-day rollups are rebuilt in chunks of ``chunk_days`` so memory stays bounded,
+    then every department month touching the range is re-aggregated.
+    """
+    departments = dict(Profile.objects.values_list('user_id', 'department'))
+    rebuilt = 0
+
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+
+        records = defaultdict(lambda: [None, None])
+        for record in Attendance.objects.filter(date__gte=chunk_start, date__lte=chunk_end).iterator():
+            records[(record.user_id, record.date)][0] = record
+        for status in AttendanceStatus.objects.filter(date__gte=chunk_start, date__lte=chunk_end).iterator():
+            records[(status.user_id, status.date)][1] = status
+
+        rollups = [
+            build_user_day(user_id, day, departments.get(user_id), record, status)
+            for (user_id, day), (record, status) in records.items()
+        ]
+        with transaction.atomic():
+            UserDailyRollup.objects.filter(date__gte=chunk_start, date__lte=chunk_end).delete()
+            UserDailyRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+
+        rebuilt += len(rollups)
+        if stdout:
+            stdout.write(f'Rebuilt {len(rollups)} user-day rollups for {chunk_start} to {chunk_end}')
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return rebuilt, rebuild_department_months(start, end)
+
+
+def rebuild_department_months(start, end):
+    """Re-aggregate every department month touching ``start``..``end`` from the user-day rollups"""
+    first_month = month_start(start)
+    last_month = next_month(end)
+    totals = _department_totals(first_month, last_month)
+    with transaction.atomic():
+        DepartmentMonthlyRollup.objects.filter(month__gte=first_month, month__lt=last_month).delete()
+        DepartmentMonthlyRollup.objects.bulk_create(list(totals.values()), batch_size=BATCH_SIZE)
+    return len(totals)
+
+
+def user_summaries(start, end, user=None):
+    """Per-user totals for a date range, aggregated in SQL from the user-day rollups.
+
+    Only days with an attendance record count, as they did before the rollups: days
+    that only have a status, such as the absences the notification dashboard files
+    for everyone who has not checked in, are left to the department breakdown.
+    """
+    queryset = UserDailyRollup.objects.filter(date__gte=start, date__lte=end, recorded=True)
+    if user:
+        queryset = queryset.filter(user=user)
+    return queryset.values('user').annotate(
+        total_days=Count('id'),
+        present_days=Sum('present'),
+        absent_days=Sum('absent'),
+        late_arrivals=Sum('late'),
+        early_departures=Sum('left_early'),
+        worked_seconds=Sum('worked_seconds'),
+    ).order_by('user__username')
+
+
+def department_summaries(start, end):
+    """Per-department totals for a date range.
+
+    Whole months are read from the monthly rollups, partial months at either end of
+    the range are aggregated from the user-day rollups.
+    """
+    first_full = month_start(start) if start.day == 1 else next_month(start)
+    last_full = month_start(end + timedelta(days=1))
+
+    totals = defaultdict(lambda: defaultdict(int))
+    counters = ('user_days', 'present', 'absent', 'late', 'left_early', 'worked_seconds')
+
+    partial_ranges = []
+    if first_full < last_full:
+        monthly = DepartmentMonthlyRollup.objects.filter(month__gte=first_full, month__lt=last_full)
+        for row in monthly.values('department', *counters):
+            for counter in counters:
+                totals[row['department']][counter] += row[counter]
+        if start < first_full:
+            partial_ranges.append((start, first_full))
+        if last_full <= end:
+            partial_ranges.append((last_full, end + timedelta(days=1)))
+    else:
+        partial_ranges.append((start, end + timedelta(days=1)))
+
+    for range_start, range_end in partial_ranges:
+        rows = UserDailyRollup.objects.filter(date__gte=range_start, date__lt=range_end).values('department').annotate(
+            user_days=Count('id'),
+            present_total=Sum('present'),
+            absent_total=Sum('absent'),
+            late_total=Sum('late'),
+            left_early_total=Sum('left_early'),
+            worked_seconds_total=Sum('worked_seconds'),
+        ).order_by()
+        for row in rows:
+            entry = totals[row['department']]
+            entry['user_days'] += row['user_days']
+            for counter in counters[1:]:
+                entry[counter] += row[f'{counter}_total'] or 0
+
+    return [
+        {
+            'department': department or 'No department',
+            'user_days': entry['user_days'],
+            'present': entry['present'],
+            'absent': entry['absent'],
+            'late': entry['late'],
+            'left_early': entry['left_early'],
+            'total_hours': round(entry['worked_seconds'] / 3600, 2),
+        }
+        for department, entry in sorted(totals.items())
+    ]
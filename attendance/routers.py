@@ -0,0 +1,60 @@
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from attendance_system.database import readonly_name
+
+REPLICA = 'replica'
+
+_use_replica = contextvars.ContextVar('attendance_use_replica', default=False)
+
+
+class ReadReplicaRouter:
+    """Send reads to the read-only ``replica`` connection inside ``read_replica()``.
+
+    Everything else, including all writes and migrations, uses ``default``.
+    Routing is opt-in per block of code rather than per model so a request that
+    writes never reads its own rows through the other connection.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA in connections.settings and self.replica_is_current():
+            return REPLICA
+        return None
+
+    def replica_is_current(self):
+        # Only use the replica while it opens the same file as default; under test
+        # default is a separate test database and its rows must stay visible
+        default = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        return connections[REPLICA].settings_dict['NAME'] == readonly_name(default)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+@contextmanager
+def read_replica():
+    """Route the reads of the enclosed block to the read-only connection"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def reads_from_replica(view):
+    """View decorator running the whole view, including rendering, in ``read_replica()``"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with read_replica():
+            return view(*args, **kwargs)
+    return wrapped
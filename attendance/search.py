@@ -0,0 +1,260 @@
+"""
+SQLite FTS5 indexes for the admin search boxes.
+
+The admin's ``search_fields`` turn into ``LIKE '%term%'`` scans over every row.
+Each index here is an external-content FTS5 table over the text columns of one
+table, kept in sync by triggers, so bulk inserts, ``queryset.update()`` and
+archival deletes are covered as well as model saves. Admin classes using
+``FullTextSearchMixin`` (see admin.py) look search words up in the indexes and
+fall back to the ``LIKE`` search when FTS5 is unavailable, the indexes were not
+created or a word has nothing to match on.
+
+Words match the start of indexed words: ``ali`` finds ``alice@example.com`` but
+``example`` finds it as well, while ``lice`` does not.
+"""
+
+import logging
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Attendance, AttendanceLog, AttendanceStatus, DailyAttendanceNotification
+
+logger = logging.getLogger(__name__)
+
+# FTS5's default unicode61 tokenizer splits on everything but letters and digits
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    name: str
+    model: type
+    columns: tuple
+    # Rows indexed, as an SQL condition on ``{row}``; blank notes are left out
+    condition: str = None
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def row_values(self, row):
+        return ', '.join(f'{row}.{column}' for column in self.columns)
+
+    def row_filter(self, row):
+        return f' WHERE {self.condition.format(row=row)}' if self.condition else ''
+
+    def create_sql(self):
+        columns = ', '.join(self.columns)
+        return [
+            f"CREATE VIRTUAL TABLE {self.name} USING fts5({columns}, content='{self.table}', content_rowid='id')",
+        ] + self.trigger_sql()
+
+    def trigger_sql(self):
+        columns = ', '.join(self.columns)
+        insert = (
+            f'INSERT INTO {self.name}(rowid, {columns}) '
+            f'SELECT new.id, {self.row_values("new")}{self.row_filter("new")};'
+        )
+        # External-content tables are told the old values to remove their tokens
+        delete = (
+            f"INSERT INTO {self.name}({self.name}, rowid, {columns}) "
+            f"SELECT 'delete', old.id, {self.row_values('old')}{self.row_filter('old')};"
+        )
+        return [
+            f'CREATE TRIGGER {self.name}_insert AFTER INSERT ON {self.table} BEGIN {insert} END',
+            f'CREATE TRIGGER {self.name}_delete AFTER DELETE ON {self.table} BEGIN {delete} END',
+            f'CREATE TRIGGER {self.name}_update AFTER UPDATE OF {columns} ON {self.table} BEGIN {delete} {insert} END',
+        ]
+
+    def trigger_names(self):
+        return [f'{self.name}_{event}' for event in ('insert', 'delete', 'update')]
+
+    def drop_trigger_sql(self):
+        return [f'DROP TRIGGER IF EXISTS {trigger}' for trigger in self.trigger_names()]
+
+    def drop_sql(self):
+        return self.drop_trigger_sql() + [f'DROP TABLE IF EXISTS {self.name}']
+
+    def fill_sql(self):
+        columns = ', '.join(self.columns)
+        return [
+            f"INSERT INTO {self.name}({self.name}) VALUES ('delete-all')",
+            f'INSERT INTO {self.name}(rowid, {columns}) '
+            f'SELECT source.id, {self.row_values("source")} FROM {self.table} AS source{self.row_filter("source")}',
+            f"INSERT INTO {self.name}({self.name}) VALUES ('optimize')",
+        ]
+
+    def matching_ids(self, expression):
+        return RawSQL(f'SELECT rowid FROM {self.name} WHERE {self.name} MATCH %s', [expression])
+
+
+NOTES = "{row}.notes IS NOT NULL AND {row}.notes != ''"
+
+INDEXES = {
+    'users': SearchIndex('attendance_user_fts', User, ('username', 'email', 'first_name', 'last_name')),
+    'attendance': SearchIndex('attendance_attendance_fts', Attendance, ('notes',), NOTES),
+    'statuses': SearchIndex('attendance_status_fts', AttendanceStatus, ('notes',), NOTES),
+    'logs': SearchIndex('attendance_log_fts', AttendanceLog, ('ip_address',), '{row}.ip_address IS NOT NULL'),
+    'notifications': SearchIndex('attendance_notification_fts', DailyAttendanceNotification, ('title', 'message')),
+}
+
+# Per database alias: whether all indexes exist; cleared when they are created or dropped
+_available = {}
+
+
+def fts5_supported(connection):
+    """Whether the SQLite library of ``connection`` has the FTS5 extension"""
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE VIRTUAL TABLE temp.attendance_fts5_probe USING fts5(probe)')
+            cursor.execute('DROP TABLE temp.attendance_fts5_probe')
+    except OperationalError:
+        return False
+    return True
+
+
+def search_available(using=DEFAULT_DB_ALIAS):
+    """Whether every search index exists in the database"""
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            _available[using] = False
+        else:
+            names = [index.name for index in INDEXES.values()]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s)"
+                    % ', '.join(['%s'] * len(names)),
+                    names,
+                )
+                _available[using] = cursor.fetchone()[0] == len(names)
+    return _available[using]
+
+
+def create_search_indexes(schema_editor):
+    """Create the indexes and their triggers, filled from the tables; False without FTS5"""
+    if not fts5_supported(schema_editor.connection):
+        return False
+    for index in INDEXES.values():
+        for sql in index.drop_sql() + index.create_sql() + index.fill_sql():
+            schema_editor.execute(sql, params=None)
+    _available.pop(schema_editor.connection.alias, None)
+    return True
+
+
+def drop_search_indexes(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index in INDEXES.values():
+        for sql in index.drop_sql():
+            schema_editor.execute(sql, params=None)
+    _available.pop(schema_editor.connection.alias, None)
+
+
+def rebuild_search_index(name, using=DEFAULT_DB_ALIAS):
+    """Refill one index from its table; returns the number of rows indexed"""
+    index = INDEXES[name]
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for sql in index.fill_sql():
+            cursor.execute(sql)
+        cursor.execute(f'SELECT count(*) FROM {index.name}_docsize')
+        return cursor.fetchone()[0]
+
+
+def existing_triggers(connection):
+    """Names of the triggers in the SQLite database of ``connection``"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def restore_search_triggers(using=DEFAULT_DB_ALIAS):
+    """Recreate the missing triggers of the indexes and refill those indexes; returns their names.
+
+    SQLite drops the triggers of a table when Django rebuilds it for a schema
+    change, as it does for most ``AlterField`` operations, and the index then
+    misses every later write. Run after migrations, see signals.py.
+    """
+    if not search_available(using):
+        return []
+    connection = connections[using]
+    existing = existing_triggers(connection)
+    restored = [
+        name for name, index in INDEXES.items()
+        if not existing.issuperset(index.trigger_names())
+    ]
+    if not restored:
+        return []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for name in restored:
+            index = INDEXES[name]
+            for sql in index.drop_trigger_sql() + index.trigger_sql() + index.fill_sql():
+                cursor.execute(sql)
+    logger.warning('Recreated the missing triggers of the %s search indexes and refilled them', ', '.join(restored))
+    return restored
+
+
+@contextmanager
+def deferred_search_triggers(models, using=DEFAULT_DB_ALIAS):
+    """Drop the triggers of the indexes over ``models`` and refill them once on exit.
+
+    Like ``dataset.deferred_indexes``: one pass over the loaded rows is much
+    cheaper than an index update per inserted row.
+    """
+    if not search_available(using):
+        yield
+        return
+
+    tables = {model._meta.db_table for model in models}
+    names = [name for name, index in INDEXES.items() if index.table in tables]
+    with connections[using].cursor() as cursor:
+        for name in names:
+            for sql in INDEXES[name].drop_trigger_sql():
+                cursor.execute(sql)
+    try:
+        yield
+    finally:
+        with connections[using].cursor() as cursor:
+            for name in names:
+                for sql in INDEXES[name].trigger_sql():
+                    cursor.execute(sql)
+        for name in names:
+            rebuild_search_index(name, using)
+
+
+def match_expression(word):
+    """FTS5 query matching indexed text containing a word that starts with ``word``.
+
+    The word is split like the tokenizer splits the text, so ``alice@ex`` becomes
+    the phrase ``"alice ex" *``. None when the word has no letters or digits.
+    """
+    tokens = TOKEN_RE.findall(word.lower())
+    if not tokens:
+        return None
+    return '"%s" *' % ' '.join(tokens)
+
+
+def search_filter(words, lookups):
+    """``Q`` requiring every word to match one of the ``(lookup, index name)`` pairs.
+
+    The same all-words, any-field rule as the admin's ``search_fields``; None when
+    a word cannot be matched through the indexes.
+    """
+    query = Q()
+    for word in words:
+        expression = match_expression(word)
+        if expression is None:
+            return None
+        any_field = Q()
+        for lookup, name in lookups:
+            any_field |= Q(**{f'{lookup}__in': INDEXES[name].matching_ids(expression)})
+        query &= any_field
+    return query
@@ -0,0 +1,274 @@
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError, connections, router, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .log_buffer import enqueue_log
+from .models import Attendance, AttendanceStatus
+from .signals import attendance_changed
+
+# How often a check-in is retried when SQLite reports the database as locked
+LOCK_RETRIES = getattr(settings, 'CHECK_IN_LOCK_RETRIES', 5)
+# Base delay in seconds between retries, doubled on every attempt
+LOCK_BACKOFF = getattr(settings, 'CHECK_IN_LOCK_BACKOFF', 0.05)
+
+# Most statuses one batch may change
+STATUS_BATCH_LIMIT = getattr(settings, 'STATUS_BATCH_LIMIT', 500)
+
+CheckInResult = namedtuple('CheckInResult', ['action', 'attendance'])
+
+
+class CheckInUnavailable(Exception):
+    """Raised when the database stayed locked for every retry"""
+
+
+class InvalidStatusBatch(Exception):
+    """Raised when a status batch is rejected; ``results`` has an error (or None) per item"""
+
+    def __init__(self, message, results=None):
+        super().__init__(message)
+        self.results = results or []
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+def record_check_in(user, verification_method='manual', notes=None, ip_address=None, device_info=None, now=None):
+    """Check a user in, or out when already checked in today, in one short transaction.
+
+    The day's Attendance and AttendanceStatus rows are written together, so concurrent
+    requests can neither lose nor duplicate records; the AttendanceLog entry is queued
+    on the log buffer once the transaction commits.
+    Lock contention is retried with jittered exponential backoff.
+
+    A record without a check-in time, such as one added by staff, is checked in.
+    Returns a ``CheckInResult`` whose action is ``check_in``, ``check_out`` or
+    ``already_checked_out``.
+    """
+    now = now or timezone.now()
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            return _record_check_in(user, verification_method, notes, ip_address, device_info, now)
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            if attempt == LOCK_RETRIES:
+                raise CheckInUnavailable(str(e)) from e
+            time.sleep(LOCK_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def _insert_ignoring_conflicts(obj):
+    """Insert ``obj`` unless a row with the same unique values exists; whether it was inserted.
+
+    Like ``bulk_create(ignore_conflicts=True)``, which does not tell whether the
+    row was inserted.
+    """
+    model = type(obj)
+    using = router.db_for_write(model)
+    query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+    query.insert_values([field for field in model._meta.concrete_fields if not field.primary_key], [obj])
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(sql, params)
+        return cursor.rowcount == 1
+
+
+def _record_check_in(user, verification_method, notes, ip_address, device_info, now):
+    today = timezone.localdate(now)
+    attendance_type = 'face' if verification_method == 'face' else 'student'
+
+    with transaction.atomic():
+        # Writing first makes SQLite take the write lock at the start of the transaction,
+        # so concurrent check-ins wait on the busy timeout instead of failing on a
+        # read-to-write lock upgrade. The insert is a no-op if the row already exists.
+        new_record = Attendance(
+            user=user,
+            date=today,
+            check_in_time=now,
+            attendance_type=attendance_type,
+            notes=notes or None,
+        )
+        new_record.update_metrics()
+        created = _insert_ignoring_conflicts(new_record)
+
+        attendance = Attendance.objects.select_for_update().get(user=user, date=today)
+
+        if created:
+            action = 'check_in'
+        elif attendance.check_in_time is None or not attendance.check_out_time:
+            # Records added by staff or status imports have no check-in time yet
+            if attendance.check_in_time is None:
+                action = 'check_in'
+                attendance.check_in_time = now
+                attendance.is_present = True
+            else:
+                action = 'check_out'
+                attendance.check_out_time = now
+            if notes:
+                attendance.notes = notes
+            if verification_method == 'face':
+                attendance.attendance_type = 'face'
+            attendance.update_metrics()
+            Attendance.objects.filter(pk=attendance.pk).update(
+                check_in_time=attendance.check_in_time,
+                check_out_time=attendance.check_out_time,
+                is_present=attendance.is_present,
+                notes=attendance.notes,
+                attendance_type=attendance.attendance_type,
+                updated_at=now,
+                **{field: getattr(attendance, field) for field in Attendance.METRIC_FIELDS}
+            )
+        else:
+            return CheckInResult('already_checked_out', attendance)
+
+        # The log entry is only queued, and only once the check-in is committed. The
+        # check-in stands if queueing fails (say the spool file cannot be written), so
+        # the error is logged by on_commit instead of failing the request.
+        def queue_log_entry():
+            enqueue_log(
+                user_id=user.pk,
+                log_type=action,
+                verification_method=verification_method,
+                ip_address=ip_address,
+                device_info=(device_info or '')[:255],
+                timestamp=now,
+            )
+
+        transaction.on_commit(queue_log_entry, robust=True)
+
+        local_now = timezone.localtime(now).time()
+        status = AttendanceStatus(
+            user=user,
+            date=today,
+            status='late' if attendance.is_late else 'present',
+            check_in_time=timezone.localtime(attendance.check_in_time).time() if attendance.check_in_time else local_now,
+            check_out_time=local_now if action == 'check_out' else None,
+        )
+        update_fields = ['status', 'check_in_time'] if action == 'check_in' else ['check_out_time']
+        update_fields.append('updated_at')
+        AttendanceStatus.objects.bulk_create(
+            [status],
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=update_fields,
+        )
+        # One notification for both rows so derived data is refreshed once per check-in
+        attendance_changed.send(
+            sender=Attendance, instances=[attendance, status], created=created, deleted=False
+        )
+
+    return CheckInResult(action, attendance)
+
+
+def validate_status_batch(items, default_date):
+    """Check every ``{user_id, status, date}`` item before anything is written.
+
+    Returns ``(user_id, date, status)`` tuples in item order. When any item is
+    invalid ``InvalidStatusBatch`` is raised with the error of every item, so
+    the caller can report all of them at once.
+    """
+    if not isinstance(items, list) or not items:
+        raise InvalidStatusBatch('Expected a non-empty list of items')
+    if len(items) > STATUS_BATCH_LIMIT:
+        raise InvalidStatusBatch(f'At most {STATUS_BATCH_LIMIT} items can be changed at once')
+
+    statuses = dict(AttendanceStatus.STATUS_CHOICES)
+    entries, errors, seen = [], [], {}
+    for index, item in enumerate(items):
+        entry = error = None
+        if not isinstance(item, dict):
+            error = 'Expected an object'
+        else:
+            user_id = item.get('user_id')
+            day = parse_date(item['date']) if isinstance(item.get('date'), str) else None
+            if isinstance(user_id, str) and user_id.isdigit():
+                user_id = int(user_id)
+            if not isinstance(user_id, int) or isinstance(user_id, bool):
+                error = 'Invalid user_id'
+            elif item.get('status') not in statuses:
+                error = f"Invalid status, expected one of {', '.join(statuses)}"
+            elif item.get('date') is not None and day is None:
+                error = 'Invalid date, expected YYYY-MM-DD'
+            else:
+                entry = (user_id, day or default_date, item['status'])
+                if entry[:2] in seen:
+                    error = f'Same user and date as item {seen[entry[:2]]}'
+                else:
+                    seen[entry[:2]] = index
+        entries.append(entry)
+        errors.append(error)
+
+    user_ids = {entry[0] for entry in entries if entry}
+    known = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    for index, entry in enumerate(entries):
+        if entry and entry[0] not in known:
+            errors[index] = 'User not found'
+
+    invalid = sum(1 for error in errors if error)
+    if invalid:
+        raise InvalidStatusBatch(
+            f'{invalid} of {len(items)} items are invalid, nothing was changed',
+            [{'index': index, 'error': error} for index, error in enumerate(errors)],
+        )
+    return entries
+
+
+def mark_statuses(items, default_date=None):
+    """Set the attendance status of many user-days in one transaction.
+
+    Every item is validated first (see ``validate_status_batch``); existing
+    statuses are then changed with one ``bulk_update`` and missing ones inserted
+    with one upsert, whatever the number of items. Returns one result per item.
+    """
+    entries = validate_status_batch(items, default_date or timezone.localdate())
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing = {
+            (status.user_id, status.date): status
+            for status in AttendanceStatus.objects.filter(
+                user_id__in={user_id for user_id, _, _ in entries},
+                date__in={day for _, day, _ in entries},
+            )
+        }
+        changed, created, results = [], [], []
+        for user_id, day, value in entries:
+            status = existing.get((user_id, day))
+            if status is None:
+                created.append(AttendanceStatus(user_id=user_id, date=day, status=value))
+            else:
+                status.status = value
+                status.updated_at = now
+                changed.append(status)
+            results.append({
+                'user_id': user_id,
+                'date': day.isoformat(),
+                'status': value,
+                'created': status is None,
+            })
+
+        if changed:
+            AttendanceStatus.objects.bulk_update(changed, ['status', 'updated_at'])
+        if created:
+            # An upsert, so a status inserted concurrently is updated instead of failing
+            AttendanceStatus.objects.bulk_create(
+                created,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=['status', 'updated_at'],
+            )
+        attendance_changed.send(
+            sender=AttendanceStatus, instances=changed + created, created=bool(created), deleted=False
+        )
+
+    return results
+
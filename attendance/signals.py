@@ -0,0 +1,165 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
+from django.utils import formats
+from django.utils.text import Truncator
+
+from users.models import Profile
+
+from .events import publish
+from .log_buffer import start_log_buffer
+from .models import Attendance, AttendanceStatus, DailyAttendanceNotification
+from .changes import restore_change_triggers
+from .search import restore_search_triggers
+from .summaries import apply_changes
+from .versions import NOTIFICATIONS, USERS, attendance_keys, bump_versions, user_key
+
+# Sent with the affected ``instances`` whenever Attendance or AttendanceStatus rows
+# change; one signal may carry instances of both models. Code that writes in bulk
+# (bulk_create, queryset.update) bypasses the model signals and should send this
+# signal itself so derived data stays in sync.
+attendance_changed = Signal()
+
+
+@receiver(request_started, dispatch_uid='attendance_start_log_buffer')
+def start_log_buffer_on_first_request(sender, **kwargs):
+    """Replay log entries spooled by a dead process as soon as this one serves, not on its first check-in"""
+    request_started.disconnect(dispatch_uid='attendance_start_log_buffer')
+    start_log_buffer()
+
+
+@receiver(post_migrate, dispatch_uid='attendance_restore_triggers')
+def restore_triggers(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Recreate the triggers that rebuilding a table for a migration dropped"""
+    if sender.label != 'attendance':
+        return
+    restore_search_triggers(using)
+    restore_change_triggers(using)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=AttendanceStatus)
+def forward_attendance_saved(sender, instance, created=False, **kwargs):
+    attendance_changed.send(sender=sender, instances=[instance], created=created, deleted=False)
+
+
+@receiver(post_delete, sender=Attendance)
+@receiver(post_delete, sender=AttendanceStatus)
+def forward_attendance_deleted(sender, instance, **kwargs):
+    attendance_changed.send(sender=sender, instances=[instance], created=False, deleted=True)
+
+
+@receiver(attendance_changed)
+def update_rollups(sender, instances, **kwargs):
+    """Refresh the rollups of the affected user-days once the transaction commits"""
+    from .rollups import refresh_user_days
+
+    keys = {(instance.user_id, instance.date) for instance in instances}
+    # Robust so a failed refresh is logged instead of failing the committed write;
+    # rebuild_rollups repairs any drift.
+    transaction.on_commit(lambda: refresh_user_days(keys), robust=True)
+
+
+@receiver(attendance_changed)
+def bump_attendance_versions(sender, instances, **kwargs):
+    """Invalidate the ETags of pages showing the rows, in the writing transaction"""
+    bump_versions(attendance_keys(instances))
+
+
+@receiver(attendance_changed)
+def update_summaries(sender, instances, deleted=False, **kwargs):
+    """Write the change through to the cached dashboard summaries once it is committed"""
+    records = [instance for instance in instances if isinstance(instance, Attendance)]
+    if records:
+        transaction.on_commit(lambda: apply_changes(records, deleted), robust=True)
+
+
+@receiver(post_save, sender=DailyAttendanceNotification)
+@receiver(post_delete, sender=DailyAttendanceNotification)
+def bump_notification_versions(sender, **kwargs):
+    bump_versions([NOTIFICATIONS])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_versions(sender, instance, update_fields=None, **kwargs):
+    # Logging in only stores last_login, which no page shows
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_versions([USERS, user_key(instance.pk)])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_profile_versions(sender, instance, created=False, **kwargs):
+    # A new profile belongs to a user whose creation already bumped the stamps;
+    # later edits change the employee ids and departments of reports and searches
+    if created:
+        return
+    bump_versions([USERS, user_key(instance.user_id)])
+
+
+@receiver(post_save, sender=Profile)
+def move_department_rollups(sender, instance, created=False, update_fields=None, **kwargs):
+    """Refile the user's rollups under their new department once the change is committed"""
+    from .rollups import refresh_user_department
+
+    if created or (update_fields is not None and 'department' not in update_fields):
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: refresh_user_department(user_id), robust=True)
+
+
+# A change of more statuses than this is published as one "stale" event per day,
+# which makes dashboards reload, instead of one event per status
+MAX_STATUS_EVENTS = 50
+
+
+def _time(value):
+    return formats.time_format(value) if value else None
+
+
+def status_events(instances, deleted=False):
+    statuses = [instance for instance in instances if isinstance(instance, AttendanceStatus)]
+    complete = all('status' not in instance.get_deferred_fields() for instance in statuses)
+    if deleted or not complete or len(statuses) > MAX_STATUS_EVENTS:
+        return [('stale', {'date': day.isoformat()}) for day in sorted({status.date for status in statuses})]
+    return [
+        ('status', {
+            'user_id': status.user_id,
+            'date': status.date.isoformat(),
+            'status': status.status,
+            'status_display': status.get_status_display(),
+            'check_in_time': _time(status.check_in_time),
+            'check_out_time': _time(status.check_out_time),
+        })
+        for status in statuses
+    ]
+
+
+def publish_all(events):
+    for event_type, data in events:
+        publish(event_type, data)
+
+
+@receiver(attendance_changed)
+def publish_status_changes(sender, instances, deleted=False, **kwargs):
+    """Stream status changes to open notification dashboards once they are committed"""
+    events = status_events(instances, deleted)
+    if events:
+        transaction.on_commit(lambda: publish_all(events), robust=True)
+
+
+@receiver(post_save, sender=DailyAttendanceNotification)
+def publish_notification(sender, instance, created=False, **kwargs):
+    data = {'id': instance.pk, 'is_read': instance.is_read}
+    if created:
+        data.update(
+            title=instance.title,
+            message=Truncator(instance.message).words(20),
+            date=instance.date.isoformat(),
+        )
+    # Not a partial: a failed robust callback is logged by its __qualname__
+    transaction.on_commit(lambda: publish('notification', data), robust=True)
@@ -0,0 +1,163 @@
+"""
+Per-user cache of the attendance shown on the dashboard and the attendance home page.
+
+Both pages show today's record and the records of the last seven days. A user's
+summary is kept in the default cache as compact rows, built with one query on a
+miss, so a cache hit costs no queries at all. Writes reported by the
+``attendance_changed`` signal are applied to the cached rows once their
+transaction commits (write-through); when the written instances do not carry
+every field, or too many users changed at once, the summaries are invalidated
+instead and rebuilt on the next visit.
+
+Every committed write increments the user's generation counter, and a summary is
+stored with the generation read before it was built. A summary whose generation
+is no longer current is never served, so a summary built from rows read before
+a write cannot outlive that write, whichever of the two reaches the cache last.
+A write patches the cached summary only if it was current right before its own
+increment; of two concurrent writers the second then finds the summary of the
+first, or none that it may patch, and no update is lost.
+"""
+
+import time
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Attendance
+
+# Days before today shown in the strip
+STRIP_DAYS = 7
+# Bounds how long a summary outlives a write that bypassed the signal
+SUMMARY_TIMEOUT = 15 * 60
+# A write touching more users than this drops their summaries instead of updating them
+MAX_UPDATED_SUMMARIES = 50
+
+ROW_FIELDS = (
+    'date', 'check_in_time', 'check_out_time', 'attendance_type', 'is_present', 'notes',
+    'worked_seconds', 'is_late', 'left_early',
+)
+
+
+@dataclass(frozen=True)
+class DayRow:
+    """The fields of one Attendance row the pages render"""
+    date: date
+    check_in_time: datetime
+    check_out_time: datetime
+    attendance_type: str
+    is_present: bool
+    notes: str
+    worked_seconds: int
+    is_late: bool
+    left_early: bool
+
+    get_duration = Attendance.get_duration
+
+    @classmethod
+    def from_instance(cls, instance):
+        return cls(*(getattr(instance, name) for name in ROW_FIELDS))
+
+
+@dataclass(frozen=True)
+class AttendanceSummary:
+    today: date
+    # Newest first, from ``today - STRIP_DAYS`` to today
+    rows: tuple
+
+    @property
+    def today_attendance(self):
+        return self.rows[0] if self.rows and self.rows[0].date == self.today else None
+
+    @property
+    def week_totals(self):
+        worked_seconds = sum(row.worked_seconds for row in self.rows)
+        return {
+            'worked_seconds': worked_seconds,
+            'late_days': sum(row.is_late for row in self.rows),
+            'early_days': sum(row.left_early for row in self.rows),
+            'hours': round(worked_seconds / 3600, 2),
+        }
+
+    def covers(self, day):
+        return self.today - timedelta(days=STRIP_DAYS) <= day <= self.today
+
+    def replace(self, day, row=None):
+        """Summary with the row of ``day`` replaced by ``row``, or removed"""
+        rows = [existing for existing in self.rows if existing.date != day]
+        if row is not None:
+            rows.append(row)
+        rows.sort(key=lambda existing: existing.date, reverse=True)
+        return AttendanceSummary(self.today, tuple(rows))
+
+
+def summary_key(user_id):
+    return f'attendance:summary:{user_id}'
+
+
+def generation_key(user_id):
+    return f'attendance:summary-generation:{user_id}'
+
+
+def _start_generation(user_id):
+    """Create the user's counter if it is missing and return its value"""
+    # A start no summary was stored with, even if the counter was evicted
+    cache.add(generation_key(user_id), time.time_ns(), None)
+    return cache.get(generation_key(user_id))
+
+
+def _next_generation(user_id):
+    """Increment the user's counter; None when it had to be created anew"""
+    try:
+        return cache.incr(generation_key(user_id))
+    except ValueError:
+        _start_generation(user_id)
+        return None
+
+
+def build_summary(user_id, today):
+    rows = (
+        Attendance.objects.filter(user_id=user_id, date__gte=today - timedelta(days=STRIP_DAYS), date__lte=today)
+        .order_by('-date')
+        .values_list(*ROW_FIELDS)
+    )
+    return AttendanceSummary(today, tuple(DayRow(*row) for row in rows))
+
+
+def get_summary(user_id):
+    """The user's summary for today, from the cache when it is current"""
+    today = timezone.now().date()
+    cached = cache.get_many([summary_key(user_id), generation_key(user_id)])
+    generation = cached.get(generation_key(user_id))
+    entry = cached.get(summary_key(user_id))
+    if entry is not None and generation is not None and entry[0] == generation and entry[1].today == today:
+        return entry[1]
+
+    if generation is None:
+        generation = _start_generation(user_id)
+    summary = build_summary(user_id, today)
+    cache.set(summary_key(user_id), (generation, summary), SUMMARY_TIMEOUT)
+    return summary
+
+
+def apply_changes(records, deleted=False):
+    """Write committed changes of Attendance ``records`` through to the cached summaries"""
+    user_ids = {record.user_id for record in records}
+    complete = all(not record.get_deferred_fields() for record in records)
+    today = timezone.now().date()
+    for user_id in user_ids:
+        generation = _next_generation(user_id)
+        if generation is None or not complete or len(user_ids) > MAX_UPDATED_SUMMARIES:
+            continue
+        entry = cache.get(summary_key(user_id))
+        # Only a summary current right before this write may be patched; any other
+        # is stale now and rebuilt on the next visit
+        if entry is None or entry[0] != generation - 1 or entry[1].today != today:
+            continue
+        summary = entry[1]
+        for record in records:
+            if record.user_id == user_id and summary.covers(record.date):
+                summary = summary.replace(record.date, None if deleted else DayRow.from_instance(record))
+        cache.set(summary_key(user_id), (generation, summary), SUMMARY_TIMEOUT)
@@ -1,3 +1,1832 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextvars
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, router
+from django.db.models import Count, OuterRef, Q
+from django.db.models.signals import post_delete
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from users.models import Profile
+
+from . import summaries
+from .analytics import analytics_report, load_matrix
+from .archive import ArchiveEncoder, archive_old_rows, attendance_logs, iter_archived
+from .benchmarks import IsolatedCacheMixin, ViewBenchmarkMixin, seed_benchmark_data
+from .cache import SQLiteCache, get_or_compute, invalidate_tags
+from .changes import (
+    LATEST, SOURCES as FEED_SOURCES, CursorExpired, decode_change_cursor, encode_change_cursor, prune_changes,
+    read_changes, restore_change_triggers,
+)
+from .dataset import delete_dataset, generate_dataset
+from .forms import DateRangeForm
+from .log_buffer import AttendanceLogBuffer, replay_spool, write_entries
+from .models import (
+    Attendance, AttendanceChange, AttendanceLog, AttendanceStatus, DailyAttendanceNotification, DepartmentMonthlyRollup,
+    ReportJob, UserDailyRollup,
+)
+from .policy import get_shift_policy
+from .pagination import CappedCountPaginator, InvalidCursor, encode_cursor, paginate_by_date_and_user
+from .report_jobs import claim_next_job, cleanup_expired_jobs, submit_report_job
+from .reports import REPORT_HEADERS, count_report_rows, summary_data
+from .search import restore_search_triggers, search_available, search_filter
+from .rollups import department_summaries, rebuild_rollups, user_summaries
+from .services import record_check_in
+from .signals import attendance_changed
+from .summaries import apply_changes, get_summary
+from .user_search import build_index
+from .versions import NOTIFICATIONS, bump_versions, get_versions
+from .views import run_face_task
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def create_user(username, **extra):
+    """A user whose profile has an employee ID of its own; new profiles all get an empty one"""
+    user = User.objects.create_user(username, password='x', **extra)
+    Profile.objects.filter(user=user).update(employee_id=username)
+    # Saving the user saves its cached profile, e.g. when logging in stores last_login
+    user.profile.employee_id = username
+    return user
+
+
+class AttendanceViewBenchmarks(ViewBenchmarkMixin, TestCase):
+    """Query budgets and response times of the attendance views on a synthetic dataset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        counts = seed_benchmark_data()
+        cls.start, cls.end = counts['start'], counts['end']
+        cls.staff = User.objects.create_user('bench_staff', password='x', is_staff=True)
+        cls.member = User.objects.get(username='bench000001')
+        cls.notification = DailyAttendanceNotification.objects.create(
+            notification_type='system_alert', title='Benchmark', message='Benchmark notification'
+        )
+        cls.job = ReportJob.objects.create(
+            requested_by=cls.staff, report_type='summary', report_format='csv',
+            start_date=cls.start, end_date=cls.end,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def report_params(self, **params):
+        return {'start_date': self.end - timedelta(days=6), 'end_date': self.end, 'report_type': 'detailed', **params}
+
+    def test_attendance_home(self):
+        self.client.force_login(self.member)
+        self.assertViewBudget('attendance_home', reverse('attendance:attendance_home'), 2)
+
+    def test_mark_attendance_form(self):
+        self.client.force_login(self.member)
+        self.assertViewBudget('mark_attendance', reverse('attendance:mark_attendance'), 4)
+
+    def test_history_first_page(self):
+        self.assertViewBudget('attendance_history', reverse('attendance:attendance_history'), 4)
+
+    def test_history_deep_page_costs_the_same(self):
+        url = reverse('attendance:attendance_history')
+        cursor = None
+        for _ in range(20):
+            response = self.client.get(url, {'cursor': cursor} if cursor else None)
+            cursor = response.context['attendance_records'].next_cursor
+        self.assertViewBudget('attendance_history_deep', url, 4, data={'cursor': cursor})
+
+    def test_history_with_total_count(self):
+        self.assertViewBudget('attendance_history_count', reverse('attendance:attendance_history'), 5, data={'count': 1})
+
+    def test_history_of_selected_user(self):
+        response = self.assertViewBudget(
+            'attendance_history_selected_user', reverse('attendance:attendance_history'), 6,
+            data={'start_date': self.start, 'end_date': self.end, 'user': self.member.pk},
+        )
+        # Only the selected user is rendered into the select
+        self.assertContains(response, '<option value=', count=2)
+        self.assertContains(response, f'({self.member.profile.employee_id})')
+
+    def test_history_of_member(self):
+        self.client.force_login(self.member)
+        self.assertViewBudget('attendance_history_member', reverse('attendance:attendance_history'), 4)
+
+    def test_check_in_log(self):
+        self.client.force_login(self.member)
+        response = self.assertViewBudget(
+            'check_in_log', reverse('attendance:check_in_log'), 3,
+            data={'start_date': self.start, 'end_date': self.end},
+        )
+        self.assertEqual(len(response.context['logs']), AttendanceLog.objects.filter(user=self.member).count())
+
+    def test_history_not_modified(self):
+        self.client.force_login(self.member)
+        url = reverse('attendance:attendance_history')
+        etag = self.client.get(url).headers['ETag']
+        self.assertViewBudget(
+            'attendance_history_not_modified', url, 3, status_code=304, client=self.etag_client(etag),
+        )
+        Attendance.objects.filter(user=self.member).first().save()
+        self.assertEqual(self.etag_client(etag).get(url).status_code, 200)
+
+    def etag_client(self, etag):
+        client = Client(headers={'If-None-Match': etag})
+        client.cookies = self.client.cookies
+        return client
+
+    def test_report_form(self):
+        self.assertViewBudget('attendance_report', reverse('attendance:attendance_report'), 3)
+
+    def test_report_detailed_preview(self):
+        response = self.assertViewBudget(
+            'attendance_report_detailed_preview', reverse('attendance:attendance_report'), 3,
+            data=self.report_params(preview=1),
+        )
+        self.assertTrue(response.context['attendance_records'])
+
+    def test_report_summary_preview(self):
+        # Served from the shared cache after the warm-up request
+        params = self.report_params(report_type='summary', start_date=self.start, preview=1)
+        response = self.assertViewBudget(
+            'attendance_report_summary_preview', reverse('attendance:attendance_report'), 2, data=params,
+        )
+        self.assertEqual(len(response.context['summary_data']), 300)
+
+        def member_totals():
+            response = self.client.get(reverse('attendance:attendance_report'), params)
+            return next(row for row in response.context['summary_data'] if row['user'] == self.member)
+
+        before = member_totals()
+        # Deleting a record refreshes the rollups, then invalidates the preview, on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.filter(user=self.member, date__gte=self.start, worked_seconds__gt=0).first().delete()
+        self.assertLess(member_totals()['total_hours'], before['total_hours'])
+
+    def test_report_csv(self):
+        self.assertViewBudget(
+            'attendance_report_csv', reverse('attendance:attendance_report'), 4,
+            data=self.report_params(report_type='summary', start_date=self.start, format='csv'),
+        )
+
+    def test_report_excel(self):
+        for report_type, params in (
+            ('detailed', self.report_params(format='excel')),
+            ('summary', self.report_params(report_type='summary', start_date=self.start, format='excel')),
+        ):
+            with self.subTest(report_type):
+                response = self.assertViewBudget(
+                    f'attendance_report_excel_{report_type}', reverse('attendance:attendance_report'), 5, data=params,
+                )
+                self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+                workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+                rows = list(workbook.active.values)
+                self.assertEqual(list(rows[0]), REPORT_HEADERS[report_type])
+                self.assertEqual(len(rows) - 1, count_report_rows(report_type, params['start_date'], params['end_date']))
+
+    def test_report_job_status(self):
+        self.assertViewBudget('report_job_status', reverse('attendance:report_job_status', args=[self.job.pk]), 3)
+
+    def test_notification_dashboard(self):
+        response = self.assertViewBudget('notification_dashboard', reverse('attendance:notification_dashboard'), 9)
+        self.assertEqual(response.context['stats']['total_students'], User.objects.filter(is_active=True).count())
+
+    def test_notification_dashboard_not_modified(self):
+        url = reverse('attendance:notification_dashboard')
+        # The first visit of the day creates the missing statuses, which changes the ETag
+        self.client.get(url)
+        etag = self.client.get(url).headers['ETag']
+        self.assertViewBudget(
+            'notification_dashboard_not_modified', url, 3, status_code=304, client=self.etag_client(etag),
+        )
+        self.client.post(reverse('attendance:mark_notification_read', args=[self.notification.pk]))
+        self.assertEqual(self.etag_client(etag).get(url).status_code, 200)
+
+    def test_dashboard_events_without_asgi(self):
+        self.assertViewBudget('dashboard_events', reverse('attendance:dashboard_events'), 2, status_code=204)
+
+    def test_check_in_api(self):
+        self.client.force_login(self.member)
+        self.assertViewBudget('check_in_api', reverse('attendance:check_in_api'), 9, method='post')
+        self.assertTrue(Attendance.objects.filter(user=self.member, date=timezone.localdate()).exists())
+
+        self.client.force_login(self.staff)
+        self.assertViewBudget('check_in_api_async', reverse('attendance:check_in_api_async'), 9, method='post')
+        self.assertTrue(Attendance.objects.filter(user=self.staff, date=timezone.localdate()).exists())
+
+    def test_mark_attendance_status(self):
+        self.assertViewBudget(
+            'mark_attendance_status', reverse('attendance:mark_attendance_status'), 6, method='post',
+            data={'user_id': self.member.pk, 'status': 'late'},
+        )
+        self.assertViewBudget(
+            'mark_attendance_status_async', reverse('attendance:mark_attendance_status_async'), 6, method='post',
+            data={'user_id': self.member.pk, 'status': 'present'},
+        )
+
+    def test_mark_attendance_status_batch(self):
+        users = list(User.objects.filter(username__startswith='bench').order_by('pk')[:60])
+        items = [{'user_id': user.pk, 'status': 'late'} for user in users[:30]]
+        items += [{'user_id': user.pk, 'status': 'leave', 'date': self.end.isoformat()} for user in users[30:]]
+        response = self.assertViewBudget(
+            'mark_attendance_status_batch', reverse('attendance:mark_attendance_status_batch'), 8, method='post',
+            data=json.dumps({'items': items}), content_type='application/json',
+        )
+        self.assertEqual(len(response.json()['results']), 60)
+        self.assertEqual(AttendanceStatus.objects.filter(user__in=users[:30], date=date.today(), status='late').count(), 30)
+
+    def test_create_daily_notification(self):
+        self.assertViewBudget(
+            'create_daily_notification', reverse('attendance:create_daily_notification'), 5, method='post',
+        )
+        self.assertViewBudget(
+            'create_daily_notification_async', reverse('attendance:create_daily_notification_async'), 5,
+            method='post',
+        )
+
+    def test_mark_notification_read(self):
+        self.assertViewBudget(
+            'mark_notification_read', reverse('attendance:mark_notification_read', args=[self.notification.pk]), 5,
+        )
+        self.assertViewBudget(
+            'mark_notification_read_async',
+            reverse('attendance:mark_notification_read_async', args=[self.notification.pk]), 5,
+        )
+
+    def test_user_autocomplete(self):
+        response = self.assertViewBudget(
+            'user_autocomplete', reverse('attendance:user_autocomplete'), 3, data={'q': 'bench00001'},
+        )
+        expected = User.objects.filter(username__startswith='bench00001').order_by('username')
+        self.assertEqual([result['id'] for result in response.json()['results']], [user.pk for user in expected])
+        self.assertFalse(response.json()['more'])
+
+    def test_admin_search(self):
+        User.objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        attendance = Attendance.objects.filter(user=self.member).first()
+        # Updated without signals; the index follows through its triggers
+        Attendance.objects.filter(pk=attendance.pk).update(notes='Forgot the badge at the gate')
+        url = reverse('admin:attendance_attendance_changelist')
+        response = self.assertViewBudget('admin_attendance_search', url, 7, data={'q': 'badg gate'})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [attendance.pk])
+        response = self.client.get(url, {'q': self.member.username})
+        self.assertEqual(response.context['cl'].result_count, Attendance.objects.filter(user=self.member).count())
+
+    def test_admin_changelists(self):
+        User.objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        day = Attendance.objects.filter(user=self.member).latest('date').date
+        pages = [
+            ('admin_attendance', 'admin:attendance_attendance_changelist', {}),
+            ('admin_attendance_day', 'admin:attendance_attendance_changelist',
+             {'date__year': day.year, 'date__month': day.month, 'date__day': day.day}),
+            ('admin_statuses', 'admin:attendance_attendancestatus_changelist', {}),
+            ('admin_logs', 'admin:attendance_attendancelog_changelist', {}),
+            ('admin_logs_month', 'admin:attendance_attendancelog_changelist',
+             {'timestamp__year': day.year, 'timestamp__month': day.month}),
+        ]
+        # Counts stop at the cap, so a page costs the same however large the table;
+        # a cap of one page still leaves a second page, so only one page is rendered
+        with patch.object(CappedCountPaginator, 'max_count', 100):
+            for name, url_name, data in pages:
+                with self.subTest(name):
+                    response = self.assertViewBudget(name, reverse(url_name), 7, data=data)
+                    cl = response.context['cl']
+                    self.assertTrue(cl.paginator.capped)
+                    self.assertEqual(cl.result_count, cl.list_per_page + 1)
+                    self.assertEqual(len(cl.result_list), cl.list_per_page)
+        # The hierarchy probes periods instead of grouping the rows; same answer
+        cl = self.client.get(reverse('admin:attendance_attendance_changelist'), {'date__year': day.year}).context['cl']
+        self.assertEqual(list(cl.queryset.dates('date', 'month')), list(Attendance.objects.filter(date__year=day.year).dates('date', 'month')))
+        self.assertEqual(list(cl.queryset.dates('date', 'day', 'DESC')), list(Attendance.objects.filter(date__year=day.year).dates('date', 'day', 'DESC')))
+
+    def test_admin_status_actions(self):
+        User.objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        today = date.today()
+        users = User.objects.filter(username__startswith='bench0').order_by('username')[:3]
+        absent = AttendanceStatus.objects.bulk_create(
+            AttendanceStatus(user=user, date=today, status='absent') for user in users
+        )
+        response = self.client.post(reverse('admin:attendance_attendancestatus_changelist'), {
+            'action': 'send_notifications',
+            '_selected_action': [status.pk for status in absent],
+        }, follow=True)
+        self.assertContains(response, 'Notifications sent for 3 attendance records')
+        alert = DailyAttendanceNotification.objects.get(notification_type='absent_alert', date=today)
+        self.assertIn(', '.join(status.user.username for status in absent), alert.message)
+        self.assertEqual(AttendanceStatus.objects.filter(pk__in=[status.pk for status in absent], is_notified=True).count(), 3)
+
+    def test_analytics(self):
+        params = {'start_date': self.start, 'end_date': self.end, 'status': 'absent', 'threshold': 3}
+        self.assertViewBudget('analytics_dashboard', reverse('attendance:analytics_dashboard'), 2, data=params)
+        self.assertViewBudget('analytics_api', reverse('attendance:analytics_api'), 2, data=params)
+
+    def test_change_feed(self):
+        url = reverse('attendance:change_feed')
+        response = self.assertViewBudget('change_feed', url, 7, data={'limit': 1000}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(response.content).splitlines()), 1000)
+        self.assertEqual(response['X-Change-More'], 'true')
+
+    @override_settings(ATTENDANCE_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 1})
+    def test_profiling_pages(self):
+        self.client.get(reverse('attendance:attendance_history'))
+        response = self.assertViewBudget('profiling_dashboard', reverse('attendance:profiling_dashboard'), 2)
+        self.assertIn('attendance:attendance_history', [view['view'] for view in response.context['views']])
+        response = self.assertViewBudget('profiling_metrics', reverse('attendance:profiling_metrics'), 2)
+        self.assertIn(b'attendance_request_duration_seconds_bucket', response.content)
+
+    @skipUnless(find_spec('cv2'), 'OpenCV is not installed')
+    def test_upload_face_form(self):
+        self.assertViewBudget('upload_face', reverse('attendance:upload_face'), 3)
+
+    def test_static_pages(self):
+        for name in ('upload_fingerprint', 'debug_camera'):
+            with self.subTest(name):
+                self.assertViewBudget(name, reverse(f'attendance:{name}'), 3)
+
+
+class ReportJobTests(IsolatedCacheMixin, TestCase):
+    """Queueing, claiming and expiry of background report jobs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('report_staff', is_staff=True)
+        cls.other_staff = create_user('report_staff_2', is_staff=True)
+        cls.end = date.today()
+        cls.start = cls.end - timedelta(days=6)
+
+    def submit(self, requested_by, report_type='summary'):
+        return submit_report_job(requested_by, report_type, 'csv', self.start, self.end)
+
+    def test_identical_jobs_are_reused_per_requester(self):
+        job, created = self.submit(self.staff)
+        self.assertTrue(created)
+        self.assertEqual(self.submit(self.staff), (job, False))
+        self.assertTrue(self.submit(self.staff, 'detailed')[1])
+
+        # Another user gets a job of their own, which they can follow
+        other_job, created = self.submit(self.other_staff)
+        self.assertTrue(created)
+        self.client.force_login(self.other_staff)
+        self.assertEqual(self.client.get(reverse('attendance:report_job_status', args=[other_job.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('attendance:report_job_status', args=[job.pk])).status_code, 404)
+
+        params = {'start_date': self.start, 'end_date': self.end, 'report_type': 'summary'}
+        response = self.client.get(reverse('attendance:attendance_report'), {**params, 'job': other_job.pk})
+        self.assertEqual(response.context['report_job'], other_job)
+        for job_id in (job.pk, 'not-a-number'):
+            with self.subTest(job=job_id):
+                response = self.client.get(reverse('attendance:attendance_report'), {**params, 'job': job_id})
+                self.assertEqual(response.status_code, 404)
+
+        # Failed jobs are not reused
+        ReportJob.objects.filter(pk=job.pk).update(status='failed')
+        self.assertTrue(self.submit(self.staff)[1])
+
+    def test_claim_next_job(self):
+        first, _ = self.submit(self.staff)
+        second, _ = self.submit(self.staff, 'detailed')
+        ReportJob.objects.filter(pk=second.pk).update(created_at=first.created_at + timedelta(seconds=1))
+
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed, first)
+        self.assertEqual((claimed.status, claimed.worker), ('running', 'worker-1'))
+        self.assertEqual(claim_next_job('worker-2'), second)
+        self.assertIsNone(claim_next_job('worker-3'))
+
+        # The job of a worker that stopped sending heartbeats goes to another worker
+        ReportJob.objects.filter(pk=first.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        reclaimed = claim_next_job('worker-3')
+        self.assertEqual((reclaimed, reclaimed.worker), (first, 'worker-3'))
+
+    def test_cleanup_expired_jobs(self):
+        now = timezone.now()
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            expired, _ = self.submit(self.staff)
+            expired.file.save('expired.csv', ContentFile(b'user\n'), save=False)
+            ReportJob.objects.filter(pk=expired.pk).update(
+                status='completed', file=expired.file.name, expires_at=now - timedelta(minutes=1)
+            )
+            failed, _ = self.submit(self.staff, 'detailed')
+            ReportJob.objects.filter(pk=failed.pk).update(status='failed', created_at=now - timedelta(days=2))
+            kept, _ = self.submit(self.other_staff)
+
+            self.assertEqual(cleanup_expired_jobs(now), 2)
+            self.assertEqual(list(ReportJob.objects.all()), [kept])
+            self.assertFalse(os.path.exists(os.path.join(media_root, expired.file.name)))
+
+
+class CheckInTests(IsolatedCacheMixin, TestCase):
+    def test_record_without_check_in_time(self):
+        user = create_user('check_in_user')
+        # As added by staff on the admin or the manual attendance form
+        Attendance.objects.create(user=user, date=timezone.localdate(), is_present=False)
+
+        with patch('attendance.services.enqueue_log') as enqueue_log:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = record_check_in(user)
+        self.assertEqual(result.action, 'check_in')
+        record = Attendance.objects.get(user=user)
+        self.assertIsNotNone(record.check_in_time)
+        self.assertTrue(record.is_present)
+        self.assertIsNotNone(AttendanceStatus.objects.get(user=user).check_in_time)
+        self.assertEqual(enqueue_log.call_args.kwargs['log_type'], 'check_in')
+
+        self.assertEqual(record_check_in(user).action, 'check_out')
+        self.assertEqual(record_check_in(user).action, 'already_checked_out')
+
+    def test_existing_record_with_the_same_time_is_not_created_again(self):
+        user = create_user('same_time_user')
+        now = timezone.now()
+        # A check-in backfilled, or written by a retried request, at the very same time
+        Attendance.objects.create(user=user, date=timezone.localdate(now), check_in_time=now)
+        sent = []
+
+        def receiver(sender, created, **kwargs):
+            sent.append(created)
+
+        attendance_changed.connect(receiver)
+        self.addCleanup(attendance_changed.disconnect, receiver)
+        with patch('attendance.services.enqueue_log'):
+            self.assertEqual(record_check_in(user, now=now).action, 'check_out')
+        self.assertEqual(sent, [False])
+
+        other = create_user('new_record_user')
+        with patch('attendance.services.enqueue_log'):
+            self.assertEqual(record_check_in(other, now=now).action, 'check_in')
+        self.assertEqual(sent, [False, True])
+
+
+class ConcurrentCheckInTests(IsolatedCacheMixin, TransactionTestCase):
+    def test_concurrent_check_ins(self):
+        users = [create_user(f'rush{index}') for index in range(5)]
+        attempts = [user for user in users for _ in range(3)]
+        barrier = threading.Barrier(len(attempts))
+        actions = defaultdict(list)
+
+        def check_in(user):
+            try:
+                barrier.wait()
+                actions[user.pk].append(record_check_in(user).action)
+            finally:
+                connection.close()
+
+        with patch('attendance.services.enqueue_log') as enqueue_log:
+            threads = [threading.Thread(target=check_in, args=(user,)) for user in attempts]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Every user is checked in and out exactly once, whatever the order of the requests
+        for user in users:
+            self.assertEqual(sorted(actions[user.pk]), ['already_checked_out', 'check_in', 'check_out'])
+            record = Attendance.objects.get(user=user)
+            self.assertIsNotNone(record.check_out_time)
+            self.assertIsNotNone(AttendanceStatus.objects.get(user=user).check_out_time)
+        logged = sorted((call.kwargs['user_id'], call.kwargs['log_type']) for call in enqueue_log.call_args_list)
+        self.assertEqual(logged, sorted((user.pk, log_type) for user in users for log_type in ('check_in', 'check_out')))
+
+
+class LogBufferTests(IsolatedCacheMixin, TestCase):
+    """Batched writes of the attendance log buffer and replay of its spool"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('log_user')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool_dir = directory.name
+        self.buffer = AttendanceLogBuffer(spool_dir=self.spool_dir)
+        # Entries are flushed by the test rather than the writer thread
+        patcher = patch.object(self.buffer, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enqueue(self, count):
+        start = timezone.now()
+        for index in range(count):
+            self.buffer.enqueue(
+                user_id=self.user.pk, log_type='check_in', verification_method='student',
+                timestamp=start + timedelta(seconds=index),
+            )
+
+    def test_flush(self):
+        self.enqueue(3)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(AttendanceLog.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_is_retried(self):
+        self.enqueue(3)
+        with patch('attendance.log_buffer.write_entries', side_effect=OperationalError('disk I/O error')), \
+                self.assertLogs('attendance.log_buffer', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.enqueue(1)
+
+        # The segment stays locked while its entries wait, so nobody else replays them
+        self.assertEqual(replay_spool(self.spool_dir), 0)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 2)
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(AttendanceLog.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_replay_spool(self):
+        start = timezone.now()
+        entries = [
+            {'user_id': self.user.pk, 'log_type': 'check_in', 'verification_method': 'student', 'success': True,
+             'ip_address': None, 'device_info': None, 'timestamp': (start + timedelta(hours=hours)).isoformat()}
+            for hours in range(3)
+        ]
+        # A process died after writing the first entry but before removing its segment
+        write_entries(entries[:1])
+        with open(os.path.join(self.spool_dir, 'dead-process-000001.ndjson'), 'w') as segment:
+            segment.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+        with self.assertLogs('attendance.log_buffer', 'WARNING'):
+            self.assertEqual(replay_spool(self.spool_dir), 2)
+        self.assertEqual(AttendanceLog.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_spooling_needs_file_locks(self):
+        with patch('attendance.log_buffer.fcntl', None):
+            with self.assertRaises(ImproperlyConfigured):
+                AttendanceLogBuffer(spool_dir=self.spool_dir)
+            with self.assertRaises(ImproperlyConfigured):
+                replay_spool(self.spool_dir)
+            AttendanceLogBuffer(spool_dir=None)
+
+    def test_check_in_stands_when_its_log_entry_cannot_be_queued(self):
+        with patch('attendance.services.enqueue_log', side_effect=OSError('No space left on device')), \
+                self.assertLogs(level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = record_check_in(self.user)
+        self.assertEqual(result.action, 'check_in')
+        self.assertTrue(Attendance.objects.filter(user=self.user, check_in_time__isnull=False).exists())
+
+
+class ArchiveTests(IsolatedCacheMixin, TestCase):
+    """Archival of old logs and notifications, and reading them back together with the tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = create_user('archive_member')
+        cls.other = create_user('archive_other')
+        cls.now = timezone.now()
+        cls.logs = [
+            AttendanceLog.objects.create(
+                user=user, log_type='check_in', verification_method='student', timestamp=cls.now - timedelta(days=days)
+            )
+            for user, days in ((cls.member, 400), (cls.member, 399), (cls.other, 399), (cls.member, 370), (cls.member, 10))
+        ]
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ATTENDANCE_ARCHIVE={'DIR': directory.name, 'RETENTION_DAYS': 180})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_logs_are_read_back_with_the_table(self):
+        # Chunks of two rows: the archived rows span three chunks and two months
+        self.assertEqual(archive_old_rows(chunk_size=2, models=['attendancelog']), {'attendancelog': 4})
+        self.assertEqual(list(AttendanceLog.objects.all()), [self.logs[4]])
+
+        start = timezone.localdate() - timedelta(days=500)
+        member_logs = [log for log in self.logs if log.user_id == self.member.pk]
+        read = attendance_logs(start, timezone.localdate(), self.member)
+        self.assertEqual([log.pk for log in read], [log.pk for log in reversed(member_logs)])
+        self.assertEqual([log.timestamp for log in read], [log.timestamp for log in reversed(member_logs)])
+        self.assertEqual(len(attendance_logs(start, timezone.localdate())), 5)
+
+        # A day's range only returns that day's entries
+        day = timezone.localtime(self.logs[1].timestamp).date()
+        self.assertEqual({log.pk for log in attendance_logs(day, day)}, {self.logs[1].pk, self.logs[2].pk})
+
+        # Rows left in the table by an interrupted run are only returned once
+        AttendanceLog.objects.bulk_create([self.logs[0]])
+        self.assertEqual(len(attendance_logs(start, timezone.localdate(), self.member)), 4)
+
+        self.client.force_login(self.member)
+        response = self.client.get(reverse('attendance:check_in_log'), {'start_date': start, 'end_date': timezone.localdate()})
+        self.assertEqual([log.pk for log in response.context['logs']], [log.pk for log in reversed(member_logs)])
+
+    def test_notifications_are_archived(self):
+        notification = DailyAttendanceNotification.objects.create(
+            notification_type='system_alert', title='Old', message='Old notification'
+        )
+        old = self.now - timedelta(days=200)
+        DailyAttendanceNotification.objects.filter(pk=notification.pk).update(created_at=old)
+        self.assertEqual(archive_old_rows(models=['dailyattendancenotification']), {'dailyattendancenotification': 1})
+        self.assertFalse(DailyAttendanceNotification.objects.exists())
+
+        day = timezone.localtime(old).date()
+        archived, = iter_archived(DailyAttendanceNotification, 'created_at', day, day)
+        self.assertEqual((archived.pk, archived.title, archived.created_at), (notification.pk, 'Old', old))
+
+    def test_chunks_are_deleted_without_per_row_signals(self):
+        old = self.now - timedelta(days=200)
+        DailyAttendanceNotification.objects.bulk_create([
+            DailyAttendanceNotification(notification_type='system_alert', title=f'Old {number}', message='Old')
+            for number in range(5)
+        ])
+        DailyAttendanceNotification.objects.update(created_at=old)
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+
+        post_delete.connect(receiver, sender=DailyAttendanceNotification)
+        self.addCleanup(post_delete.disconnect, receiver, sender=DailyAttendanceNotification)
+        before = get_versions([NOTIFICATIONS]).get(NOTIFICATIONS)
+        with patch('attendance.archive.bump_versions', wraps=bump_versions) as bump:
+            self.assertEqual(
+                archive_old_rows(chunk_size=2, models=['dailyattendancenotification']),
+                {'dailyattendancenotification': 5},
+            )
+        self.assertEqual(deleted, [])
+        # Once per chunk of the three, rather than once per row
+        self.assertEqual(bump.call_count, 3)
+        self.assertNotEqual(get_versions([NOTIFICATIONS]).get(NOTIFICATIONS), before)
+        self.assertFalse(DailyAttendanceNotification.objects.exists())
+
+    def test_check_in_log_asks_staff_for_a_student(self):
+        self.client.force_login(create_user('archive_staff', is_staff=True))
+        response = self.client.get(reverse('attendance:check_in_log'))
+        self.assertIsNone(response.context['logs'])
+        response = self.client.get(reverse('attendance:check_in_log'), {
+            'start_date': timezone.localdate() - timedelta(days=30), 'end_date': timezone.localdate(), 'user': self.member.pk,
+        })
+        self.assertEqual(response.context['logs'], [self.logs[4]])
+
+
+class RollupTests(IsolatedCacheMixin, TestCase):
+    """User-day and department-month rollups kept up to date from attendance writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(f'rollup{index}') for index in range(3)]
+        Profile.objects.filter(user__in=cls.users[:2]).update(department='Sales')
+        Profile.objects.filter(user=cls.users[2]).update(department='Support')
+        # The range crosses a month boundary
+        cls.start, cls.end = date(2026, 1, 28), date(2026, 2, 3)
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute))
+
+    def snapshot(self):
+        return (
+            sorted(UserDailyRollup.objects.values_list(
+                'user_id', 'date', 'department', 'present', 'absent', 'late', 'left_early', 'worked_seconds'
+            )),
+            sorted(DepartmentMonthlyRollup.objects.filter(user_days__gt=0).values_list(
+                'department', 'month', 'user_days', 'present', 'absent', 'late', 'left_early', 'worked_seconds'
+            )),
+        )
+
+    def test_incremental_updates_match_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            day = self.start
+            while day <= self.end:
+                for index, user in enumerate(self.users):
+                    if (day.day + index) % 4 == 0:
+                        AttendanceStatus.objects.create(user=user, date=day, status='absent')
+                        continue
+                    Attendance.objects.create(
+                        user=user, date=day, check_in_time=self.at(day, 8 + index, 30), check_out_time=self.at(day, 17),
+                    )
+                    AttendanceStatus.objects.create(user=user, date=day, status='late' if index else 'present')
+                day += timedelta(days=1)
+
+        # Edits and deletes adjust the rollups they touch
+        with self.captureOnCommitCallbacks(execute=True):
+            record = Attendance.objects.filter(user=self.users[0]).order_by('date').first()
+            record.check_out_time = self.at(record.date, 12)
+            record.save()
+            AttendanceStatus.objects.filter(user=self.users[1], date=self.end).delete()
+            Attendance.objects.filter(user=self.users[1], date=self.end).delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(len(incremental[1]), 4)
+        UserDailyRollup.objects.all().delete()
+        DepartmentMonthlyRollup.objects.all().delete()
+        call_command('rebuild_rollups', start=str(self.start), end=str(self.end), stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+        # Summaries read from the rollups agree with the raw records
+        summaries = {row['department']: row for row in department_summaries(self.start, self.end)}
+        sales = Attendance.objects.filter(user__profile__department='Sales')
+        self.assertEqual(
+            summaries['Sales']['total_hours'], round(sum(sales.values_list('worked_seconds', flat=True)) / 3600, 2)
+        )
+        self.assertEqual(
+            summaries['Support']['absent'],
+            AttendanceStatus.objects.filter(user=self.users[2], status='absent').count(),
+        )
+        totals = {row['user']: row for row in user_summaries(self.start, self.end)}
+        self.assertEqual(
+            totals[self.users[1].pk]['late_arrivals'], Attendance.objects.filter(user=self.users[1], is_late=True).count()
+        )
+
+    def test_department_change_moves_the_user_days(self):
+        mover = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in (self.start, self.end):
+                Attendance.objects.create(
+                    user=mover, date=day, check_in_time=self.at(day, 8), check_out_time=self.at(day, 16),
+                )
+            AttendanceStatus.objects.create(user=self.users[2], date=self.end, status='absent')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = mover.profile
+            profile.department = 'Support'
+            profile.save()
+
+        self.assertEqual(set(UserDailyRollup.objects.filter(user=mover).values_list('department', flat=True)), {'Support'})
+        months = {
+            (row.department, row.month): (row.user_days, row.present, row.absent, row.worked_seconds)
+            for row in DepartmentMonthlyRollup.objects.filter(user_days__gt=0)
+        }
+        self.assertEqual(months, {
+            ('Support', date(2026, 1, 1)): (1, 1, 0, 8 * 3600),
+            ('Support', date(2026, 2, 1)): (2, 1, 1, 8 * 3600),
+        })
+
+        # Saving other profile fields leaves the rollups alone
+        with self.captureOnCommitCallbacks() as callbacks:
+            profile.save(update_fields=['employee_id'])
+        self.assertFalse([
+            callback for callback in callbacks
+            if getattr(callback, '__qualname__', '').startswith('move_department_rollups')
+        ])
+
+    def test_summary_report_counts_only_recorded_days(self):
+        user = self.users[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.create(user=user, date=self.start, check_in_time=self.at(self.start, 8))
+            Attendance.objects.create(user=user, date=self.start + timedelta(days=1), is_present=False)
+            # Filed by the notification dashboard for everyone who has not checked in
+            AttendanceStatus.objects.create(user=user, date=self.end, status='absent')
+
+        rows = list(summary_data(self.start, self.end))
+        self.assertEqual(
+            [(row['user'], row['total_days'], row['present_days'], row['absent_days']) for row in rows],
+            [(user, 2, 1, 1)],
+        )
+        self.assertEqual(count_report_rows('summary', self.start, self.end), 1)
+        self.assertEqual(count_report_rows('summary', self.end, self.end), 0)
+        # The department breakdown counts the status-only day
+        self.assertEqual(department_summaries(self.start, self.end)[0]['absent'], 2)
+
+
+class KeysetPaginationTests(IsolatedCacheMixin, TestCase):
+    """Cursor pagination of the attendance history on (date, user)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(f'pages{index}') for index in range(3)]
+        start = date(2026, 3, 1)
+        Attendance.objects.bulk_create(
+            Attendance(user=user, date=start + timedelta(days=offset))
+            for user in cls.users for offset in range(9)
+        )
+
+    def test_pages_cover_every_record_in_both_directions(self):
+        queryset = Attendance.objects.all()
+        expected = list(queryset.order_by('-date', '-user_id').values_list('date', 'user_id'))
+
+        pages, cursor = [], None
+        while True:
+            page = paginate_by_date_and_user(queryset, cursor, per_page=4)
+            pages.append([(record.date, record.user_id) for record in page])
+            self.assertEqual(page.has_previous(), len(pages) > 1)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([row for rows in pages for row in rows], expected)
+        self.assertEqual(len(pages), 7)
+
+        # Walking back from the last page returns the same pages
+        for rows in reversed(pages[:-1]):
+            page = paginate_by_date_and_user(queryset, page.previous_cursor, per_page=4)
+            self.assertEqual([(record.date, record.user_id) for record in page], rows)
+        self.assertFalse(page.has_previous())
+
+        for token in ('not-a-cursor', encode_cursor('next', date(2026, 3, 1), 1)[:-2]):
+            with self.subTest(token=token), self.assertRaises(InvalidCursor):
+                paginate_by_date_and_user(queryset, token)
+
+    def test_pages_do_not_shift_when_records_are_added(self):
+        queryset = Attendance.objects.all()
+        first = paginate_by_date_and_user(queryset, per_page=5)
+        expected = list(paginate_by_date_and_user(queryset, first.next_cursor, per_page=5))
+
+        # A check-in on top of the list would push every OFFSET page down by one row
+        newcomer = create_user('pages_newcomer')
+        Attendance.objects.create(user=newcomer, date=date(2026, 3, 10))
+        self.assertEqual(list(paginate_by_date_and_user(queryset, first.next_cursor, per_page=5)), expected)
+
+    def test_history_pages_without_offset_or_count(self):
+        self.client.force_login(create_user('pages_staff', is_staff=True))
+        url = reverse('attendance:attendance_history')
+        params = {'start_date': '2026-03-01', 'end_date': '2026-03-31'}
+        seen = []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            page = response.context['attendance_records']
+            seen += [(record.date, record.user.username) for record in page]
+            sql = ' '.join(query['sql'] for query in queries).upper()
+            self.assertNotIn('OFFSET', sql)
+            self.assertNotIn('COUNT(', sql)
+            self.assertIsNone(response.context['total_count'])
+            if not page.has_next():
+                break
+            params['cursor'] = page.next_cursor
+        self.assertEqual(len(seen), 27)
+        self.assertEqual(len(set(seen)), 27)
+
+        response = self.client.get(url, {**params, 'count': 1})
+        self.assertEqual(response.context['total_count'], 27)
+
+    def test_history_with_invalid_cursor_shows_the_first_page(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('attendance:attendance_history'), {
+            'start_date': '2026-03-01', 'end_date': '2026-03-31', 'cursor': 'not-a-cursor',
+        })
+        self.assertContains(response, 'The requested page is no longer valid')
+        self.assertEqual([record.date for record in response.context['attendance_records']], [
+            date(2026, 3, 9) - timedelta(days=offset) for offset in range(9)
+        ])
+
+
+class AttendanceMetricsTests(IsolatedCacheMixin, TestCase):
+    """Worked time and lateness stored on attendance records"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('metrics_user')
+        cls.day = date(2026, 3, 2)
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime(self.day.year, self.day.month, self.day.day, hour, minute))
+
+    def test_metrics_follow_the_times_and_the_shift(self):
+        record = Attendance.objects.create(user=self.user, date=self.day, check_in_time=self.at(9, 30))
+        self.assertEqual((record.worked_seconds, record.is_late, record.left_early), (0, True, False))
+
+        record.check_out_time = self.at(16, 30)
+        record.save(update_fields=['check_out_time'])
+        record.refresh_from_db()
+        self.assertEqual((record.worked_seconds, record.is_late, record.left_early), (7 * 3600, True, True))
+        self.assertEqual((record.get_duration(), record.get_duration_hours()), ('7h 0m', 7.0))
+
+        shift = {'start': '09:00', 'end': '17:00', 'late_grace_minutes': 45, 'early_leave_grace_minutes': 45}
+        with override_settings(ATTENDANCE_SHIFT=shift):
+            status = AttendanceStatus(user=self.user, date=self.day, check_in_time=self.at(9, 30).time())
+            self.assertFalse(status.is_late)
+            # Records keep their stored values until they are saved or backfilled
+            self.assertTrue(Attendance.objects.get(pk=record.pk).is_late)
+            output = StringIO()
+            call_command('backfill_attendance_metrics', stdout=output)
+            self.assertIn('Updated: 1', output.getvalue())
+            record.refresh_from_db()
+            self.assertEqual((record.is_late, record.left_early), (False, False))
+
+    def test_backfill_repairs_stale_columns(self):
+        Attendance.objects.create(user=self.user, date=self.day, check_in_time=self.at(8, 55), check_out_time=self.at(17, 5))
+        Attendance.objects.update(worked_seconds=0, is_late=True, left_early=True)
+        call_command('backfill_attendance_metrics', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            list(Attendance.objects.values_list('worked_seconds', 'is_late', 'left_early')), [(8 * 3600 + 600, False, False)]
+        )
+
+
+class StoredMetricsWriteTests(IsolatedCacheMixin, TestCase):
+    """The write paths of the web and the admin keep the stored metrics current"""
+
+    def setUp(self):
+        super().setUp()
+        self.member = create_user('metrics_member')
+
+    def test_check_out_through_the_form_stores_the_worked_time(self):
+        checked_in = timezone.now() - timedelta(hours=3)
+        record = Attendance.objects.create(user=self.member, date=timezone.localdate(), check_in_time=checked_in)
+        self.assertEqual(record.worked_seconds, 0)
+
+        self.client.force_login(self.member)
+        with patch('attendance.views.enqueue_log') as enqueue_log:
+            self.client.post(reverse('attendance:mark_attendance'), {'verification_method': 'manual', 'notes': ''})
+        self.assertEqual(enqueue_log.call_args.kwargs['log_type'], 'check_out')
+        record.refresh_from_db()
+        self.assertIsNotNone(record.check_out_time)
+        self.assertEqual(record.worked_seconds, int((record.check_out_time - checked_in).total_seconds()))
+        self.assertGreaterEqual(record.worked_seconds, 3 * 3600)
+        self.assertEqual(record.left_early, get_shift_policy().left_early(record.check_out_time))
+
+    def test_staff_edit_in_the_admin_recomputes_the_metrics(self):
+        day = date(2026, 3, 3)
+        record = Attendance.objects.create(
+            user=self.member, date=day,
+            check_in_time=timezone.make_aware(datetime(2026, 3, 3, 8, 50)),
+            check_out_time=timezone.make_aware(datetime(2026, 3, 3, 17, 10)),
+        )
+        self.assertEqual((record.is_late, record.left_early), (False, False))
+
+        self.client.force_login(create_user('metrics_admin', is_staff=True, is_superuser=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:attendance_attendance_change', args=[record.pk]), {
+                'user': self.member.pk,
+                'date': '2026-03-03',
+                'check_in_time_0': '2026-03-03', 'check_in_time_1': '09:40:00',
+                'check_out_time_0': '2026-03-03', 'check_out_time_1': '15:40:00',
+                'attendance_type': 'student',
+                'is_present': 'on',
+                'notes': 'Corrected by staff',
+                # Ignored: the metrics are read-only in the admin
+                'worked_seconds': '1',
+            })
+        self.assertEqual(response.status_code, 302)
+        record.refresh_from_db()
+        self.assertEqual((record.worked_seconds, record.is_late, record.left_early), (6 * 3600, True, True))
+        # The summaries add up the stored columns
+        self.assertEqual(
+            [(row['late_arrivals'], row['early_departures'], row['total_hours']) for row in summary_data(day, day)],
+            [(1, 1, 6.0)],
+        )
+
+
+class DatasetTests(IsolatedCacheMixin, TestCase):
+    """The synthetic dataset generator behind the benchmarks"""
+
+    END = date(2026, 3, 13)
+
+    def rows(self, prefix):
+        """The generated attendance and statuses by user index, leaving out keys and write times"""
+        def strip(rows):
+            return sorted((username[len(prefix):], *values) for username, *values in rows)
+
+        return (
+            strip(Attendance.objects.filter(user__username__startswith=prefix).values_list(
+                'user__username', 'date', 'check_in_time', 'check_out_time', 'worked_seconds', 'is_late', 'left_early',
+            )),
+            strip(AttendanceStatus.objects.filter(user__username__startswith=prefix).values_list(
+                'user__username', 'date', 'status',
+            )),
+            strip(Profile.objects.filter(user__username__startswith=prefix).values_list('user__username', 'department')),
+        )
+
+    def test_same_seed_same_rows(self):
+        counts = generate_dataset(users=20, days=15, seed=1, end=self.END, prefix='first')
+        self.assertEqual((counts['start'], counts['users']), (self.END - timedelta(days=14), 20))
+        call_command(
+            'generate_dataset', '--users=20', '--days=15', '--seed=1', f'--end-date={self.END}', '--prefix=second',
+            stdout=StringIO(),
+        )
+        generate_dataset(users=20, days=15, seed=2, end=self.END, prefix='third')
+
+        first = self.rows('first')
+        self.assertEqual(self.rows('second'), first)
+        self.assertNotEqual(self.rows('third'), first)
+
+        attendance, statuses, profiles = first
+        self.assertEqual(len(attendance), counts['attendance'])
+        self.assertEqual(len(statuses), counts['statuses'])
+        # Weekdays only
+        self.assertEqual({row[1].weekday() for row in statuses}, {0, 1, 2, 3, 4})
+        self.assertGreater(len({department for _, department in profiles}), 1)
+        self.assertTrue(any(is_late for *_, is_late, _ in attendance))
+        self.assertTrue(any(check_out is None for _, _, _, check_out, *_ in attendance))
+        self.assertIn('absent', {status for *_, status in statuses})
+        self.assertEqual(
+            UserDailyRollup.objects.filter(user__username__startswith='first').count(), counts['rollups'],
+        )
+        self.assertEqual(AttendanceLog.objects.filter(user__username__startswith='first').count(), counts['logs'])
+
+        self.assertGreater(delete_dataset('first'), 20)
+        self.assertFalse(User.objects.filter(username__startswith='first').exists())
+        self.assertEqual(self.rows('second'), first)
+
+
+class GeneratedDatasetConsistencyTests(IsolatedCacheMixin, TestCase):
+    """Rows the generator writes directly agree with what the application would derive"""
+
+    END = date(2026, 2, 8)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = generate_dataset(users=12, days=21, seed=7, end=cls.END, prefix='gen', include_weekends=True)
+
+    def test_every_day_has_one_status_and_matching_logs(self):
+        statuses = AttendanceStatus.objects.filter(user__username__startswith='gen')
+        self.assertEqual(statuses.count(), 12 * 21)
+        self.assertEqual({day.weekday() for day in statuses.values_list('date', flat=True)}, set(range(7)))
+        self.assertFalse(statuses.values('user', 'date').annotate(n=Count('id')).filter(n__gt=1).exists())
+
+        # Days without an attendance record are the absences and leaves
+        records = Attendance.objects.filter(user__username__startswith='gen')
+        missing = statuses.exclude(date__in=records.filter(user=OuterRef('user')).values('date'))
+        self.assertEqual(set(missing.values_list('status', flat=True)), {'absent', 'leave'})
+        self.assertEqual(missing.count() + records.count(), statuses.count())
+
+        logs = AttendanceLog.objects.filter(user__username__startswith='gen')
+        self.assertEqual(logs.filter(log_type='check_in').count(), records.count())
+        self.assertEqual(logs.filter(log_type='check_out').count(), records.exclude(check_out_time=None).count())
+
+    def test_stored_metrics_follow_the_shift_policy(self):
+        records = list(Attendance.objects.filter(user__username__startswith='gen'))
+        stored = [(record.worked_seconds, record.is_late, record.left_early) for record in records]
+        for record in records:
+            record.update_metrics()
+        self.assertEqual([(record.worked_seconds, record.is_late, record.left_early) for record in records], stored)
+
+    def test_generated_rollups_match_a_rebuild(self):
+        def rollups():
+            return sorted(UserDailyRollup.objects.values_list(
+                'user_id', 'date', 'department', 'recorded', 'present', 'absent', 'late', 'left_early',
+                'worked_seconds',
+            ))
+
+        generated = rollups()
+        self.assertEqual(len(generated), self.counts['rollups'])
+        rebuild_rollups(self.counts['start'], self.counts['end'])
+        self.assertEqual(rollups(), generated)
+
+
+class StatusBatchTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('batch_staff', is_staff=True)
+        cls.member = create_user('batch_member')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_batch_is_all_or_nothing(self):
+        url = reverse('attendance:mark_attendance_status_batch')
+        items = [{'user_id': self.member.pk, 'status': 'late'}, {'user_id': self.member.pk, 'status': 'sick'}]
+        response = self.client.post(url, json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['error'] for result in response.json()['results']][0], None)
+        self.assertFalse(AttendanceStatus.objects.filter(user=self.member, status='late').exists())
+
+
+class DashboardEventsTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('events_staff', is_staff=True)
+        cls.member = create_user('events_member')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    async def test_status_changes_are_streamed(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('attendance:dashboard_events'))
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        def change_status():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse('attendance:mark_attendance_status'), {'user_id': self.member.pk, 'status': 'late'}
+                )
+
+        await sync_to_async(change_status)()
+        event = await asyncio.wait_for(anext(stream), 5)
+        self.assertTrue(event.startswith(b'event: status\n'))
+        self.assertIn(b'"status":"late"', event)
+        await response.streaming_content.aclose()
+
+
+class AsyncEndpointTests(IsolatedCacheMixin, TestCase):
+    """The async twins of the JSON endpoints answer like the synchronous views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('async_staff', is_staff=True)
+        cls.member = create_user('async_member')
+
+    async def test_check_in_and_out(self):
+        await self.async_client.aforce_login(self.member)
+        url = reverse('attendance:check_in_api_async')
+        self.assertEqual((await self.async_client.get(url)).status_code, 400)
+
+        check_in = (await self.async_client.post(url)).json()
+        check_out = (await self.async_client.post(url)).json()
+        self.assertEqual((check_in['action'], check_out['action']), ('check_in', 'check_out'))
+        self.assertEqual(check_in['attendance_id'], check_out['attendance_id'])
+        record = await Attendance.objects.aget(user=self.member)
+        self.assertIsNotNone(record.check_out_time)
+
+    async def test_staff_endpoints(self):
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.post(reverse('attendance:mark_attendance_status_async'))
+        self.assertEqual(response.status_code, 403)
+
+        await self.async_client.aforce_login(self.staff)
+        url = reverse('attendance:mark_attendance_status_async')
+        for status in ('late', 'present'):
+            response = await self.async_client.post(url, {'user_id': self.member.pk, 'status': status})
+            self.assertEqual(response.json()['message'], 'Attendance status updated for async_member')
+        self.assertEqual(
+            [status async for status in AttendanceStatus.objects.values_list('status', flat=True)], ['present']
+        )
+        response = await self.async_client.post(url, {'user_id': 0, 'status': 'late'})
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.post(reverse('attendance:create_daily_notification_async'))
+        notification = await DailyAttendanceNotification.objects.aget(pk=response.json()['notification_id'])
+        self.assertIn('Present: 1 students', notification.message)
+        self.assertIn('Total Students: 1', notification.message)
+
+        url = reverse('attendance:mark_notification_read_async', args=[notification.pk])
+        self.assertEqual((await self.async_client.post(url)).json(), {'success': True})
+        await notification.arefresh_from_db()
+        self.assertTrue(notification.is_read)
+        url = reverse('attendance:mark_notification_read_async', args=[notification.pk + 1])
+        self.assertEqual((await self.async_client.post(url)).status_code, 404)
+
+    async def test_face_tasks_run_off_the_event_loop_with_the_context(self):
+        variable = contextvars.ContextVar('face_task_test')
+        variable.set('request')
+        loop_thread = threading.get_ident()
+        value, thread = await run_face_task(lambda: (variable.get(), threading.get_ident()))
+        self.assertEqual(value, 'request')
+        self.assertNotEqual(thread, loop_thread)
+
+
+class ReportExportTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(users=10, days=20, seed=1, prefix='export')
+
+    def test_export_memory(self):
+        output = StringIO()
+        call_command('benchmark_report_export', rows=5000, max_memory_mb=32, stdout=output)
+        self.assertIn('Exported 5,000 rows', output.getvalue())
+
+
+class UserSearchTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('search_staff', is_staff=True)
+        cls.users = [create_user(f'search{number:02d}') for number in range(25)]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_autocomplete_pages_and_follows_changes(self):
+        url = reverse('attendance:user_autocomplete')
+        first = self.client.get(url, {'q': 'search'}).json()
+        second = self.client.get(url, {'q': 'search', 'page': 2}).json()
+        self.assertTrue(first['more'])
+        self.assertEqual(len(first['results']), 20)
+        self.assertFalse({result['id'] for result in first['results']} & {result['id'] for result in second['results']})
+
+        member = self.users[0]
+        profile = member.profile
+        profile.employee_id = 'XK-4711'
+        profile.save()
+        found = self.client.get(url, {'q': 'xk-47 ' + member.username}).json()['results']
+        self.assertEqual([result['id'] for result in found], [member.pk])
+
+    def test_selected_user_is_rendered_without_the_index(self):
+        member = self.users[3]
+        User.objects.filter(pk=member.pk).update(first_name='Ada', last_name='Lovelace')
+        form = DateRangeForm({'start_date': '2026-01-01', 'end_date': '2026-01-31', 'user': member.pk})
+        self.assertTrue(form.is_valid())
+        with patch('attendance.user_search.build_index', wraps=build_index) as build, self.assertNumQueries(1):
+            html = str(form['user'])
+        build.assert_not_called()
+        self.assertInHTML(f'<option value="{member.pk}" selected>Ada Lovelace (search03)</option>', html)
+        self.assertEqual(html.count('<option'), 2)
+
+
+class SharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.location = f'{directory}/cache.sqlite3'
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_add_replaces_only_expired_entries(self):
+        shared = self.make_cache()
+        self.assertTrue(shared.add('key', 1))
+        self.assertFalse(shared.add('key', 2))
+        self.assertEqual(shared.get('key'), 1)
+        shared.set('expired', 1, timeout=-1)
+        self.assertIsNone(shared.get('expired'))
+        self.assertTrue(shared.add('expired', 2))
+        self.assertEqual(shared.get('expired'), 2)
+        shared.set('forever', 1, timeout=None)
+        self.assertFalse(shared.add('forever', 2))
+
+    def test_incr(self):
+        shared = self.make_cache()
+        shared.set('key', 1)
+        self.assertEqual(shared.incr('key', 2), 3)
+        self.assertEqual(shared.decr('key'), 2)
+        self.assertEqual(shared.get('key'), 2)
+        with self.assertRaises(ValueError):
+            shared.incr('missing')
+        shared.set('expired', 1, timeout=-1)
+        with self.assertRaises(ValueError):
+            shared.incr('expired')
+
+    def test_cull(self):
+        shared = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        with patch.object(SQLiteCache, 'CULL_EVERY', 1):
+            shared.set('expired', 0, timeout=-1)
+            shared.set('forever', 0, timeout=None)
+            for number in range(10):
+                shared.set(number, number, timeout=100 + number)
+        # The expired entry goes first; then half of the 11 left, the ones closest to expiring
+        self.assertEqual(shared.get_many(['forever', *range(10)]), {'forever': 0, **{number: number for number in range(5, 10)}})
+
+    def test_cull_frequency_zero_clears(self):
+        shared = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=0)
+        with patch.object(SQLiteCache, 'CULL_EVERY', 1):
+            for number in range(4):
+                shared.set(number, number, timeout=None)
+        self.assertEqual(shared.get_many(range(4)), {})
+
+    def test_get_or_compute_once_for_concurrent_misses(self):
+        caches = {'default': {'BACKEND': 'attendance.cache.SQLiteCache', 'LOCATION': self.location}}
+        with override_settings(CACHES=caches):
+            # Concurrent misses compute the value once; the others wait for it
+            computed = []
+
+            def compute():
+                computed.append(1)
+                time.sleep(0.2)
+                return len(computed)
+
+            threads = [
+                threading.Thread(target=get_or_compute, args=('slow', compute, 60), kwargs={'tags': ['day:1']})
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(computed, [1])
+            self.assertEqual(get_or_compute('slow', compute, 60, tags=['day:1']), 1)
+            invalidate_tags(['day:1'])
+            self.assertEqual(get_or_compute('slow', compute, 60, tags=['day:1']), 2)
+
+
+class CrossProcessCacheTests(SimpleTestCase):
+    """Workers in other processes share the entries, locks and tags of the SQLite cache file"""
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.location = f'{directory}/cache.sqlite3'
+        caches = {'default': {'BACKEND': 'attendance.cache.SQLiteCache', 'LOCATION': self.location}}
+        self.enterContext(override_settings(CACHES=caches))
+
+    def worker(self, code):
+        """Start a Python process running ``code`` with the same cache configured"""
+        script = '\n'.join([
+            'from django.conf import settings',
+            f"settings.configure(CACHES={{'default': {{'BACKEND': 'attendance.cache.SQLiteCache', 'LOCATION': {self.location!r}}}}})",
+            'from attendance.cache import get_or_compute, invalidate_tags',
+            code,
+        ])
+        return subprocess.Popen(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+        )
+
+    def run_worker(self, code):
+        output, _ = self.worker(code).communicate(timeout=30)
+        return output.strip()
+
+    def test_tags_invalidated_by_another_process(self):
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return len(computed)
+
+        self.assertEqual(get_or_compute('history:3', compute, 60, tags=['user:3', 'day:2026-03-02'], beta=0), 1)
+        self.run_worker("invalidate_tags(['user:4'])")
+        self.assertEqual(get_or_compute('history:3', compute, 60, tags=['user:3', 'day:2026-03-02'], beta=0), 1)
+
+        self.run_worker("invalidate_tags(['day:2026-03-02'])")
+        self.assertEqual(get_or_compute('history:3', compute, 60, tags=['user:3', 'day:2026-03-02'], beta=0), 2)
+
+        # The other process reads this one's value, and sees this one's invalidation
+        read = "print(get_or_compute('history:3', lambda: 'recomputed', 60, tags=['user:3', 'day:2026-03-02'], beta=0))"
+        self.assertEqual(self.run_worker(read), '2')
+        invalidate_tags(['user:3'])
+        self.assertEqual(self.run_worker(read), 'recomputed')
+
+    def test_one_process_recomputes_while_another_waits(self):
+        worker = self.worker(
+            "import time\n"
+            "def compute():\n"
+            "    print('computing', flush=True)\n"
+            "    time.sleep(1)\n"
+            "    return 'from the worker'\n"
+            "get_or_compute('report', compute, 60, tags=['users'])"
+        )
+        self.addCleanup(worker.wait, 30)
+        self.addCleanup(worker.stdout.close)
+        # The worker holds the recomputation lock once it starts computing
+        self.assertEqual(worker.stdout.readline().strip(), 'computing')
+
+        computed = []
+        value = get_or_compute('report', lambda: computed.append(1) or 'from the test', 60, tags=['users'])
+        self.assertEqual((value, computed), ('from the worker', []))
+
+
+class CommitCallbackTests(IsolatedCacheMixin, TestCase):
+    """Work deferred until a write commits fails on its own, with the error logged"""
+
+    def test_failed_tag_invalidation_is_logged(self):
+        with patch('attendance.versions.invalidate_tags', side_effect=OSError('disk I/O error')), \
+                self.assertLogs(level='ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            bump_versions([NOTIFICATIONS])
+        self.assertIn('disk I/O error', logs.output[0])
+        self.assertIn(NOTIFICATIONS, get_versions([NOTIFICATIONS]))
+
+    def test_failed_dashboard_events_are_logged(self):
+        member = create_user('callback_member')
+        with patch('attendance.signals.publish', side_effect=OSError('No buffer space available')), \
+                self.assertLogs(level='ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            AttendanceStatus.objects.create(user=member, date=date(2026, 3, 2), status='late')
+            DailyAttendanceNotification.objects.create(notification_type='system_alert', title='Alert', message='')
+        self.assertEqual(sum('No buffer space available' in line for line in logs.output), 2)
+        self.assertTrue(AttendanceStatus.objects.filter(user=member).exists())
+
+    def test_failed_summary_write_through_is_logged(self):
+        member = create_user('summary_callback_member')
+        with patch('attendance.signals.apply_changes', side_effect=OSError('database or disk is full')), \
+                self.assertLogs(level='ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.create(user=member, date=date(2026, 3, 2))
+        self.assertIn('database or disk is full', logs.output[0])
+        self.assertTrue(Attendance.objects.filter(user=member).exists())
+
+
+class AnalyticsTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        counts = generate_dataset(users=20, days=45, seed=1, prefix='analytics')
+        cls.start, cls.end = counts['start'], counts['end']
+        cls.staff = create_user('analytics_staff', is_staff=True)
+        cls.member = User.objects.get(username='analytics000001')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_report_matches_the_status_rows(self):
+        params = {'start_date': self.start, 'end_date': self.end, 'status': 'absent', 'threshold': 3}
+        report = self.client.get(reverse('attendance:analytics_api'), params).json()
+
+        # The vectorized results match a loop over each user's statuses
+        statuses = defaultdict(list)
+        for username, status in AttendanceStatus.objects.filter(date__range=(self.start, self.end)).order_by(
+            'user__username', 'date'
+        ).values_list('user__username', 'status'):
+            statuses[username].append(status)
+        streaks = {}
+        for username, days in statuses.items():
+            longest = run = 0
+            for status in days:
+                run = run + 1 if status == 'absent' else 0
+                longest = max(longest, run)
+            streaks[username] = (longest, run)
+        self.assertEqual(report['users'], len(statuses))
+        self.assertEqual(report['longest_streaks'][0]['longest'], max(longest for longest, _ in streaks.values()))
+        for row in report['longest_streaks']:
+            self.assertEqual((row['longest'], row['current']), streaks[row['username']])
+        self.assertEqual(
+            {row['username']: row['count'] for row in report['over_threshold']},
+            {username: days.count('absent') for username, days in statuses.items() if days.count('absent') > 3},
+        )
+
+        counts = {'total': Count('id'), 'absent': Count('id', filter=Q(status='absent'))}
+        week_start = max(self.start, self.end - timedelta(days=self.end.weekday()))
+        last_week = AttendanceStatus.objects.filter(date__range=(week_start, self.end)).values(
+            'user__profile__department'
+        ).annotate(**counts)
+        self.assertEqual(
+            {row['department']: row['rates'][-1] for row in report['department_rates'] if row['rates'][-1] is not None},
+            {row['user__profile__department']: round(row['absent'] / row['total'], 4) for row in last_week},
+        )
+        recent = AttendanceStatus.objects.filter(date__range=(self.end - timedelta(days=6), self.end)).aggregate(**counts)
+        self.assertEqual(report['rolling'][-1]['rate'], round(recent['absent'] / recent['total'], 4))
+
+        # Writes to the range invalidate the cached matrix once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            AttendanceStatus.objects.filter(user=self.member, date__range=(self.start, self.end)).first().delete()
+        changed = self.client.get(reverse('attendance:analytics_api'), params).json()
+        self.assertEqual(changed['recorded'], report['recorded'] - 1)
+
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse('attendance:analytics_api'), params).status_code, 403)
+        self.client.force_login(self.staff)
+        invalid = {**params, 'start_date': self.end, 'end_date': self.start}
+        self.assertEqual(self.client.get(reverse('attendance:analytics_api'), invalid).status_code, 400)
+
+    def test_orm_fallback_matches_the_sqlite_query(self):
+        alias = router.db_for_read(AttendanceStatus)
+        # A short range reads the date index, a long one scans the table
+        for start in (self.end - timedelta(days=6), self.start):
+            with self.subTest(start=start):
+                expected = load_matrix(start, self.end)
+                self.assertTrue(expected.statuses.any())
+                with patch.object(connections[alias], 'vendor', 'other'):
+                    matrix = load_matrix(start, self.end)
+                np.testing.assert_array_equal(matrix.statuses, expected.statuses)
+                np.testing.assert_array_equal(matrix.user_ids, expected.user_ids)
+                self.assertEqual(matrix.usernames, expected.usernames)
+                self.assertEqual(matrix.departments, expected.departments)
+
+
+class AnalyticsMatrixTests(IsolatedCacheMixin, TestCase):
+    """Exact matrix and results of a small hand-written range, through both loaders"""
+
+    START = date(2026, 3, 2)  # A Monday; the range ends on the Tuesday a week later
+    # username: (department, {day offset: status}); weekend days 5 and 6 have no statuses
+    STATUSES = {
+        'ana': ('Sales', {0: 'absent', 1: 'absent', 2: 'present', 3: 'absent', 4: 'absent', 7: 'absent', 8: 'late'}),
+        'ben': ('Support', {0: 'present', 4: 'absent', 7: 'absent', 8: 'absent'}),
+        'cy': ('', {2: 'leave', 3: 'half_day'}),
+        'dee': ('Sales', {}),
+    }
+
+    def setUp(self):
+        super().setUp()
+        rows = []
+        for username, (department, days) in self.STATUSES.items():
+            user = create_user(username)
+            Profile.objects.filter(user=user).update(department=department)
+            rows += [
+                AttendanceStatus(user=user, date=self.START + timedelta(days=offset), status=status)
+                for offset, status in days.items()
+            ]
+        # Outside the range
+        rows.append(AttendanceStatus(user=user, date=self.START - timedelta(days=1), status='absent'))
+        AttendanceStatus.objects.bulk_create(rows)
+        self.end = self.START + timedelta(days=8)
+
+    def load(self, vendor):
+        if vendor == 'sqlite':
+            return load_matrix(self.START, self.end)
+        with patch.object(connections[router.db_for_read(AttendanceStatus)], 'vendor', vendor):
+            return load_matrix(self.START, self.end)
+
+    def test_matrix_and_report(self):
+        for vendor in ('sqlite', 'postgresql'):
+            with self.subTest(vendor=vendor):
+                matrix = self.load(vendor)
+                # present 1, absent 2, late 3, half_day 4, leave 5, no status 0
+                self.assertEqual(matrix.statuses.tolist(), [
+                    [2, 2, 1, 2, 2, 0, 0, 2, 3],
+                    [1, 0, 0, 0, 2, 0, 0, 2, 2],
+                    [0, 0, 5, 4, 0, 0, 0, 0, 0],
+                ])
+                self.assertEqual(matrix.statuses.dtype, np.int8)
+                self.assertEqual(matrix.usernames, ('ana', 'ben', 'cy'))
+                self.assertEqual(matrix.departments, ('Sales', 'Support', ''))
+                self.assertEqual(
+                    matrix.user_ids.tolist(), [User.objects.get(username=name).pk for name in ('ana', 'ben', 'cy')]
+                )
+
+                report = analytics_report(matrix, 'absent', threshold=3)
+                self.assertEqual(
+                    [(row['username'], row['longest'], row['current']) for row in report['longest_streaks']],
+                    [('ana', 3, 0), ('ben', 3, 3)],
+                )
+                self.assertEqual([(row['username'], row['count']) for row in report['over_threshold']], [('ana', 5)])
+                self.assertEqual(report['weeks'], ['2026-03-02', '2026-03-09'])
+                self.assertEqual(report['department_rates'], [
+                    {'department': '', 'rates': [0.0, None]},
+                    {'department': 'Sales', 'rates': [0.8, 0.5]},
+                    {'department': 'Support', 'rates': [0.5, 1.0]},
+                ])
+                self.assertEqual(report['rolling'][-1], {'date': '2026-03-10', 'rate': 0.6})
+                self.assertEqual(report['heatmap'], [
+                    [0.5, 1.0], [1.0, 0.5], [0.0, None], [0.5, None], [1.0, None], [None, None], [None, None],
+                ])
+                self.assertEqual(report['totals'], {'present': 2, 'absent': 8, 'late': 1, 'half_day': 1, 'leave': 1})
+
+
+class ChangeFeedTests(IsolatedCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(users=5, days=10, seed=1, prefix='feed')
+        cls.staff = create_user('feed_staff', is_staff=True)
+        cls.member = User.objects.get(username='feed000001')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def test_feed_follows_changes(self):
+        url = reverse('attendance:change_feed')
+
+        def read(cursor, **params):
+            response = self.client.get(url, {'cursor': cursor, **params}, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response.status_code, 200)
+            body = gzip.decompress(response.content) if response.has_header('Content-Encoding') else response.content
+            return [json.loads(line) for line in body.splitlines()], response['X-Change-Cursor'], response['X-Change-More']
+
+        _, cursor, _ = read('latest')
+        # Bulk updates, bulk inserts and deletes are all recorded; a row changed twice appears once
+        statuses = list(AttendanceStatus.objects.filter(user=self.member).order_by('date')[:3])
+        AttendanceStatus.objects.filter(pk__in=[status.pk for status in statuses]).update(status='late')
+        AttendanceStatus.objects.filter(pk=statuses[0].pk).update(notes='Changed twice')
+        log, = AttendanceLog.objects.bulk_create([AttendanceLog(user=self.member, log_type='check_in')])
+        record = Attendance.objects.filter(user=self.member).first()
+        record_id = record.pk
+        record.delete()
+
+        changes, next_cursor, more = read(cursor)
+        self.assertEqual(more, 'false')
+        self.assertEqual([(change['model'], change['id'], change['op']) for change in changes], [
+            ('status', statuses[1].pk, 'upsert'),
+            ('status', statuses[2].pk, 'upsert'),
+            ('status', statuses[0].pk, 'upsert'),
+            ('log', log.pk, 'upsert'),
+            ('attendance', record_id, 'delete'),
+        ])
+        self.assertEqual(changes[2]['data']['notes'], 'Changed twice')
+        self.assertEqual(changes[1]['data']['status'], 'late')
+        self.assertIsNone(changes[4]['data'])
+        self.assertEqual(read(next_cursor)[0], [])
+
+        # Small pages resume where the previous one stopped; a row changed again
+        # in a later page appears in both, and its last change wins
+        first, page_cursor, more = read(cursor, limit=2)
+        self.assertEqual(more, 'true')
+        rest, _, _ = read(page_cursor, limit=10)
+        self.assertEqual(
+            {(change['model'], change['id']): change['seq'] for change in first + rest},
+            {(change['model'], change['id']): change['seq'] for change in changes},
+        )
+
+        # Cursors before pruned changes have expired
+        AttendanceChange.objects.filter(pk__lte=first[0]['seq']).delete()
+        self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 410)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+
+        anonymous = Client()
+        self.assertEqual(anonymous.get(url, {'cursor': page_cursor}).status_code, 403)
+        with override_settings(ATTENDANCE_CHANGE_FEED={'TOKEN': 'secret'}):
+            response = anonymous.get(url, {'cursor': page_cursor}, HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Change-Cursor'], next_cursor)
+
+    def test_export_command_resumes_from_the_cursor_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cursor_file = os.path.join(directory, 'cursor')
+            call_command('export_changes', cursor='latest', cursor_file=cursor_file, stdout=StringIO(), stderr=StringIO())
+            AttendanceStatus.objects.filter(user=self.member).update(status='leave')
+            statuses = set(AttendanceStatus.objects.filter(user=self.member).values_list('pk', flat=True))
+
+            output = StringIO()
+            call_command('export_changes', cursor_file=cursor_file, output_dir=directory, limit=10, stdout=output)
+            self.assertIn(f'Exported {len(statuses)} changed rows', output.getvalue())
+            exported = set()
+            for name in os.listdir(directory):
+                if name.endswith('.ndjson.gz'):
+                    with gzip.open(os.path.join(directory, name), 'rt') as page:
+                        exported.update(json.loads(line)['id'] for line in page)
+            self.assertEqual(exported, statuses)
+
+            # The stored cursor follows the last change exported
+            output = StringIO()
+            call_command('export_changes', cursor_file=cursor_file, stdout=output, stderr=StringIO())
+            self.assertEqual(output.getvalue(), '')
+
+    def test_cursor_must_be_a_change_id(self):
+        self.assertEqual(decode_change_cursor(encode_change_cursor(42)), 42)
+        for seq in (True, False, -1, 1.5, '1', None):
+            token = base64.urlsafe_b64encode(json.dumps(['changes', seq]).encode()).decode()
+            with self.subTest(seq=seq), self.assertRaises(InvalidCursor):
+                decode_change_cursor(token)
+
+    def test_archived_logs_are_deleted_from_the_feed(self):
+        log = AttendanceLog.objects.create(
+            user=self.member, log_type='check_in', verification_method='student',
+            timestamp=timezone.now() - timedelta(days=400),
+        )
+        cursor = read_changes(LATEST).cursor
+        with tempfile.TemporaryDirectory() as directory:
+            archive_old_rows(archive_dir=directory, models=['attendancelog'])
+        changes = [json.loads(line) for line in read_changes(cursor).lines]
+        self.assertIn({'seq': changes[-1]['seq'], 'model': 'log', 'id': log.pk, 'op': 'delete', 'data': None}, changes)
+
+
+class ChangeFeedReplicationTests(IsolatedCacheMixin, TestCase):
+    """A consumer applying the feed to a full export ends up with the current tables"""
+
+    def setUp(self):
+        super().setUp()
+        generate_dataset(users=4, days=6, seed=3, end=date(2026, 3, 6), prefix='mirror')
+
+    def snapshot(self):
+        """``{(model, id): row}`` of the three tables, encoded as the feed encodes rows"""
+        rows = {}
+        for source, (model, _) in FEED_SOURCES.items():
+            attnames = [field.attname for field in model._meta.concrete_fields]
+            for row in model.objects.values(*attnames):
+                rows[source, row['id']] = json.loads(json.dumps(row, cls=ArchiveEncoder))
+        return rows
+
+    def sync(self, mirror, cursor, limit):
+        pages = 0
+        while True:
+            page = read_changes(cursor, limit)
+            for change in map(json.loads, page.lines):
+                if change['op'] == 'delete':
+                    mirror.pop((change['model'], change['id']), None)
+                else:
+                    mirror[change['model'], change['id']] = change['data']
+            cursor, pages = page.cursor, pages + 1
+            if not page.more:
+                return cursor, pages
+
+    def test_deltas_reproduce_the_tables(self):
+        cursor = read_changes(LATEST).cursor
+        mirror = self.snapshot()
+
+        # Bulk loads with deferred triggers, saves, bulk updates, raw SQL and cascades
+        generate_dataset(users=3, days=4, seed=4, end=date(2026, 3, 6), prefix='later')
+        record_check_in(User.objects.get(username='mirror000000'), verification_method='manual')
+        AttendanceStatus.objects.filter(user__username='mirror000001').update(status='leave', notes='Approved')
+        with connection.cursor() as raw:
+            raw.execute(
+                f'UPDATE {Attendance._meta.db_table} SET notes = %s WHERE user_id = %s',
+                ['Edited in SQL', User.objects.get(username='mirror000002').pk],
+            )
+        User.objects.filter(username='mirror000003').delete()
+        AttendanceLog.objects.filter(user__username='later000000').delete()
+
+        cursor, pages = self.sync(mirror, cursor, limit=25)
+        self.assertGreater(pages, 3)
+        self.assertEqual(mirror, self.snapshot())
+        # Nothing is left to sync
+        self.assertEqual(read_changes(cursor).lines, [])
+
+    def test_pruned_changes_expire_older_cursors(self):
+        # A consumer that stopped after the first change, and one that is up to date
+        start = read_changes(limit=1).cursor
+        cursor = read_changes(LATEST).cursor
+        AttendanceChange.objects.update(changed_at=timezone.now() - timedelta(days=40))
+        AttendanceStatus.objects.filter(user__username='mirror000000').update(status='late')
+
+        self.assertGreater(prune_changes(retention_days=30), 0)
+        with self.assertRaises(CursorExpired):
+            read_changes(start)
+        # The up-to-date consumer still reads every change made since
+        changes = [json.loads(line) for line in read_changes(cursor).lines]
+        self.assertEqual({change['data']['status'] for change in changes}, {'late'})
+        self.assertEqual(len(changes), AttendanceStatus.objects.filter(user__username='mirror000000').count())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The triggers are SQLite ones')
+class TriggerRestoreTests(IsolatedCacheMixin, TestCase):
+    """Triggers dropped by a table rebuild come back after migrating"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = create_user('trigger_member')
+        cls.attendance = Attendance.objects.create(user=cls.member, date=date(2026, 1, 5))
+
+    def rebuild_table(self, model):
+        # What SQLite's schema editor leaves behind after rebuilding a table for AlterField
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [model._meta.db_table]
+            )
+            for name, in cursor.fetchall():
+                cursor.execute(f'DROP TRIGGER {name}')
+
+    def test_search_triggers(self):
+        if not search_available():
+            self.skipTest('SQLite has no FTS5')
+        self.rebuild_table(Attendance)
+        Attendance.objects.filter(pk=self.attendance.pk).update(notes='Forgot the badge')
+        found = search_filter(['badge'], [('pk', 'attendance')])
+        self.assertFalse(Attendance.objects.filter(found).exists())
+
+        with self.assertLogs('attendance', 'WARNING'):
+            emit_post_migrate_signal(0, False, DEFAULT_DB_ALIAS)
+        # The index is refilled, and follows later writes again
+        self.assertEqual(list(Attendance.objects.filter(found)), [self.attendance])
+        Attendance.objects.filter(pk=self.attendance.pk).update(notes='Left early')
+        self.assertFalse(Attendance.objects.filter(found).exists())
+        self.assertEqual(restore_search_triggers(), [])
+
+    def test_change_triggers(self):
+        self.rebuild_table(AttendanceLog)
+        latest = read_changes(LATEST).cursor
+        AttendanceLog.objects.create(user=self.member, log_type='check_in', verification_method='student')
+        self.assertEqual(read_changes(latest).lines, [])
+
+        with self.assertLogs('attendance.changes', 'WARNING'):
+            emit_post_migrate_signal(0, False, DEFAULT_DB_ALIAS)
+        log = AttendanceLog.objects.create(user=self.member, log_type='check_out', verification_method='student')
+        log_id = log.pk
+        log.delete()
+        changes = [json.loads(line) for line in read_changes(latest).lines]
+        self.assertEqual([(change['model'], change['id'], change['op']) for change in changes], [('log', log_id, 'delete')])
+        self.assertEqual(restore_change_triggers(), [])
+
+
+class SummaryCacheTests(IsolatedCacheMixin, TestCase):
+    """Cached dashboard summaries follow writes, however they interleave with readers and other writers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = create_user('summary_member')
+        cls.today = timezone.now().date()
+
+    def record(self, days_ago, **fields):
+        # on_commit callbacks are not run, so the cached summary is left to the test
+        return Attendance.objects.create(
+            user=self.member, date=self.today - timedelta(days=days_ago),
+            check_in_time=timezone.now() - timedelta(days=days_ago), **fields
+        )
+
+    def dates(self, summary):
+        return [row.date for row in summary.rows]
+
+    def test_writes_are_written_through(self):
+        self.assertEqual(get_summary(self.member.pk).rows, ())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.record(0, notes='On time')
+        with self.assertNumQueries(0):
+            summary = get_summary(self.member.pk)
+        self.assertEqual(summary.today_attendance.notes, 'On time')
+
+    def test_summary_built_before_a_write_is_not_served(self):
+        build = summaries.build_summary
+
+        def build_then_write(user_id, today):
+            stale = build(user_id, today)
+            # The write commits after the rows were read, before the summary is stored
+            with self.captureOnCommitCallbacks(execute=True):
+                self.record(1)
+            return stale
+
+        with patch('attendance.summaries.build_summary', side_effect=build_then_write):
+            self.assertEqual(get_summary(self.member.pk).rows, ())
+        self.assertEqual(self.dates(get_summary(self.member.pk)), [self.today - timedelta(days=1)])
+
+    def test_concurrent_writes_are_not_lost(self):
+        get_summary(self.member.pk)
+        first, second = self.record(2), self.record(3)
+        next_generation = summaries._next_generation
+        interleaved = []
+
+        def second_writer_runs_in_between(user_id):
+            generation = next_generation(user_id)
+            if not interleaved:
+                interleaved.append(generation)
+                apply_changes([second])
+            return generation
+
+        with patch('attendance.summaries._next_generation', side_effect=second_writer_runs_in_between):
+            apply_changes([first])
+        self.assertEqual(self.dates(get_summary(self.member.pk)), [first.date, second.date])
@@ -6,14 +6,31 @@ app_name = 'attendance'
 urlpatterns = [
     path('', views.attendance_home, name='attendance_home'),
     path('mark/', views.mark_attendance, name='mark_attendance'),
+    path('api/check-in/', views.check_in_api, name='check_in_api'),
     path('history/', views.attendance_history, name='attendance_history'),
+    path('history/log/', views.check_in_log, name='check_in_log'),
     path('report/', views.attendance_report, name='attendance_report'),
+    path('report/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('report/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
     path('upload-face/', views.upload_face, name='upload_face'),
     path('upload-fingerprint/', views.upload_fingerprint, name='upload_fingerprint'),
     path('test-camera/', views.test_camera, name='test_camera'),
     path('debug-camera/', views.debug_camera, name='debug_camera'),
     path('notifications/', views.notification_dashboard, name='notification_dashboard'),
+    path('notifications/events/', views.dashboard_events, name='dashboard_events'),
     path('mark-status/', views.mark_attendance_status, name='mark_attendance_status'),
+    path('mark-status/batch/', views.mark_attendance_status_batch, name='mark_attendance_status_batch'),
     path('create-notification/', views.create_daily_notification, name='create_daily_notification'),
     path('mark-notification-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
+    # Async twins of the JSON endpoints, for ASGI servers
+    path('async/api/check-in/', views.check_in_api_async, name='check_in_api_async'),
+    path('async/mark-status/', views.mark_attendance_status_async, name='mark_attendance_status_async'),
+    path('async/create-notification/', views.create_daily_notification_async, name='create_daily_notification_async'),
+    path('async/mark-notification-read/<int:notification_id>/', views.mark_notification_read_async, name='mark_notification_read_async'),
+    path('users/autocomplete/', views.user_autocomplete, name='user_autocomplete'),
+    path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
+    path('analytics/api/', views.analytics_api, name='analytics_api'),
+    path('profiling/', views.profiling_dashboard, name='profiling_dashboard'),
+    path('metrics/', views.profiling_metrics, name='profiling_metrics'),
+    path('changes/', views.change_feed, name='change_feed'),
 ]
\ No newline at end of file
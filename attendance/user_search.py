@@ -0,0 +1,130 @@
+"""
+Prefix search over users for the autocomplete fields of the report and history forms.
+
+Each process keeps a sorted list of ``(term, user id)`` pairs for every active
+user's username, first name, last name, full name and employee id. A lookup
+bisects to the first term starting with the query, so it costs one small query
+for the ``users`` version stamp however many users there are. The index is
+rebuilt with one query when the stamp changes, i.e. after any user or profile
+was saved or deleted.
+"""
+
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+
+from .versions import USERS, get_versions
+
+PAGE_SIZE = 20
+# Longest query that is looked up; longer ones are cut, since no term is longer
+MAX_QUERY_LENGTH = 150
+
+
+def format_label(username, full_name, employee_id):
+    label = full_name or username
+    return f'{label} ({employee_id})' if employee_id else label
+
+
+@dataclass
+class UserIndex:
+    version: int
+    # (term, user id) sorted by term, for prefix lookups
+    terms: list = field(default_factory=list)
+    # User ids sorted by username, for empty queries and for ordering matches
+    ordered: list = field(default_factory=list)
+    # user id -> (username, full name, employee id)
+    users: dict = field(default_factory=dict)
+    # user id -> position in ``ordered``
+    rank: dict = field(default_factory=dict)
+
+    def label(self, user_id):
+        return format_label(*self.users[user_id])
+
+    def prefix_matches(self, prefix):
+        """Ids of the users with a term starting with ``prefix``"""
+        matches = set()
+        for position in range(bisect_left(self.terms, (prefix,)), len(self.terms)):
+            term, user_id = self.terms[position]
+            if not term.startswith(prefix):
+                break
+            matches.add(user_id)
+        return matches
+
+    def search(self, query):
+        """Ids of the users matching every word of ``query``, ordered by username"""
+        words = query.lower()[:MAX_QUERY_LENGTH].split()
+        if not words:
+            return self.ordered
+        # The longest word usually matches the fewest terms
+        words.sort(key=len, reverse=True)
+        matches = self.prefix_matches(words[0])
+        for word in words[1:]:
+            if not matches:
+                break
+            matches &= self.prefix_matches(word)
+        return sorted(matches, key=self.rank.__getitem__)
+
+
+def build_index(version):
+    index = UserIndex(version)
+    rows = (
+        User.objects.filter(is_active=True)
+        .order_by('username')
+        .values_list('id', 'username', 'first_name', 'last_name', 'profile__employee_id')
+    )
+    for user_id, username, first_name, last_name, employee_id in rows:
+        full_name = f'{first_name} {last_name}'.strip()
+        index.users[user_id] = (username, full_name, employee_id or '')
+        index.rank[user_id] = len(index.ordered)
+        index.ordered.append(user_id)
+        terms = {username, first_name, last_name, full_name, employee_id or ''}
+        index.terms.extend((term.lower(), user_id) for term in terms if term)
+    index.terms.sort()
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The index of this process, rebuilt if a user changed since it was built"""
+    global _index
+    version = get_versions([USERS]).get(USERS, (0,))[0]
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = build_index(version)
+            index = _index
+    return index
+
+
+def search_users(query, page=1, per_page=PAGE_SIZE):
+    """One page of ``{'id', 'text'}`` results and whether more pages follow"""
+    index = get_index()
+    matches = index.search(query)
+    start = (page - 1) * per_page
+    results = [
+        {'id': user_id, 'text': index.label(user_id)}
+        for user_id in matches[start:start + per_page]
+    ]
+    return results, len(matches) > start + per_page
+
+
+def user_labels(user_ids, queryset=None):
+    """Labels of the users with ``user_ids`` as shown by the autocomplete, by id.
+
+    For rendering a few selected users: one query for them rather than the
+    index of every user. ``queryset`` limits the users (default: active ones).
+    """
+    queryset = User.objects.filter(is_active=True) if queryset is None else queryset
+    rows = queryset.filter(pk__in=user_ids).values_list(
+        'id', 'username', 'first_name', 'last_name', 'profile__employee_id',
+    )
+    return {
+        user_id: format_label(username, f'{first_name} {last_name}'.strip(), employee_id or '')
+        for user_id, username, first_name, last_name, employee_id in rows
+    }
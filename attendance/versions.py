@@ -0,0 +1,143 @@
+"""
+Version stamps for HTTP conditional responses.
+
+Every write to attendance data bumps the stamps of the slices it touches: the
+user, the day and ``all`` for attendance rows, ``users`` for accounts and
+``notifications`` for daily notifications. A page lists the stamps it depends
+on and ``conditional_page`` turns them into an ETag and Last-Modified, so a
+client with an up-to-date copy gets a 304 after one small query instead of the
+page's own queries.
+"""
+
+import datetime
+import hashlib
+import time
+
+from django.contrib import messages
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .cache import invalidate_tags
+from .models import AttendanceVersion
+
+ALL = 'all'
+USERS = 'users'
+NOTIFICATIONS = 'notifications'
+# Longer date ranges are covered by the ``all`` stamp instead of one stamp per day
+MAX_RANGE_DAYS = 62
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def day_key(day):
+    return f'day:{day.isoformat()}'
+
+
+def attendance_keys(instances):
+    """Stamps changed by a write of Attendance or AttendanceStatus rows"""
+    keys = {ALL}
+    for instance in instances:
+        keys.add(user_key(instance.user_id))
+        keys.add(day_key(instance.date))
+    return keys
+
+
+def range_keys(start, end):
+    """Stamps of the attendance of a date range: one per day, or ``all`` for long ranges"""
+    days = (end - start).days + 1
+    if days > MAX_RANGE_DAYS:
+        return [ALL]
+    return [day_key(start + datetime.timedelta(days=offset)) for offset in range(days)]
+
+
+def bump_versions(keys):
+    """Give the stamps new versions in one upsert, within the caller's transaction.
+
+    Cached values tagged with the stamps (see cache.py) go stale once the
+    transaction commits.
+    """
+    now = timezone.now()
+    version = time.time_ns()
+    keys = sorted(set(keys))
+    AttendanceVersion.objects.bulk_create(
+        [AttendanceVersion(key=key, version=version, updated_at=now) for key in keys],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['version', 'updated_at'],
+    )
+
+    # A named function: on_commit logs a failed robust callback by its __qualname__,
+    # which functools.partial lacks
+    def invalidate_cached_values():
+        invalidate_tags(keys)
+
+    transaction.on_commit(invalidate_cached_values, robust=True)
+
+
+def get_versions(keys):
+    """``{key: (version, updated_at)}`` of the stamps that exist"""
+    return {
+        key: (version, updated_at)
+        for key, version, updated_at in AttendanceVersion.objects.filter(key__in=keys).values_list(
+            'key', 'version', 'updated_at'
+        )
+    }
+
+
+def conditional_page(keys_func):
+    """View decorator answering conditional GETs from version stamps.
+
+    ``keys_func(request, *args, **kwargs)`` returns the stamp keys the page is
+    built from, or None to serve the page without validators. The ETag also
+    covers the user, the current date and the CSRF cookie, which the rendered
+    page depends on too; it is available to templates as
+    ``request.attendance_etag``. Responses are private and always revalidated.
+    """
+    def stamps(request, *args, **kwargs):
+        if not hasattr(request, '_attendance_stamps'):
+            keys = keys_func(request, *args, **kwargs)
+            # A 304 would hide queued messages, so they always get a full page
+            if keys is None or len(messages.get_messages(request)):
+                request._attendance_stamps = None
+            else:
+                request._attendance_stamps = get_versions(keys), keys
+        return request._attendance_stamps
+
+    def etag_func(request, *args, **kwargs):
+        found = stamps(request, *args, **kwargs)
+        if found is None:
+            return None
+        versions, keys = found
+        parts = [
+            request.resolver_match.view_name if request.resolver_match else request.path,
+            str(request.user.pk),
+            str(request.user.is_staff),
+            request.get_full_path(),
+            # Views take "today" from UTC, the active time zone or the server clock
+            *sorted({timezone.now().date().isoformat(), timezone.localdate().isoformat(),
+                     datetime.date.today().isoformat()}),
+            request.META.get('CSRF_COOKIE', ''),
+        ]
+        parts.extend(f'{key}={versions.get(key, (0,))[0]}' for key in sorted(keys))
+        request.attendance_etag = hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+        return request.attendance_etag
+
+    def last_modified_func(request, *args, **kwargs):
+        found = stamps(request, *args, **kwargs)
+        if found is None:
+            return None
+        versions, _ = found
+        # Pages show today's date, so they are never older than the start of today
+        start_of_day = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+        return max([start_of_day] + [updated_at for _, updated_at in versions.values()])
+
+    def decorator(view):
+        return cache_control(private=True, no_cache=True)(
+            condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        )
+
+    return decorator
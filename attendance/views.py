@@ -1,24 +1,76 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.utils.crypto import constant_time_compare
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
 from django.db.models import Q, Count
-from .models import Attendance, AttendanceLog, DailyAttendanceNotification, AttendanceStatus
-from .forms import AttendanceForm, ManualAttendanceForm, DateRangeForm
+from django.views.decorators.gzip import gzip_page
+from .models import Attendance, DailyAttendanceNotification, AttendanceStatus, ReportJob
+from .forms import AnalyticsForm, AttendanceForm, ManualAttendanceForm, DateRangeForm
+from .reports import get_report_queryset, report_rows, spool_xlsx, summary_data as report_summary_data, write_csv
+from .report_jobs import submit_report_job
+from .rollups import department_summaries
+from .pagination import InvalidCursor, paginate_by_date_and_user
+from .routers import reads_from_replica
+from .user_search import search_users
+from .analytics import analytics_report, get_matrix
+from .archive import attendance_logs
+from .changes import CursorExpired, get_config as get_changes_config, read_changes
+from .cache import get_or_compute
+from .summaries import get_summary
+from .services import CheckInUnavailable, InvalidStatusBatch, mark_statuses, record_check_in
+from .log_buffer import enqueue_log
+from .signals import attendance_changed
+from .versions import ALL, NOTIFICATIONS, USERS, conditional_page, day_key, range_keys, user_key
+from .events import event_stream, get_bus, get_config as get_events_config
+from .profiling import get_config as get_profiling_config, get_store, prometheus_metrics, stage_summaries, view_summaries
 from datetime import date, timedelta, datetime
-import csv
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import contextvars
+import json
+import os
+import threading
+
+
+def history_versions(request):
+    if not request.user.is_staff:
+        return [user_key(request.user.pk)]
+    # Staff see the user list and may filter any user's records
+    return [USERS, ALL]
+
+
+def report_versions(request):
+    params = request.GET
+    if not request.user.is_staff or 'background' in params or 'job' in params:
+        return None
+    # Summary reports read the rollups, which are refreshed only after the change commits
+    if params.get('report_type') == 'summary':
+        return None
+    return [USERS, ALL] if params else [USERS]
+
+
+def notification_dashboard_versions(request):
+    if not request.user.is_staff:
+        return None
+    return [day_key(date.today()), USERS, NOTIFICATIONS]
+
 
 @login_required
 def attendance_home(request):
     """Attendance home page"""
-    today = timezone.now().date()
-    today_attendance = Attendance.objects.filter(user=request.user, date=today).first()
+    summary = get_summary(request.user.pk)
     
     context = {
-        'today': today,
-        'attendance': today_attendance,
+        'today': summary.today,
+        'attendance': summary.today_attendance,
     }
     
     return render(request, 'attendance/home.html', context)
@@ -124,8 +176,8 @@ def mark_attendance(request):
                 attendance.save()
                 
                 # Create attendance log for check-out
-                AttendanceLog.objects.create(
-                    user=request.user,
+                enqueue_log(
+                    user_id=request.user.pk,
                     log_type='check_out',
                     verification_method=verification_method,
                     ip_address=request.META.get('REMOTE_ADDR'),
@@ -141,8 +193,8 @@ def mark_attendance(request):
                 
                 # Create attendance log for check-in if this is a new record
                 if created:
-                    AttendanceLog.objects.create(
-                        user=request.user,
+                    enqueue_log(
+                        user_id=request.user.pk,
                         log_type='check_in',
                         verification_method=verification_method,
                         ip_address=request.META.get('REMOTE_ADDR'),
@@ -165,6 +217,113 @@ def mark_attendance(request):
     return render(request, 'attendance/mark_attendance.html', context)
 
 @login_required
+def check_in_api(request):
+    """Record a check-in or check-out and return the day's attendance as JSON"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    verification_method = request.POST.get('verification_method', 'manual')
+    if verification_method == 'face':
+        if 'face_image' not in request.FILES:
+            return JsonResponse({'error': 'No face image provided'}, status=400)
+        
+        from .face_recognition_utils import verify_uploaded_face
+        
+        is_match, confidence, message = verify_uploaded_face(request.user, request.FILES['face_image'])
+        if not is_match:
+            return JsonResponse({'error': f'Face verification failed: {message}'}, status=403)
+    
+    try:
+        result = record_check_in(
+            request.user,
+            verification_method=verification_method,
+            notes=request.POST.get('notes', ''),
+            ip_address=request.META.get('REMOTE_ADDR'),
+            device_info=request.META.get('HTTP_USER_AGENT', ''),
+        )
+    except CheckInUnavailable:
+        return check_in_busy_response()
+    
+    return check_in_response(result)
+
+
+def check_in_response(result):
+    attendance = result.attendance
+    return JsonResponse({
+        'success': True,
+        'action': result.action,
+        'attendance_id': attendance.id,
+        'date': attendance.date.isoformat(),
+        'check_in_time': attendance.check_in_time.isoformat() if attendance.check_in_time else None,
+        'check_out_time': attendance.check_out_time.isoformat() if attendance.check_out_time else None,
+        'is_late': attendance.is_late,
+        'duration': attendance.get_duration(),
+    })
+
+
+def check_in_busy_response():
+    response = JsonResponse({'error': 'Attendance is busy, please try again'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
+# Face recognition is CPU-bound, so the async views run it on these threads instead
+# of the event loop; OpenCV and numpy release the GIL for the heavy parts
+FACE_RECOGNITION_WORKERS = getattr(settings, 'FACE_RECOGNITION_WORKERS', os.cpu_count() or 1)
+_face_executor = None
+_face_executor_lock = threading.Lock()
+
+
+def get_face_executor():
+    global _face_executor
+    if _face_executor is None:
+        with _face_executor_lock:
+            if _face_executor is None:
+                _face_executor = ThreadPoolExecutor(FACE_RECOGNITION_WORKERS, thread_name_prefix='face-recognition')
+    return _face_executor
+
+
+async def run_face_task(func, *args):
+    """Await ``func(*args)`` on the face executor; the context is copied so profiling stages are kept"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_face_executor(), partial(context.run, func, *args))
+
+
+@login_required
+async def check_in_api_async(request):
+    """Async twin of ``check_in_api`` for ASGI servers; holds no thread while it waits"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    user = await request.auser()
+    verification_method = request.POST.get('verification_method', 'manual')
+    if verification_method == 'face':
+        if 'face_image' not in request.FILES:
+            return JsonResponse({'error': 'No face image provided'}, status=400)
+        
+        from .face_recognition_utils import verify_uploaded_face
+        
+        is_match, confidence, message = await run_face_task(verify_uploaded_face, user, request.FILES['face_image'])
+        if not is_match:
+            return JsonResponse({'error': f'Face verification failed: {message}'}, status=403)
+    
+    try:
+        # One transaction with lock retries, which the async ORM cannot express
+        result = await sync_to_async(record_check_in)(
+            user,
+            verification_method=verification_method,
+            notes=request.POST.get('notes', ''),
+            ip_address=request.META.get('REMOTE_ADDR'),
+            device_info=request.META.get('HTTP_USER_AGENT', ''),
+        )
+    except CheckInUnavailable:
+        return check_in_busy_response()
+    
+    return check_in_response(result)
+
+@login_required
+@conditional_page(history_versions)
+@reads_from_replica
 def attendance_history(request):
     """View attendance history"""
     # Default to current month
@@ -174,11 +333,6 @@ def attendance_history(request):
                 if today.month < 12 
                 else date(today.year + 1, 1, 1)) - timedelta(days=1)
     
-    # Get students list for staff users
-    students = None
-    if request.user.is_staff:
-        students = User.objects.filter(is_active=True).order_by('username')
-    
     # Process GET parameters for filtering
     if request.method == 'GET':
         form = DateRangeForm(request.GET)
@@ -194,54 +348,101 @@ def attendance_history(request):
         selected_user = None
     
     # Filter attendance records
-    if request.user.is_staff and selected_user:
-        attendance_list = Attendance.objects.filter(
-            user=selected_user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('-date')
-    elif request.user.is_staff and not selected_user:
-        attendance_list = Attendance.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('-date')
-    else:
-        attendance_list = Attendance.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('-date')
-    
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(attendance_list, 10)  # Show 10 records per page
-    page = request.GET.get('page')
+    attendance_list = Attendance.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date
+    ).select_related('user')
+    if not request.user.is_staff:
+        attendance_list = attendance_list.filter(user=request.user)
+    elif selected_user:
+        attendance_list = attendance_list.filter(user=selected_user)
+    
+    # Keyset pagination on (date, user): every page costs the same as the first
+    cursor = request.GET.get('cursor')
     try:
-        attendance_records = paginator.page(page)
-    except:
-        # If page is not an integer or out of range, deliver first page
-        attendance_records = paginator.page(1)
+        attendance_records = paginate_by_date_and_user(attendance_list, cursor, per_page=10)
+    except InvalidCursor:
+        messages.warning(request, 'The requested page is no longer valid. Showing the most recent records.')
+        attendance_records = paginate_by_date_and_user(attendance_list, per_page=10)
+    
+    # The exact total needs a full COUNT(*), so it is only computed on request
+    total_count = attendance_list.count() if request.GET.get('count') else None
+    
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('count', None)
     
     context = {
         'form': form,
         'attendance_records': attendance_records,
+        'total_count': total_count,
+        'query_string': params.urlencode(),
         'start_date': start_date,
-        'students': students,
         'end_date': end_date,
     }
     
     return render(request, 'attendance/history.html', context)
 
 @login_required
+@reads_from_replica
+def check_in_log(request):
+    """Check-in and check-out log entries of one user, read from the archive for old months"""
+    today = timezone.now().date()
+    start_date = today.replace(day=1)
+    end_date = today
+    selected_user = None if request.user.is_staff else request.user
+    
+    form = DateRangeForm(request.GET or None, initial={'start_date': start_date, 'end_date': end_date})
+    if form.is_valid():
+        start_date = form.cleaned_data['start_date']
+        end_date = form.cleaned_data['end_date']
+        if request.user.is_staff:
+            selected_user = form.cleaned_data.get('user')
+    
+    # Staff choose a student; the entries of everybody would not fit on a page
+    logs = attendance_logs(start_date, end_date, selected_user) if selected_user else None
+    
+    context = {
+        'form': form,
+        'logs': logs,
+        'selected_user': selected_user,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+    return render(request, 'attendance/check_in_log.html', context)
+
+# Writes that bypass the version stamps show up in summary previews after this long
+SUMMARY_PREVIEW_TIMEOUT = 10 * 60
+
+
+def summary_preview(start_date, end_date, user=None):
+    """Per-user and per-department totals shown by the summary report preview.
+
+    Shared by the workers through the cache; the rollups they are read from are
+    refreshed before the writes that change them invalidate the entry.
+    """
+    def compute():
+        users = list(report_summary_data(start_date, end_date, user))
+        departments = [] if user else department_summaries(start_date, end_date)
+        return users, departments
+
+    return get_or_compute(
+        f'report:summary:{start_date}:{end_date}:{user.pk if user else "all"}',
+        compute,
+        SUMMARY_PREVIEW_TIMEOUT,
+        tags=[USERS, *range_keys(start_date, end_date)],
+    )
+
+
+@login_required
+@conditional_page(report_versions)
+@reads_from_replica
 def attendance_report(request):
     """Generate attendance report"""
     if not request.user.is_staff and not request.user.is_superuser:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('users:dashboard')
     
-    # Get students list for staff users
-    students = User.objects.filter(is_active=True).order_by('username')
-    
     # Default to current month
     today = timezone.now().date()
     start_date = date(today.year, today.month, 1)
@@ -250,7 +451,9 @@ def attendance_report(request):
     preview = False
     attendance_records = []
     summary_data = []
+    department_data = []
     download_url = None
+    report_job = None
     
     if request.method == 'GET' and request.GET:
         form = DateRangeForm(request.GET)
@@ -261,12 +464,26 @@ def attendance_report(request):
             report_type = request.GET.get('report_type', 'detailed')
             report_format = request.GET.get('format', 'csv')
             
-            # Filter attendance records
-            query = Q(date__gte=start_date) & Q(date__lte=end_date)
-            if selected_user:
-                query &= Q(user=selected_user)
+            attendance_records = get_report_queryset(start_date, end_date, selected_user).select_related('user')
             
-            attendance_records = Attendance.objects.filter(query).order_by('user__username', 'date')
+            # Queue the report for the background worker if requested
+            if 'background' in request.GET:
+                if report_format not in ['csv', 'excel']:
+                    messages.info(request, f'{report_format.upper()} export is not implemented in this demo.')
+                    return redirect('attendance:attendance_report')
+                
+                report_job, created = submit_report_job(
+                    request.user, report_type, report_format, start_date, end_date, selected_user
+                )
+                if created:
+                    messages.success(request, 'Report queued. It will be available for download once generated.')
+                else:
+                    messages.info(request, 'An identical report was requested recently and will be reused.')
+                
+                params = request.GET.copy()
+                params.pop('background', None)
+                params['job'] = report_job.pk
+                return redirect(f"{request.path}?{params.urlencode()}")
             
             # Generate preview if requested
             if 'preview' in request.GET:
@@ -274,91 +491,42 @@ def attendance_report(request):
                 
                 # Generate summary data if summary report type is selected
                 if report_type == 'summary':
-                    # This is a simplified example - in a real app, you'd calculate these metrics
-                    summary_data = []
-                    if selected_user:
-                        users = [selected_user]
-                    else:
-                        users = User.objects.filter(attendance__in=attendance_records).distinct()
-                    
-                    for user in users:
-                        user_records = attendance_records.filter(user=user)
-                        present_days = user_records.filter(is_present=True).count()
-                        total_days = user_records.count()
-                        
-                        total_hours = sum([r.get_duration_hours() for r in user_records if r.check_in_time and r.check_out_time], 0)
-                        avg_hours = total_hours / present_days if present_days > 0 else 0
-                        
-                        summary_data.append({
-                            'user': user,
-                            'total_days': total_days,
-                            'present_days': present_days,
-                            'absent_days': total_days - present_days,
-                            'late_arrivals': 0,  # Would calculate based on company policy
-                            'early_departures': 0,  # Would calculate based on company policy
-                            'total_hours': round(total_hours, 2),
-                            'avg_hours_per_day': round(avg_hours, 2)
-                        })
+                    summary_data, department_data = summary_preview(start_date, end_date, selected_user)
                 
                 # Create download URL for the actual report
                 params = request.GET.copy()
                 params.pop('preview', None)
                 download_url = f"{request.path}?{params.urlencode()}"
             
+            # Show the status of a background job
+            elif 'job' in request.GET:
+                try:
+                    job_id = int(request.GET['job'])
+                except ValueError:
+                    raise Http404('Report job not found')
+                report_job = get_object_or_404(ReportJob, pk=job_id, requested_by=request.user)
+            
             # Generate actual report file if not preview
             elif report_format == 'csv':
                 response = HttpResponse(content_type='text/csv')
                 response['Content-Disposition'] = f'attachment; filename="attendance_report_{start_date}_to_{end_date}.csv"'
                 
-                writer = csv.writer(response)
-                
-                if report_type == 'detailed':
-                    writer.writerow(['Username', 'Employee ID', 'Date', 'Check-in Time', 'Check-out Time', 'Duration', 'Type', 'Status', 'Notes'])
-                    
-                    for record in attendance_records:
-                        writer.writerow([
-                            record.user.username,
-                            getattr(record.user.profile, 'employee_id', 'N/A') if hasattr(record.user, 'profile') else 'N/A',
-                            record.date,
-                            record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else 'N/A',
-                            record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else 'N/A',
-                            record.get_duration(),
-                            record.attendance_type,
-                            'Present' if record.is_present else 'Absent',
-                            record.notes or 'N/A'
-                        ])
-                else:  # summary report
-                    writer.writerow(['Username', 'Employee ID', 'Total Days', 'Present Days', 'Absent Days', 'Total Hours', 'Avg Hours/Day'])
-                    
-                    # Generate summary data
-                    if selected_user:
-                        users = [selected_user]
-                    else:
-                        users = User.objects.filter(attendance__in=attendance_records).distinct()
-                    
-                    for user in users:
-                        user_records = attendance_records.filter(user=user)
-                        present_days = user_records.filter(is_present=True).count()
-                        total_days = user_records.count()
-                        
-                        total_hours = sum([r.get_duration_hours() for r in user_records if r.check_in_time and r.check_out_time], 0)
-                        avg_hours = total_hours / present_days if present_days > 0 else 0
-                        
-                        writer.writerow([
-                            user.username,
-                            getattr(user.profile, 'employee_id', 'N/A') if hasattr(user, 'profile') else 'N/A',
-                            total_days,
-                            present_days,
-                            total_days - present_days,
-                            round(total_hours, 2),
-                            round(avg_hours, 2)
-                        ])
+                rows = report_rows(report_type, start_date, end_date, selected_user)
+                write_csv(response, report_type, rows)
                 
                 return response
             
-            # Handle Excel and PDF formats (placeholder - would implement with appropriate libraries)
-            elif report_format in ['excel', 'pdf']:
-                messages.info(request, f'{report_format.upper()} export is not implemented in this demo.')
+            elif report_format == 'excel':
+                rows = report_rows(report_type, start_date, end_date, selected_user)
+                return FileResponse(
+                    spool_xlsx(report_type, rows),
+                    as_attachment=True,
+                    filename=f'attendance_report_{start_date}_to_{end_date}.xlsx',
+                )
+            
+            # Handle PDF format (placeholder - would implement with appropriate libraries)
+            elif report_format == 'pdf':
+                messages.info(request, 'PDF export is not implemented in this demo.')
                 return redirect('attendance:attendance_report')
     else:
         form = DateRangeForm(initial={'start_date': start_date, 'end_date': end_date})
@@ -367,9 +535,10 @@ def attendance_report(request):
         'form': form,
         'attendance_records': attendance_records,
         'summary_data': summary_data,
+        'department_data': department_data,
         'preview': preview,
         'download_url': download_url,
-        'students': students,
+        'report_job': report_job,
         'start_date': start_date,
         'end_date': end_date,
     }
@@ -462,27 +631,26 @@ def debug_camera(request):
     return render(request, 'attendance/debug_camera.html')
 
 @login_required
+@conditional_page(notification_dashboard_versions)
 def notification_dashboard(request):
     """Admin notification dashboard showing daily attendance status"""
     if not request.user.is_staff:
         messages.error(request, 'Access denied. Admin privileges required.')
-        return redirect('dashboard')
+        return redirect('users:dashboard')
     
     today = date.today()
     
-    # Get today's attendance status
-    today_attendance = AttendanceStatus.objects.filter(date=today)
-    
     # Get all users and their attendance status
     all_students = User.objects.filter(is_active=True).exclude(is_superuser=True)
     
-    # Create attendance status for students who don't have one for today
-    for student in all_students:
-        AttendanceStatus.objects.get_or_create(
-            user=student,
-            date=today,
-            defaults={'status': 'absent'}
-        )
+    # Create attendance status for students who don't have one for today, in one insert
+    missing_statuses = [
+        AttendanceStatus(user_id=user_id, date=today, status='absent')
+        for user_id in all_students.exclude(attendancestatus__date=today).values_list('id', flat=True)
+    ]
+    if missing_statuses:
+        AttendanceStatus.objects.bulk_create(missing_statuses, ignore_conflicts=True)
+        attendance_changed.send(sender=AttendanceStatus, instances=missing_statuses, created=True, deleted=False)
     
     # Get updated attendance data
     attendance_data = AttendanceStatus.objects.filter(date=today).select_related('user')
@@ -490,11 +658,13 @@ def notification_dashboard(request):
     # Count statistics
     stats = {
         'total_students': all_students.count(),
-        'present': attendance_data.filter(status='present').count(),
-        'absent': attendance_data.filter(status='absent').count(),
-        'late': attendance_data.filter(status='late').count(),
-        'half_day': attendance_data.filter(status='half_day').count(),
-        'on_leave': attendance_data.filter(status='leave').count(),
+        **attendance_data.aggregate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            late=Count('id', filter=Q(status='late')),
+            half_day=Count('id', filter=Q(status='half_day')),
+            on_leave=Count('id', filter=Q(status='leave')),
+        ),
     }
     
     # Get recent notifications
@@ -515,6 +685,25 @@ def notification_dashboard(request):
     
     return render(request, 'attendance/notification_dashboard.html', context)
 
+@login_required
+async def dashboard_events(request):
+    """Server-sent events with status changes and new notifications for the notification dashboard"""
+    user = await request.auser()
+    if not user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    # A stream would hold a worker thread under WSGI; 204 tells the browser not to reconnect
+    config = get_events_config()
+    if not config['ENABLED'] or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    stream = event_stream(get_bus().subscribe(), config['HEARTBEAT_SECONDS'], config['RETRY_MS'])
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def mark_attendance_status(request):
     """Mark attendance status for employees"""
@@ -552,6 +741,52 @@ def mark_attendance_status(request):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@login_required
+def mark_attendance_status_batch(request):
+    """Mark the attendance status of many users from a JSON list, all or nothing"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    # Either a bare list or {"items": [...]}; items without a date are for today
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    try:
+        results = mark_statuses(items, default_date=date.today())
+    except InvalidStatusBatch as e:
+        return JsonResponse({'error': str(e), 'results': e.results}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'Attendance status updated for {len(results)} users',
+        'results': results,
+    })
+
+# One aggregate instead of a count per status
+DAILY_SUMMARY_COUNTS = {
+    'present': Count('id', filter=Q(status='present')),
+    'absent': Count('id', filter=Q(status='absent')),
+    'late': Count('id', filter=Q(status='late')),
+}
+
+
+def daily_summary_message(today, stats):
+    return f"""
+            Daily Attendance Summary for {today}:
+            
+            ✅ Present: {stats['present']} students
+            ❌ Absent: {stats['absent']} students
+            ⏰ Late: {stats['late']} students
+            
+            Total Students: {sum(stats.values())}
+            """
+
 @login_required
 def create_daily_notification(request):
     """Create daily notification summary"""
@@ -565,21 +800,9 @@ def create_daily_notification(request):
         today = date.today()
         
         if notification_type == 'daily_summary':
-            stats = {
-                'present': AttendanceStatus.objects.filter(date=today, status='present').count(),
-                'absent': AttendanceStatus.objects.filter(date=today, status='absent').count(),
-                'late': AttendanceStatus.objects.filter(date=today, status='late').count(),
-            }
-            
-            message = f"""
-            Daily Attendance Summary for {today}:
-            
-            ✅ Present: {stats['present']} students
-            ❌ Absent: {stats['absent']} students
-            ⏰ Late: {stats['late']} students
-            
-            Total Students: {sum(stats.values())}
-            """
+            message = daily_summary_message(
+                today, AttendanceStatus.objects.filter(date=today).aggregate(**DAILY_SUMMARY_COUNTS)
+            )
         else:
             message = custom_message
         
@@ -607,8 +830,255 @@ def mark_notification_read(request, notification_id):
     try:
         notification = DailyAttendanceNotification.objects.get(id=notification_id)
         notification.is_read = True
-        notification.save()
+        # Saved rather than updated so the version stamp and live dashboards follow
+        notification.save(update_fields=['is_read'])
         
         return JsonResponse({'success': True})
     except DailyAttendanceNotification.DoesNotExist:
         return JsonResponse({'error': 'Notification not found'}, status=404)
+
+@login_required
+async def mark_attendance_status_async(request):
+    """Async twin of ``mark_attendance_status`` for ASGI servers"""
+    if not (await request.auser()).is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method == 'POST':
+        user_id = request.POST.get('user_id')
+        status = request.POST.get('status')
+        date_str = request.POST.get('date', date.today().isoformat())
+        
+        try:
+            user = await User.objects.aget(id=user_id)
+            attendance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            
+            attendance_status, created = await AttendanceStatus.objects.aget_or_create(
+                user=user,
+                date=attendance_date,
+                defaults={'status': status}
+            )
+            
+            if not created:
+                attendance_status.status = status
+                # Saved rather than updated so the rollups, stamps and live dashboards follow
+                await attendance_status.asave()
+            
+            return JsonResponse({
+                'success': True,
+                'message': f'Attendance status updated for {user.username}'
+            })
+            
+        except User.DoesNotExist:
+            return JsonResponse({'error': 'User not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+@login_required
+async def create_daily_notification_async(request):
+    """Async twin of ``create_daily_notification`` for ASGI servers"""
+    if not (await request.auser()).is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method == 'POST':
+        notification_type = request.POST.get('type', 'daily_summary')
+        custom_message = request.POST.get('message', '')
+        
+        today = date.today()
+        
+        if notification_type == 'daily_summary':
+            message = daily_summary_message(
+                today, await AttendanceStatus.objects.filter(date=today).aaggregate(**DAILY_SUMMARY_COUNTS)
+            )
+        else:
+            message = custom_message
+        
+        notification = await DailyAttendanceNotification.objects.acreate(
+            date=today,
+            notification_type=notification_type,
+            title=f'Daily Summary - {today}',
+            message=message
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Notification created successfully',
+            'notification_id': notification.id
+        })
+    
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+@login_required
+async def mark_notification_read_async(request, notification_id):
+    """Async twin of ``mark_notification_read`` for ASGI servers"""
+    if not (await request.auser()).is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        notification = await DailyAttendanceNotification.objects.aget(id=notification_id)
+        notification.is_read = True
+        # Saved rather than updated so the version stamp and live dashboards follow
+        await notification.asave(update_fields=['is_read'])
+        
+        return JsonResponse({'success': True})
+    except DailyAttendanceNotification.DoesNotExist:
+        return JsonResponse({'error': 'Notification not found'}, status=404)
+
+@login_required
+def user_autocomplete(request):
+    """One page of the active users matching ``q`` by username, name or employee id"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page'}, status=400)
+    
+    results, more = search_users(request.GET.get('q', ''), page)
+    return JsonResponse({'results': results, 'more': more})
+
+@login_required
+def profiling_dashboard(request):
+    """Timings of the sampled requests: SQL, template rendering and face recognition stages"""
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied. Admin privileges required.')
+        return redirect('users:dashboard')
+    
+    if request.method == 'POST' and request.POST.get('action') == 'clear':
+        get_store().clear()
+        messages.success(request, 'Profiling data cleared.')
+        return redirect('attendance:profiling_dashboard')
+    
+    recent_profiles, _, _ = get_store().snapshot()
+    context = {
+        'config': get_profiling_config(),
+        'views': view_summaries(),
+        'stages': stage_summaries(),
+        'recent_profiles': recent_profiles[:50],
+    }
+    
+    return render(request, 'attendance/profiling.html', context)
+
+def profiling_metrics(request):
+    """Profiling totals in the Prometheus text format, for staff or a bearer token"""
+    token = get_profiling_config()['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not request.user.is_staff and not (token and constant_time_compare(authorization, f'Bearer {token}')):
+        return HttpResponse('Access denied', status=403, content_type='text/plain')
+    
+    return HttpResponse(prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def analytics_results(request):
+    """The bound analytics form and its report, None while the form is invalid"""
+    today = timezone.now().date()
+    data = request.GET.copy()
+    for name, value in (('start_date', today - timedelta(days=364)), ('end_date', today)):
+        data.setdefault(name, value.isoformat())
+    for name, field in AnalyticsForm.base_fields.items():
+        if field.initial is not None:
+            data.setdefault(name, str(field.initial))
+    
+    form = AnalyticsForm(data)
+    if not form.is_valid():
+        return form, None
+    params = form.cleaned_data
+    matrix = get_matrix(params['start_date'], params['end_date'])
+    return form, analytics_report(matrix, params['status'], params['threshold'], params['window'])
+
+@login_required
+@reads_from_replica
+def analytics_dashboard(request):
+    """Org-wide streaks, rates and heatmaps of one attendance status over a date range"""
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied. Admin privileges required.')
+        return redirect('users:dashboard')
+    
+    form, report = analytics_results(request)
+    context = {'form': form, 'report': report}
+    if report:
+        rates = [rate for row in report['heatmap'] for rate in row if rate is not None]
+        highest = max(rates, default=0) or 1
+        context['heatmap'] = [
+            (weekday, [(rate, None if rate is None else round(rate / highest, 2)) for rate in row])
+            for weekday, row in zip(('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'), report['heatmap'])
+        ]
+        context['recent_rolling'] = report['rolling'][-14:][::-1]
+        context['api_url'] = f"{reverse('attendance:analytics_api')}?{form.data.urlencode()}"
+    
+    return render(request, 'attendance/analytics.html', context)
+
+@login_required
+@reads_from_replica
+def analytics_api(request):
+    """The analytics of the analytics page as JSON"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    form, report = analytics_results(request)
+    if report is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse(report)
+
+@gzip_page
+@reads_from_replica
+def change_feed(request):
+    """Attendance, status and log changes after a cursor as NDJSON, for staff or a bearer token"""
+    token = get_changes_config()['TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not request.user.is_staff and not (token and constant_time_compare(authorization, f'Bearer {token}')):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        limit = int(request.GET['limit']) if 'limit' in request.GET else None
+        page = read_changes(request.GET.get('cursor'), limit)
+    except ValueError as e:
+        # InvalidCursor is a ValueError as well
+        return JsonResponse({'error': str(e)}, status=400)
+    except CursorExpired as e:
+        return JsonResponse({'error': str(e)}, status=410)
+    
+    response = HttpResponse(''.join(f'{line}\n' for line in page.lines), content_type='application/x-ndjson')
+    response['X-Change-Cursor'] = page.cursor
+    response['X-Change-More'] = 'true' if page.more else 'false'
+    return response
+
+@login_required
+def report_job_status(request, job_id):
+    """Return the progress of a background report job"""
+    if not request.user.is_staff and not request.user.is_superuser:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        job = ReportJob.objects.get(id=job_id, requested_by=request.user)
+    except ReportJob.DoesNotExist:
+        return JsonResponse({'error': 'Report job not found'}, status=404)
+    
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'total_rows': job.total_rows,
+        'error': job.error,
+        'download_url': None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+    if job.status == 'completed' and job.file:
+        data['download_url'] = reverse('attendance:report_job_download', args=[job.id])
+    
+    return JsonResponse(data)
+
+@login_required
+def report_job_download(request, job_id):
+    """Download the file generated by a background report job"""
+    if not request.user.is_staff and not request.user.is_superuser:
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('users:dashboard')
+    
+    job = get_object_or_404(ReportJob, id=job_id, requested_by=request.user, status='completed')
+    if not job.file or (job.expires_at and job.expires_at < timezone.now()):
+        raise Http404('Report file has expired')
+    
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)
@@ -1,7 +1,10 @@
 """
 ASGI config for attendance_system project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``. Serve it with uvicorn workers to get the
+server-sent events of the notification dashboard and the async JSON endpoints under ``/attendance/async/``::
+
+    gunicorn attendance_system.asgi:application -k uvicorn.workers.UvicornWorker -w 4
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -0,0 +1,85 @@
+"""
+SQLite connection settings driven by environment variables.
+
+``sqlite_databases()`` returns the DATABASES setting: a ``default`` connection
+for writes and, unless ``SQLITE_READ_REPLICA=0``, a read-only ``replica``
+connection to the same file that ``attendance.routers.ReadReplicaRouter`` uses
+for report and history reads. In WAL mode readers never block the writer.
+
+Environment variables (defaults in brackets):
+
+    SQLITE_PATH            database file [BASE_DIR/db.sqlite3]
+    SQLITE_JOURNAL_MODE    journal mode [WAL]
+    SQLITE_SYNCHRONOUS     synchronous level; NORMAL is safe with WAL [NORMAL]
+    SQLITE_BUSY_TIMEOUT_MS wait this long for a lock before "database is locked" [5000]
+    SQLITE_MMAP_SIZE       bytes of the file read through mmap [268435456]
+    SQLITE_CACHE_SIZE      page cache; negative values are KiB [-65536]
+    SQLITE_TRANSACTION_MODE
+                           BEGIN mode of write transactions; IMMEDIATE takes the
+                           write lock up front instead of failing on a lock
+                           upgrade [IMMEDIATE]
+    DB_CONN_MAX_AGE        seconds a connection is reused, 0 closes it after
+                           every request [60]
+    SQLITE_READ_REPLICA    1 to add the read-only connection [1]
+"""
+
+import os
+from urllib.parse import quote
+
+
+def _env(name, default):
+    return os.environ.get(name, default)
+
+
+def _pragmas(readonly=False):
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(_env('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA mmap_size = {int(_env('SQLITE_MMAP_SIZE', 268435456))}",
+        f"PRAGMA cache_size = {int(_env('SQLITE_CACHE_SIZE', -65536))}",
+        'PRAGMA temp_store = MEMORY',
+    ]
+    if readonly:
+        pragmas.append('PRAGMA query_only = ON')
+    else:
+        # The journal mode is stored in the file, so only the writer sets it
+        pragmas.insert(0, f"PRAGMA journal_mode = {_env('SQLITE_JOURNAL_MODE', 'WAL')}")
+        pragmas.insert(1, f"PRAGMA synchronous = {_env('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    return ';'.join(pragmas)
+
+
+def readonly_name(path):
+    """The NAME of a read-only connection to the SQLite file at ``path``"""
+    # Django opens SQLite names as URIs, so mode=ro gives a read-only handle
+    return f'file:{quote(str(path))}?mode=ro'
+
+
+def sqlite_databases(base_dir):
+    path = os.path.abspath(_env('SQLITE_PATH', os.path.join(base_dir, 'db.sqlite3')))
+    conn_max_age = int(_env('DB_CONN_MAX_AGE', 60))
+
+    databases = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': conn_max_age > 0,
+            'OPTIONS': {
+                'init_command': _pragmas(),
+                'transaction_mode': _env('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+            },
+        },
+    }
+    if _env('SQLITE_READ_REPLICA', '1') == '1':
+        databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': readonly_name(path),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': conn_max_age > 0,
+            'OPTIONS': {
+                'init_command': _pragmas(readonly=True),
+            },
+            'TEST': {
+                'MIRROR': 'default',
+            },
+        }
+    return databases
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import sqlite_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'attendance.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,7 +60,7 @@ ROOT_URLCONF = 'attendance_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'attendance.profiling.ProfiledDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,12 +79,11 @@ WSGI_APPLICATION = 'attendance_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# WAL mode, busy timeout, connection reuse and a read-only connection for reports;
+# see attendance_system/database.py for the environment variables
+DATABASES = sqlite_databases(BASE_DIR)
+
+DATABASE_ROUTERS = ['attendance.routers.ReadReplicaRouter']
 
 
 # Password validation
@@ -130,6 +133,73 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Shift policy used to derive lateness and early departures of attendance records
+ATTENDANCE_SHIFT = {
+    'start': '09:00',
+    'end': '17:00',
+    'late_grace_minutes': 0,
+    'early_leave_grace_minutes': 0,
+}
+
+# Attendance log entries are buffered in memory and written in batches
+ATTENDANCE_LOG_BUFFER = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 200,
+    'FLUSH_INTERVAL_MS': 250,
+    # Spooling needs POSIX file locks
+    'SPOOL_DIR': BASE_DIR / 'log_spool' if os.name == 'posix' else None,
+    'FSYNC': False,
+}
+
+# Old attendance logs and notifications are moved to gzipped NDJSON files, one per month
+ATTENDANCE_ARCHIVE = {
+    'DIR': BASE_DIR / 'archive',
+    'RETENTION_DAYS': 180,
+    'CHUNK_SIZE': 5000,
+}
+
+# Attendance, status and log changes are recorded by database triggers and served
+# as NDJSON pages after a cursor; see /attendance/changes/ and "manage.py export_changes"
+ATTENDANCE_CHANGE_FEED = {
+    'TOKEN': None,
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 10000,
+    'RETENTION_DAYS': 30,
+}
+
+# A sample of requests is profiled (SQL, template rendering, face recognition stages);
+# see /attendance/profiling/ and the Prometheus endpoint /attendance/metrics/
+ATTENDANCE_PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.05,
+    'BUFFER_SIZE': 500,
+    'METRICS_TOKEN': None,
+}
+
+# Dashboard summaries (attendance/summaries.py) and values cached with
+# attendance.cache.get_or_compute live here. The SQLite file is shared by the
+# workers of one machine, so a write handled by one worker updates what the others
+# serve, and its atomic add lets one worker recompute an entry while the others wait
+CACHES = {
+    'default': {
+        'BACKEND': 'attendance.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Status changes and notifications are streamed to open notification dashboards as
+# server-sent events (needs an ASGI server); workers on one machine share events
+# through datagram sockets in SOCKET_DIR
+ATTENDANCE_EVENTS = {
+    'ENABLED': True,
+    'SOCKET_DIR': BASE_DIR / 'event_sockets',
+    'HEARTBEAT_SECONDS': 15,
+    'QUEUE_SIZE': 100,
+    'RETRY_MS': 5000,
+}
+
 # Login URL configuration
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
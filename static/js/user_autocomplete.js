@@ -0,0 +1,88 @@
+// Search boxes for user selects whose options come from the server,
+// see UserAutocompleteSelect in attendance/forms.py
+
+// Fill a user select from the autocomplete endpoint as the user types.
+// The page only renders the selected user; matches are fetched 20 at a time
+// and a "More results" option loads the next page.
+function initUserAutocomplete(select) {
+    const search = document.createElement('input');
+    search.type = 'search';
+    search.className = 'form-control mb-2';
+    search.placeholder = 'Search by name or ID';
+    search.setAttribute('aria-label', 'Search students');
+    select.parentNode.insertBefore(search, select);
+
+    const emptyOption = select.querySelector('option[value=""]');
+    let query = null;
+    let page = 1;
+    let requestId = 0;
+    let timer = null;
+    let previousValue = select.value;
+
+    function option(value, text) {
+        const element = document.createElement('option');
+        element.value = value;
+        element.textContent = text;
+        return element;
+    }
+
+    function load(append) {
+        const currentRequest = ++requestId;
+        const params = new URLSearchParams({q: query, page: page});
+        fetch(`${select.dataset.autocompleteUrl}?${params}`, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => {
+                // A newer search was started while this one was loading
+                if (currentRequest !== requestId || !data.results) return;
+                const selected = select.selectedOptions[0];
+                const kept = [emptyOption, selected].filter((element, index, all) => element && all.indexOf(element) === index);
+                if (append) {
+                    select.querySelectorAll('option[data-more]').forEach(element => element.remove());
+                } else {
+                    select.replaceChildren(...kept);
+                }
+                data.results.forEach(result => {
+                    if (!kept.some(element => element.value === String(result.id))) {
+                        select.appendChild(option(result.id, result.text));
+                    }
+                });
+                if (data.more) {
+                    const more = option('', 'More results…');
+                    more.dataset.more = '1';
+                    select.appendChild(more);
+                }
+            });
+    }
+
+    search.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            if (search.value.trim() === query) return;
+            query = search.value.trim();
+            page = 1;
+            load(false);
+        }, 250);
+    });
+
+    // Load the first page once the select is about to be used
+    select.addEventListener('focus', function() {
+        if (query === null) {
+            query = '';
+            load(false);
+        }
+    });
+
+    select.addEventListener('change', function() {
+        if (select.selectedOptions[0] && select.selectedOptions[0].dataset.more) {
+            select.value = previousValue;
+            page += 1;
+            load(true);
+        } else {
+            previousValue = select.value;
+        }
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(initUserAutocomplete);
+});
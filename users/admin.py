@@ -4,6 +4,7 @@ from .models import Profile
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'employee_id', 'department', 'position', 'date_joined')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'employee_id', 'department')
     list_filter = ('department', 'date_joined')
     readonly_fields = ('date_joined',)
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance.benchmarks import ViewBenchmarkMixin, seed_benchmark_data
+from attendance.models import Attendance
+from attendance.summaries import build_summary, get_summary
+
+
+class UserViewBenchmarks(ViewBenchmarkMixin, TestCase):
+    """Query budgets and response times of the user views on a synthetic dataset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_benchmark_data()
+        cls.member = User.objects.get(username='bench000001')
+
+    def test_home(self):
+        self.assertViewBudget('users_home', reverse('users:home'), 0)
+
+    def test_login_form(self):
+        self.assertViewBudget('users_login', reverse('users:login'), 0)
+
+    def test_register_form(self):
+        self.assertViewBudget('users_register', reverse('users:register'), 0)
+
+    def test_profile(self):
+        self.client.force_login(self.member)
+        self.assertViewBudget('users_profile', reverse('users:profile'), 3)
+
+    def test_dashboard(self):
+        self.client.force_login(self.member)
+        # Session, user and the ETag stamps; the attendance comes from the cached summary
+        response = self.assertViewBudget('users_dashboard', reverse('users:dashboard'), 3)
+        self.assertTrue(response.context['recent_attendance'])
+
+    def test_dashboard_summary_cache(self):
+        today = timezone.now().date()
+        get_summary(self.member.pk)
+        with self.assertNumQueries(0):
+            summary = get_summary(self.member.pk)
+        self.assertEqual(summary, build_summary(self.member.pk, today))
+        self.assertIsNone(summary.today_attendance)
+
+        # Committed writes go through to the cached summary
+        with self.captureOnCommitCallbacks(execute=True):
+            record = Attendance.objects.create(user=self.member, date=today, check_in_time=timezone.now(), notes='Kiosk')
+        with self.captureOnCommitCallbacks(execute=True):
+            record.check_out_time = record.check_in_time + timedelta(hours=2)
+            record.save()
+        with self.assertNumQueries(0):
+            summary = get_summary(self.member.pk)
+        self.assertEqual(summary.today_attendance.get_duration(), '2h 0m')
+        self.assertEqual(summary, build_summary(self.member.pk, today))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delete()
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_summary(self.member.pk).today_attendance)
+
+    def test_dashboard_not_modified(self):
+        self.client.force_login(self.member)
+        url = reverse('users:dashboard')
+        client = Client(headers={'If-None-Match': self.client.get(url).headers['ETag']})
+        client.cookies = self.client.cookies
+        self.assertViewBudget('users_dashboard_not_modified', url, 3, status_code=304, client=client)
@@ -3,9 +3,8 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
-from attendance.models import Attendance
-from django.utils import timezone
-from datetime import timedelta
+from attendance.summaries import get_summary
+from attendance.versions import conditional_page, user_key
 
 def home(request):
     """Home page view"""
@@ -79,23 +78,16 @@ def profile(request):
     return render(request, 'users/profile.html', context)
 
 @login_required
+@conditional_page(lambda request: [user_key(request.user.pk)])
 def dashboard(request):
     """User dashboard view"""
-    # Get today's attendance
-    today = timezone.now().date()
-    today_attendance = Attendance.objects.filter(user=request.user, date=today).first()
-    
-    # Get last 7 days attendance
-    last_week = today - timedelta(days=7)
-    recent_attendance = Attendance.objects.filter(
-        user=request.user,
-        date__gte=last_week,
-        date__lte=today
-    ).order_by('-date')
+    # Today's record and the last 7 days come from the user's cached summary
+    summary = get_summary(request.user.pk)
     
     context = {
-        'today_attendance': today_attendance,
-        'recent_attendance': recent_attendance,
+        'today_attendance': summary.today_attendance,
+        'recent_attendance': summary.rows,
+        'week_totals': summary.week_totals,
     }
     
     return render(request, 'users/dashboard.html', context)